@@ -1,24 +1,94 @@
 # /home/echeadle/15_DupFiles/find-dup-files/app/api/routes.py
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy import select
 from pydantic import BaseModel, Field, ConfigDict # Import ConfigDict
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, List, Dict, Literal, Optional, Tuple
+from functools import partial
 
 # Updated imports
-from app.core.db import get_db_session
-from app.core.scanner import scan_directory, find_duplicates # Import find_duplicates from scanner
+from app.core.archives import DEFAULT_MAX_ARCHIVE_BYTES, DEFAULT_MAX_ARCHIVE_MEMBERS, ArchiveLimits
+from app.core.cache import CacheEntry, ResponseCache, etag_matches
+from app.core.db import get_change_counter, get_db_session, get_read_session, run_read
+from app.core.lookup import DigestFilter, lookup_digests
+from app.core.estimate import DEFAULT_CONFIDENCE, DEFAULT_SAMPLE_SIZE, estimate_duplication
+from app.core.throttle import ScanThrottle, get_throttle
+from app.core.serialization import accepts_gzip, dumps, maybe_gzip, rows_to_json
+from app.core.scanner import (  # Import find_duplicates from scanner
+    scan_directory, resume_scan, find_duplicates, find_duplicate_groups, find_partial_duplicates, duplicate_stats,
+)
 from app.models.file_entry import FileEntry as DBFileEntry # Rename to avoid conflict
+from app.models.scan_job import ScanJob
 
 router = APIRouter()
 
+# Most digests, and most (digest, size) pairs, accepted by one lookup request.
+MAX_LOOKUP_ITEMS = 50000
+
+class ScanLimits(BaseModel):
+    """Rate limits and priorities for a scan's hashing workers; omitted fields mean no limit."""
+    bytes_per_second: Optional[int] = Field(None, gt=0, description="Read bandwidth limit.")
+    files_per_second: Optional[float] = Field(None, gt=0, description="Limit on files hashed per second.")
+    latency_target_ms: Optional[float] = Field(
+        None, gt=0, description="Back off while the measured read latency is above this."
+    )
+    nice: Optional[int] = Field(None, ge=-20, le=19, description="Niceness of the hashing threads.")
+    io_priority: Optional[Literal["realtime", "best-effort", "idle"]] = Field(
+        None, description="I/O scheduling class of the hashing threads (Linux)."
+    )
+    io_priority_level: Optional[int] = Field(None, ge=0, le=7, description="Level within the I/O class.")
+
+class ScanLimitsState(ScanLimits):
+    """Response model for a running scan's limits and its adaptive backoff state."""
+    read_latency_ms: float
+    backoff_ms: float
+
+class ArchiveOptions(BaseModel):
+    """Per-archive limits for indexing the members of zip and tar archives."""
+    max_bytes: int = Field(DEFAULT_MAX_ARCHIVE_BYTES, gt=0, description="Most uncompressed bytes read per archive.")
+    max_members: int = Field(DEFAULT_MAX_ARCHIVE_MEMBERS, gt=0, description="Most members read per archive.")
+
 class ScanRequest(BaseModel):
     """Request model for triggering a directory scan."""
     directory_path: str = Field(..., description="The absolute path to the directory to scan.")
+    chunk_threshold_bytes: Optional[int] = Field(
+        None, ge=0, description="Also index content-defined chunks of files at least this large (omit to disable)."
+    )
+    cache_policy: Literal["default", "dontneed", "direct"] = Field(
+        "default", description="Page-cache policy for reading files; 'dontneed'/'direct' avoid evicting hot data."
+    )
+    limits: Optional[ScanLimits] = Field(
+        None, description=(
+            "I/O limits; adjustable while the scan runs via PATCH /api/scan/jobs/{job_id}/limits. "
+            "This request returns only when the scan ends, so take a running scan's job_id from GET /api/scan/jobs."
+        )
+    )
+    archives: Optional[ArchiveOptions] = Field(
+        None, description="Also index zip/tar archive members as 'archive.zip!/member' paths (omit to disable)."
+    )
 
 class ScanResponse(BaseModel):
     """Response model for the scan endpoint."""
     message: str
+    job_id: Optional[int] = None
+
+class ScanJobEntry(BaseModel):
+    """Response model for a scan job and its last checkpointed progress."""
+    id: int
+    root: str
+    status: str
+    chunk_threshold: Optional[int]
+    cache_policy: Optional[str]
+    archive_max_bytes: Optional[int]
+    archive_max_members: Optional[int]
+    files_seen: int
+    files_hashed: int
+    started_at: float
+    updated_at: float
+
+    model_config = ConfigDict(from_attributes=True)
 
 class FileEntry(BaseModel):
     """Response model for a single file entry."""
@@ -31,19 +101,107 @@ class FileEntry(BaseModel):
     # Use ConfigDict for Pydantic V2 compatibility
     model_config = ConfigDict(from_attributes=True)
 
+class PartialDuplicatePair(BaseModel):
+    """Response model for two files that share content-defined chunks."""
+    path_a: str
+    path_b: str
+    size_a: int
+    size_b: int
+    shared_bytes: int
+    shared_ratio: float
+
+class DuplicateGroup(BaseModel):
+    """Response model for one ranked duplicate group."""
+    hash: str
+    size: int
+    count: int
+    wasted: int
+    paths: List[str]
+
+class DuplicateGroupsPage(BaseModel):
+    """Response model for one page of ranked duplicate groups."""
+    total: int
+    offset: int
+    groups: List[DuplicateGroup]
+
+class StatsResponse(BaseModel):
+    """Response model for the index-wide totals."""
+    files: int
+    bytes: int
+    duplicate_groups: int
+    duplicate_files: int
+    reclaimable_bytes: int
+
+class SizeHistogramBin(BaseModel):
+    """Estimated files and bytes within one power-of-two size range."""
+    min_size: int
+    max_size: int
+    files: int
+    bytes: int
+
+class EstimateResponse(BaseModel):
+    """Response model for the sampled duplication estimate."""
+    files: int
+    bytes: int
+    candidate_bytes: int
+    duplicate_bytes: int
+    duplicate_bytes_low: int
+    duplicate_bytes_high: int
+    confidence: float
+    histogram: List[SizeHistogramBin]
+    files_walked: int
+    subtree_fraction: float
+    buckets_sampled: int
+    bytes_read: int
+    elapsed_seconds: float
+
+class LookupFile(BaseModel):
+    """A (digest, size) pair to look up."""
+    hash: str = Field(..., min_length=1, description="Hex SHA-256 digest of the content.")
+    size: int = Field(..., ge=0, description="Content size in bytes.")
+
+class LookupRequest(BaseModel):
+    """Request model for a batch content lookup."""
+    hashes: List[str] = Field([], max_length=MAX_LOOKUP_ITEMS, description="Digests to look up, of any size.")
+    files: List[LookupFile] = Field([], max_length=MAX_LOOKUP_ITEMS, description="(digest, size) pairs to look up.")
+
+class LookupMatch(BaseModel):
+    """One looked-up digest and the indexed files holding that content."""
+    hash: str
+    size: Optional[int]
+    paths: List[str]
+
+class LookupResponse(BaseModel):
+    """Response model for a batch content lookup."""
+    matches: List[LookupMatch]
+    checked: int
+    filtered: int
+
+class PartialDuplicatesResponse(BaseModel):
+    """Response model for the partial duplicates endpoint."""
+    pairs: List[PartialDuplicatePair]
+    estimated_dedup_savings_bytes: int
+
 
 @router.post("/api/scan", response_model=ScanResponse, status_code=200)
 async def trigger_scan(
     scan_request: ScanRequest,
     background_tasks: BackgroundTasks,
+    request: Request,
     session: Session = Depends(get_db_session)
 ):
     """
-    Triggers a background scan of the specified directory.
+    Scans the specified directory and responds once the scan has finished.
+
+    The scan runs off the event loop, so other requests are served meanwhile.
+    Its job id is only returned at the end; to watch or re-limit a running scan
+    (GET/PATCH /api/scan/jobs/{job_id}/limits), find its job, with status
+    ``running``, in GET /api/scan/jobs.
 
     Args:
         scan_request (ScanRequest): The request body containing the directory path.
         background_tasks (BackgroundTasks): FastAPI background task manager.
+        request (Request): The incoming request.
         session (Session): Database session dependency.
 
     Returns:
@@ -56,46 +214,427 @@ async def trigger_scan(
     if not scan_path.is_dir():
         raise HTTPException(status_code=404, detail=f"Directory not found: {scan_path}")
 
-    # Run the scan synchronously for simplicity in this version
+    # The request still waits for the scan to finish, but the scan itself runs in
+    # the threadpool so other requests keep being served meanwhile.
     # For long scans, background_tasks.add_task(scan_directory, scan_path, session) is better
     try:
         # Correct argument order
-        scan_directory(scan_path, session)
-        return ScanResponse(message=f"Scan of directory '{scan_path}' completed.")
+        job = await run_in_threadpool(
+            scan_directory, scan_path, session, scan_request.chunk_threshold_bytes,
+            cache_policy=scan_request.cache_policy, throttle=_throttle_for(scan_request.limits),
+            archive_limits=ArchiveLimits(**scan_request.archives.model_dump()) if scan_request.archives else None,
+        )
+        _rebuild_digest_filter(request, session)
+        return ScanResponse(message=f"Scan of directory '{scan_path}' completed.", job_id=job.id)
     except Exception as e:
         # Log the exception e
         print(f"Error during scan: {e}") # Basic logging
         raise HTTPException(status_code=500, detail=f"An error occurred during the scan: {str(e)}")
 
 
+# Columns serialized by /api/files, in FileEntry field order.
+_FILE_COLUMNS = ("id", "path", "hash", "size", "mtime")
+
+
+def _rebuild_digest_filter(request: Request, session: Session):
+    """Starts rebuilding the lookup filter once a scan has finished writing."""
+    request.app.state.digest_filter.rebuild_in_background(session.get_bind(), force=True)
+
+
+def _throttle_for(limits: Optional[ScanLimits]) -> Optional[ScanThrottle]:
+    """Builds a scan throttle from request limits (None when no limits were given)."""
+    return ScanThrottle(**limits.model_dump(exclude_none=True)) if limits else None
+
+
+@router.get("/api/scan/jobs", response_model=List[ScanJobEntry])
+async def get_scan_jobs(request: Request, session: Session = Depends(get_read_session)):
+    """
+    Lists scan jobs, newest first, with their last checkpointed progress.
+
+    A job that is still ``running`` but no longer advancing was interrupted and
+    can be continued with ``POST /api/scan/jobs/{job_id}/resume``.
+
+    Args:
+        request (Request): The incoming request.
+        session (Session): Read-only database session dependency.
+
+    Returns:
+        List[ScanJobEntry]: The scan jobs.
+    """
+    jobs = await run_read(request, lambda s: s.query(ScanJob).order_by(ScanJob.id.desc()).all(), session)
+    return jobs
+
+
+@router.post("/api/scan/jobs/{job_id}/resume", response_model=ScanResponse)
+async def resume_scan_job(
+    job_id: int,
+    request: Request,
+    limits: Optional[ScanLimits] = None,
+    session: Session = Depends(get_db_session),
+):
+    """
+    Continues an interrupted scan job from its last checkpoint.
+
+    Args:
+        job_id (int): The id of the scan job.
+        request (Request): The incoming request.
+        limits (ScanLimits, optional): I/O limits for the resumed scan.
+        session (Session): Database session dependency.
+
+    Returns:
+        ScanResponse: A message indicating the scan has completed.
+
+    Raises:
+        HTTPException: 404 if the job does not exist.
+    """
+    try:
+        job = await run_in_threadpool(resume_scan, job_id, session, throttle=_throttle_for(limits))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        print(f"Error during scan: {e}") # Basic logging
+        raise HTTPException(status_code=500, detail=f"An error occurred during the scan: {str(e)}")
+    _rebuild_digest_filter(request, session)
+    return ScanResponse(message=f"Scan of directory '{job.root}' completed.", job_id=job.id)
+
+
+def _running_throttle(job_id: int) -> ScanThrottle:
+    """Returns a running job's throttle or raises a 404."""
+    throttle = get_throttle(job_id)
+    if throttle is None:
+        raise HTTPException(status_code=404, detail=f"Scan job {job_id} is not running.")
+    return throttle
+
+
+@router.get("/api/scan/jobs/{job_id}/limits", response_model=ScanLimitsState)
+async def get_scan_limits(job_id: int):
+    """
+    Shows a running scan's I/O limits and its measured read latency and backoff.
+
+    Args:
+        job_id (int): The id of a running scan job (see GET /api/scan/jobs).
+
+    Returns:
+        ScanLimitsState: The current limits and adaptive backoff state.
+
+    Raises:
+        HTTPException: 404 if the job is not running.
+    """
+    return _running_throttle(job_id).settings()
+
+
+@router.patch("/api/scan/jobs/{job_id}/limits", response_model=ScanLimitsState)
+async def update_scan_limits(job_id: int, limits: ScanLimits):
+    """
+    Changes a running scan's I/O limits; hashing workers apply them at their
+    next read. Only the fields sent are changed, and null removes a limit.
+
+    Args:
+        job_id (int): The id of a running scan job (see GET /api/scan/jobs).
+        limits (ScanLimits): The settings to change.
+
+    Returns:
+        ScanLimitsState: The limits now in effect.
+
+    Raises:
+        HTTPException: 404 if the job is not running.
+    """
+    throttle = _running_throttle(job_id)
+    throttle.update(**limits.model_dump(exclude_unset=True))
+    return throttle.settings()
+
+
+def _load_all_files(session: Session) -> bytes:
+    """Serializes every file entry straight from Core rows; runs on the read executor."""
+    table = DBFileEntry.__table__
+    rows = session.execute(select(*(table.c[name] for name in _FILE_COLUMNS)))
+    return rows_to_json(_FILE_COLUMNS, rows)
+
+
+def _load_duplicates(session: Session, **filters) -> bytes:
+    """Finds and serializes duplicate groups; runs on the read executor."""
+    return dumps(find_duplicates(session, **filters))
+
+
+def _load_duplicate_groups(session: Session, offset: int, **options) -> bytes:
+    """Finds and serializes one page of duplicate groups; runs on the read executor."""
+    return dumps({"offset": offset, **find_duplicate_groups(session, offset=offset, **options)})
+
+
+def _load_stats(session: Session, **filters) -> bytes:
+    """Computes and serializes the index-wide totals; runs on the read executor."""
+    return dumps(duplicate_stats(session, **filters))
+
+
+def _load_partial_duplicates(session: Session, min_ratio: float, limit: int) -> bytes:
+    """Finds and serializes partially duplicated file pairs; runs on the read executor."""
+    return dumps(find_partial_duplicates(session, min_ratio, limit))
+
+
+def _lookup(session: Session, queries: List[Tuple[str, Optional[int]]], digest_filter: DigestFilter) -> bytes:
+    """Looks up and serializes indexed paths for a batch of digests; runs on the read executor."""
+    return dumps(lookup_digests(session, queries, digest_filter))
+
+
+def _current_entry(
+    cache: ResponseCache,
+    key: str,
+    identity_key: str,
+    loader: Callable[[Session], bytes],
+    session: Session,
+    use_gzip: bool,
+) -> CacheEntry:
+    """Returns the cached body for the current generation, rendering it on a miss; runs on the read executor."""
+    # Reason: Read the counter before querying; a write racing with the query
+    # leaves the entry tagged with an already stale generation.
+    generation = get_change_counter(session)
+    entry = cache.get(key, generation)
+    if entry is not None:
+        return entry
+    identity_entry = cache.get(identity_key, generation) if use_gzip else None
+    if identity_entry is not None:
+        # Reason: Compress the cached body instead of querying again.
+        body, encoding = maybe_gzip(identity_entry.body, True)
+    else:
+        body, encoding = maybe_gzip(loader(session), use_gzip)
+    return cache.put(key, generation, body, encoding)
+
+
+async def _cached_json_response(request: Request, session: Session, loader: Callable[[Session], bytes]) -> Response:
+    """
+    Serves a JSON body from the app's response cache, revalidating with ETags.
+
+    The cache is keyed on the request path, query string and negotiated
+    encoding, and tagged with the database change counter, so as long as
+    nothing has been written (by any process) the body is reused, and a
+    matching If-None-Match gets a 304 after reading only the counter. Each
+    encoding is a separate representation with its own strong ETag.
+
+    Args:
+        request (Request): The incoming request.
+        session (Session): Read-only database session used on a cache miss.
+        loader (Callable): Produces the serialized body from a session.
+
+    Returns:
+        Response: A 200 with the JSON body, or an empty 304 Not Modified.
+    """
+    use_gzip = accepts_gzip(request.headers.get("accept-encoding"))
+    identity_key = f"{request.url.path}?{request.url.query}"
+    key = f"{identity_key} gzip" if use_gzip else identity_key
+    # Reason: One executor hop per request, whether it hits or misses.
+    entry = await run_read(
+        request, _current_entry, request.app.state.response_cache, key, identity_key, loader, session, use_gzip
+    )
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    if entry.encoding:
+        headers["Content-Encoding"] = entry.encoding
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
 @router.get("/api/files", response_model=List[FileEntry])
-async def get_all_files(session: Session = Depends(get_db_session)):
+async def get_all_files(request: Request, session: Session = Depends(get_read_session)):
     """
     Retrieves a list of all files currently stored in the database.
 
+    Supports conditional requests: the response carries a strong ETag and an
+    unchanged poll with If-None-Match returns 304 Not Modified. Rows are
+    serialized directly (no per-row model validation) and gzip-compressed
+    when the client accepts it.
+
     Args:
-        session (Session): Database session dependency.
+        request (Request): The incoming request.
+        session (Session): Read-only database session dependency.
 
     Returns:
         List[FileEntry]: A list of file entries.
     """
-    files = session.query(DBFileEntry).all()
-    return files
+    # Reason: Query off the event loop so a slow read never stalls other requests.
+    return await _cached_json_response(request, session, _load_all_files)
 
 
 @router.get("/api/duplicates", response_model=Dict[str, List[str]])
-async def get_duplicates(session: Session = Depends(get_db_session)):
+async def get_duplicates(
+    request: Request,
+    min_size: Optional[int] = Query(None, ge=0, description="Only consider files at least this many bytes large."),
+    path_prefix: Optional[str] = Query(None, min_length=1, description="Only consider files under this path prefix."),
+    order_by: Optional[Literal["wasted", "count", "size"]] = Query(None, description="Rank groups, largest first."),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of groups."),
+    session: Session = Depends(get_read_session),
+):
     """
     Retrieves a dictionary of duplicate files, grouped by hash.
 
+    Filtering, ranking and the top-N limit are applied in SQL, so the most
+    wasteful groups can be fetched without downloading every group.
+
+    Supports conditional requests: the response carries a strong ETag and an
+    unchanged poll with If-None-Match returns 304 Not Modified.
+
     Args:
-        session (Session): Database session dependency.
+        request (Request): The incoming request.
+        min_size (int, optional): Minimum file size in bytes.
+        path_prefix (str, optional): Path prefix the files must start with.
+        order_by (str, optional): "wasted", "count" or "size", largest first.
+        limit (int, optional): Maximum number of groups to return.
+        session (Session): Read-only database session dependency.
 
     Returns:
         Dict[str, List[str]]: A dictionary where keys are file hashes
                                and values are lists of paths for duplicate files.
     """
-    # Call the find_duplicates function imported from scanner.py
-    duplicates = find_duplicates(session)
-    return duplicates
+    loader = partial(_load_duplicates, min_size=min_size, path_prefix=path_prefix, order_by=order_by, limit=limit)
+    return await _cached_json_response(request, session, loader)
+
+
+@router.get("/api/duplicates/groups", response_model=DuplicateGroupsPage)
+async def get_duplicate_groups(
+    request: Request,
+    offset: int = Query(0, ge=0, description="Number of ranked groups to skip."),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of groups."),
+    order_by: Literal["wasted", "count", "size"] = Query("wasted", description="Rank groups, largest first."),
+    min_size: Optional[int] = Query(None, ge=0, description="Only consider files at least this many bytes large."),
+    path_prefix: Optional[str] = Query(None, min_length=1, description="Only consider files under this path prefix."),
+    max_paths: int = Query(50, ge=1, le=1000, description="Maximum number of paths listed per group."),
+    session: Session = Depends(get_read_session),
+):
+    """
+    Retrieves one page of duplicate groups, ranked on the server, with each
+    group's file size, number of copies and wasted bytes.
+
+    Used by the web UI to load groups incrementally as the list is scrolled.
+
+    Args:
+        request (Request): The incoming request.
+        offset (int): Number of ranked groups to skip.
+        limit (int): Maximum number of groups to return.
+        order_by (str): "wasted", "count" or "size", largest first.
+        min_size (int, optional): Minimum file size in bytes.
+        path_prefix (str, optional): Path prefix the files must start with.
+        max_paths (int): Maximum number of paths listed per group.
+        session (Session): Read-only database session dependency.
+
+    Returns:
+        DuplicateGroupsPage: The total number of groups and the requested page.
+    """
+    loader = partial(
+        _load_duplicate_groups, offset=offset, limit=limit, order_by=order_by,
+        min_size=min_size, path_prefix=path_prefix, max_paths=max_paths,
+    )
+    return await _cached_json_response(request, session, loader)
+
 
+@router.get("/api/stats", response_model=StatsResponse)
+async def get_stats(
+    request: Request,
+    min_size: Optional[int] = Query(None, ge=0, description="Only consider files at least this many bytes large."),
+    path_prefix: Optional[str] = Query(None, min_length=1, description="Only consider files under this path prefix."),
+    session: Session = Depends(get_read_session),
+):
+    """
+    Retrieves totals for the index: files, bytes, duplicate groups and the
+    bytes that removing duplicates would reclaim.
+
+    Args:
+        request (Request): The incoming request.
+        min_size (int, optional): Minimum file size in bytes.
+        path_prefix (str, optional): Path prefix the files must start with.
+        session (Session): Read-only database session dependency.
+
+    Returns:
+        StatsResponse: The totals.
+    """
+    loader = partial(_load_stats, min_size=min_size, path_prefix=path_prefix)
+    return await _cached_json_response(request, session, loader)
+
+
+@router.post("/api/lookup", response_model=LookupResponse)
+async def lookup_files(
+    lookup_request: LookupRequest,
+    request: Request,
+    session: Session = Depends(get_read_session),
+):
+    """
+    Checks which of a batch of contents are already indexed.
+
+    Digests that are certainly not indexed are answered from an in-memory
+    Bloom filter of the index, rebuilt after the index changes, without
+    touching the database; the rest are looked up with the hash index.
+
+    Args:
+        lookup_request (LookupRequest): Digests, and (digest, size) pairs, to look up.
+        request (Request): The incoming request.
+        session (Session): Read-only database session dependency.
+
+    Returns:
+        LookupResponse: The indexed paths of every query that matched, in query order.
+    """
+    queries = [(digest, None) for digest in lookup_request.hashes]
+    queries += [(item.hash, item.size) for item in lookup_request.files]
+    body = await run_read(request, _lookup, session, queries, request.app.state.digest_filter)
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/api/estimate", response_model=EstimateResponse)
+async def get_estimate(
+    directory_path: str = Query(..., description="Directory to examine."),
+    sample_size: int = Query(DEFAULT_SAMPLE_SIZE, ge=1, le=100000, description="Size buckets to partial-hash."),
+    subtree_fraction: float = Query(1.0, gt=0.0, le=1.0, description="Probability of descending into each subdirectory."),
+    confidence: float = Query(DEFAULT_CONFIDENCE, gt=0.0, lt=1.0, description="Confidence level of the bounds."),
+    seed: Optional[int] = Query(None, description="Seed for reproducible sampling."),
+):
+    """
+    Estimates the duplicate bytes under a directory without scanning it,
+    from file size collisions and partial hashes of a sample of them.
+
+    Nothing is written to the index.
+
+    Args:
+        directory_path (str): The directory to examine.
+        sample_size (int): Number of size buckets to partial-hash.
+        subtree_fraction (float): Probability of descending into each subdirectory.
+        confidence (float): Confidence level of the bounds.
+        seed (int, optional): Seed for reproducible sampling.
+
+    Returns:
+        EstimateResponse: The estimate, its bounds and a size histogram.
+
+    Raises:
+        HTTPException: 404 if the directory is not found.
+    """
+    estimate_path = Path(directory_path)
+    if not estimate_path.is_dir():
+        raise HTTPException(status_code=404, detail=f"Directory not found: {estimate_path}")
+    return await run_in_threadpool(
+        estimate_duplication, estimate_path, sample_size=sample_size,
+        subtree_fraction=subtree_fraction, confidence=confidence, seed=seed,
+    )
+
+
+
+@router.get("/api/partial-duplicates", response_model=PartialDuplicatesResponse)
+async def get_partial_duplicates(
+    request: Request,
+    min_ratio: float = Query(0.5, ge=0.0, le=1.0, description="Minimum shared fraction of the larger file."),
+    limit: int = Query(100, ge=1, le=10000, description="Maximum number of pairs."),
+    session: Session = Depends(get_read_session),
+):
+    """
+    Retrieves file pairs that share many content-defined chunks, and an estimate
+    of the bytes block-level deduplication would save.
+
+    Only files scanned with ``chunk_threshold_bytes`` set are considered.
+
+    Args:
+        request (Request): The incoming request.
+        min_ratio (float): Minimum shared bytes as a fraction of the larger file.
+        limit (int): Maximum number of pairs to return.
+        session (Session): Read-only database session dependency.
+
+    Returns:
+        PartialDuplicatesResponse: The ranked pairs and the savings estimate.
+    """
+    loader = partial(_load_partial_duplicates, min_ratio=min_ratio, limit=limit)
+    return await _cached_json_response(request, session, loader)
@@ -0,0 +1,171 @@
+"""
+Hashing of zip and tar archive members without extracting them.
+
+Each member is streamed from the archive in BLOCK_SIZE blocks straight into
+its digest, so memory does not depend on member or archive size. Members are
+indexed under virtual paths joining the archive's path and the member's name
+with ARCHIVE_SEPARATOR, e.g. ``/data/backup.zip!/docs/report.pdf``.
+
+Tar archives (plain, gzip, bzip2 or xz) are read front to back; zip archives are read member by member through their central
+directory.
+"""
+import calendar
+import hashlib
+import lzma
+import posixpath
+import tarfile
+import zipfile
+import zlib
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Iterator, NamedTuple, Optional, Union
+
+from app.core.hashing import BLOCK_SIZE
+
+if TYPE_CHECKING:
+    from app.core.exclusions import ExclusionRules
+    from app.core.throttle import ScanThrottle
+
+ARCHIVE_SEPARATOR = "!/"
+ZIP_SUFFIXES = (".zip",)
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# Per-archive limits, so a huge archive or a decompression bomb cannot stall a scan.
+DEFAULT_MAX_ARCHIVE_BYTES = 16 * 1024 * 1024 * 1024 # Uncompressed member bytes
+DEFAULT_MAX_ARCHIVE_MEMBERS = 100_000
+
+# Errors that mean an archive is corrupt or unreadable (bz2 raises OSError), rather than a bug.
+_ARCHIVE_ERRORS = (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError, zlib.error, lzma.LZMAError)
+# Errors that only spoil one member: encryption (RuntimeError), an unsupported
+# compression method such as deflate64 (NotImplementedError) or a corrupt member header.
+_MEMBER_ERRORS = (RuntimeError, NotImplementedError, ValueError)
+
+
+class ArchiveLimits(NamedTuple):
+    """Most uncompressed bytes and members read from one archive."""
+    max_bytes: int = DEFAULT_MAX_ARCHIVE_BYTES
+    max_members: int = DEFAULT_MAX_ARCHIVE_MEMBERS
+
+
+class ArchiveMember(NamedTuple):
+    """One hashed archive member."""
+    path: str # Virtual path: archive path + ARCHIVE_SEPARATOR + member name
+    hash: str # Hex SHA-256 of the member's content
+    size: int
+    mtime: float
+
+
+class ArchiveLimitExceeded(Exception):
+    """Raised when an archive holds more members or bytes than its limits allow."""
+
+
+def is_archive(path: Union[str, Path]) -> bool:
+    """Checks by name whether a file is a zip or tar archive that members can be read from."""
+    return str(path).lower().endswith(ZIP_SUFFIXES + TAR_SUFFIXES)
+
+
+def member_path(archive_path: Union[str, Path], name: str) -> str:
+    """Builds the virtual path of an archive member."""
+    # Reason: Leading "/" or "./" in member names would make equal members differ by path.
+    name = posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+    return f"{archive_path}{ARCHIVE_SEPARATOR}{name}"
+
+
+def _hash_stream(
+    stream: IO[bytes],
+    budget: int,
+    name: str,
+    throttle: Optional["ScanThrottle"] = None,
+) -> tuple:
+    """Digests a member stream, failing once more than budget bytes come out of it."""
+    hasher = hashlib.sha256()
+    size = 0
+
+    def blocks():
+        while True:
+            data = stream.read(BLOCK_SIZE)
+            if not data:
+                return
+            yield data
+
+    for data in throttle.throttled(blocks()) if throttle else blocks():
+        size += len(data)
+        # Reason: Count what actually decompresses; declared sizes can lie.
+        if size > budget:
+            raise ArchiveLimitExceeded(f"member {name!r} exceeds the archive's remaining byte budget")
+        hasher.update(data)
+    return hasher.hexdigest(), size
+
+
+def _zip_members(path: str):
+    """Yields (name, size, mtime, opener) for the regular files of a zip archive."""
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            # Reason: Zip timestamps carry no time zone; read them as UTC so they are stable across hosts.
+            mtime = float(calendar.timegm(info.date_time + (0, 0, 0)))
+            yield info.filename, info.file_size, mtime, lambda info=info: archive.open(info)
+
+
+def _tar_members(path: str):
+    """Yields (name, size, mtime, opener) for the regular files of a tar archive, in stream order."""
+    # Reason: Unlike stream mode ("r|*"), which inflates whole compressed buffers at
+    # once, "r:*" decompresses at most what each read asks for. Members are read in
+    # order, so seeks only ever skip forward.
+    with tarfile.open(path, mode="r:*") as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            yield info.name, info.size, float(info.mtime), lambda info=info: archive.extractfile(info)
+
+
+def hash_archive_members(
+    archive_path: Union[str, Path],
+    limits: ArchiveLimits = ArchiveLimits(),
+    exclusions: Optional["ExclusionRules"] = None,
+    throttle: Optional["ScanThrottle"] = None,
+) -> Iterator[ArchiveMember]:
+    """
+    Streams every regular file of a zip or tar archive through SHA-256.
+
+    Reading stops, with a warning, at the first member that would exceed the
+    archive's limits or at a corrupt part of the archive; members hashed until
+    then are still yielded. Encrypted members, members with an unsupported
+    compression method and members with corrupt headers are skipped. Nested archives
+    are hashed as plain members, not opened.
+
+    Args:
+        archive_path (Union[str, Path]): The archive file.
+        limits (ArchiveLimits): Most members and uncompressed bytes to read.
+        exclusions (ExclusionRules, optional): Extension and size rules applied to members.
+        throttle (ScanThrottle, optional): Rate limits applied to the decompressed reads.
+
+    Yields:
+        ArchiveMember: Each hashed member, in archive order.
+    """
+    archive_path = str(archive_path)
+    members = _zip_members if archive_path.lower().endswith(ZIP_SUFFIXES) else _tar_members
+    count = total = 0
+    try:
+        for name, declared_size, mtime, opener in members(archive_path):
+            if exclusions is not None and (
+                exclusions.excludes_size(declared_size)
+                or (exclusions.extensions and name.lower().endswith(exclusions.extensions))
+            ):
+                continue
+            count += 1
+            if count > limits.max_members:
+                raise ArchiveLimitExceeded(f"more than {limits.max_members} members")
+            if throttle:
+                throttle.before_file()
+            try:
+                with opener() as stream:
+                    digest, size = _hash_stream(stream, limits.max_bytes - total, name, throttle)
+            except _MEMBER_ERRORS as e:
+                print(f"Warning: Skipping archive member {member_path(archive_path, name)}: {e}")
+                continue
+            total += size
+            yield ArchiveMember(member_path(archive_path, name), digest, size, mtime)
+    except ArchiveLimitExceeded as e:
+        print(f"Warning: Stopped reading archive {archive_path}: {e}.")
+    except _ARCHIVE_ERRORS as e:
+        print(f"Warning: Could not read archive {archive_path}: {e}")
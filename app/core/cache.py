@@ -0,0 +1,130 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+
+class CacheEntry(NamedTuple):
+    """A cached response body together with its strong ETag."""
+    generation: int
+    etag: str
+    body: bytes
+    encoding: Optional[str] = None
+
+
+def make_etag(body: bytes) -> str:
+    """
+    Computes a strong ETag for a response body.
+
+    Args:
+        body (bytes): The exact bytes that will be sent.
+
+    Returns:
+        str: A quoted entity tag derived from the body's SHA-256 digest.
+    """
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Checks an If-None-Match header against an ETag.
+
+    If-None-Match uses the weak comparison function, so a ``W/`` prefix on
+    either side is ignored.
+
+    Args:
+        if_none_match (str, optional): The raw If-None-Match header value.
+        etag (str): The current ETag of the resource.
+
+    Returns:
+        bool: True if the client's cached copy is still current.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+
+class ResponseCache:
+    """
+    A thread-safe, size-bounded LRU cache of serialized API responses.
+
+    Entries are tagged with the database change counter they were computed at
+    (see app.core.db.get_change_counter); an entry from an older generation is
+    treated as a miss and dropped.
+
+    Args:
+        max_entries (int): Maximum number of cached responses.
+        max_bytes (int): Maximum total size of cached bodies, in bytes.
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, generation: int) -> Optional[CacheEntry]:
+        """
+        Looks up a response computed at the given generation.
+
+        Args:
+            key (str): The cache key (request path and query string).
+            generation (int): The current database change counter.
+
+        Returns:
+            Optional[CacheEntry]: The entry, or None if missing or stale.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.generation != generation:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, generation: int, body: bytes, encoding: Optional[str] = None) -> CacheEntry:
+        """
+        Stores a response body and evicts least recently used entries as needed.
+
+        Bodies larger than max_bytes are returned as an entry but not stored.
+
+        Args:
+            key (str): The cache key (request path and query string).
+            generation (int): The change counter the body was computed at.
+            body (bytes): The serialized response body.
+            encoding (str, optional): The body's Content-Encoding, if compressed.
+
+        Returns:
+            CacheEntry: The new entry, including its ETag.
+        """
+        entry = CacheEntry(generation, make_etag(body), body, encoding)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.total_bytes += len(body)
+            # Reason: Evict from the LRU end until both bounds hold again.
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+        return entry
+
+    def clear(self):
+        """Drops every cached entry."""
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.total_bytes -= len(entry.body)
@@ -1,8 +1,14 @@
 import json
+import threading
 from pathlib import Path
 
+from app.core.exclusions import ExclusionRules
+
 CONFIG_FILE = Path(__file__).parent.parent / "config.json"
 
+_exclusion_cache = {} # {"key": config file stat key, "rules": ExclusionRules}
+_exclusion_lock = threading.Lock()
+
 def read_config() -> dict:
     """
     Reads the configuration from the config file.
@@ -25,3 +31,31 @@ def update_config(config_data: dict):
     """
     with open(CONFIG_FILE, "w") as f:
         json.dump(config_data, f, indent=4)
+    with _exclusion_lock:
+        _exclusion_cache.clear()
+
+def load_exclusion_rules() -> ExclusionRules:
+    """
+    Returns the compiled exclusion rules from the config file.
+
+    Rules are compiled once and reused until the config file changes.
+
+    Returns:
+        ExclusionRules: The exclusion settings to scan with.
+    """
+    try:
+        stat = CONFIG_FILE.stat()
+        key = (str(CONFIG_FILE), stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        key = (str(CONFIG_FILE), None, None)
+    with _exclusion_lock:
+        if _exclusion_cache.get("key") == key:
+            return _exclusion_cache["rules"]
+    try:
+        rules = ExclusionRules.from_config(read_config())
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Warning: Could not load or parse config file {CONFIG_FILE}: {e}")
+        rules = ExclusionRules()
+    with _exclusion_lock:
+        _exclusion_cache.update(key=key, rules=rules)
+    return rules
@@ -1,20 +1,230 @@
-from sqlalchemy import create_engine, func, select
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event, func, inspect, select, text
+from sqlalchemy.engine import URL, Engine
 from sqlalchemy.orm import sessionmaker, Session
+from app.models.change_counter import ChangeCounter # Registers the change_counter table on Base
 from app.models.file_entry import Base, FileEntry # Import FileEntry model
-from typing import Dict, List
+from app.models.file_chunk import FileChunk # Registers the file_chunks table on Base
+from app.models.scan_job import ScanFrontier, ScanJob # Registers the scan job tables on Base
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+import asyncio
+import os
+import threading
 
-def create_db_engine(db_file: str = "files.db"):
+# Default number of pooled read-only connections, and of threads serving reads.
+READ_POOL_SIZE = 4
+
+# Default database file, in the project root (one level up from the app package).
+DEFAULT_DB_FILE = str(Path(__file__).resolve().parents[2] / "files.db")
+# Prefix of the environment variables read by DatabaseSettings.from_env.
+ENV_PREFIX = "DUPFINDER_"
+
+
+# Reason: Bumps the persisted change counter; upserts so databases created
+# without create_db_and_tables (e.g. in tests) need no seeded row.
+_BUMP_GENERATION = (
+    f"INSERT INTO {ChangeCounter.__tablename__} (id, generation) VALUES (1, 1) "
+    "ON CONFLICT(id) DO UPDATE SET generation = generation + 1"
+)
+# Connection info key marking a transaction whose writes have already bumped the counter.
+_BUMPED = "change_counter_bumped"
+
+
+def get_change_counter(db: Session) -> int:
+    """
+    Returns the database change counter.
+
+    The counter is a row of the database itself, bumped in the same
+    transaction as the writes made through any engine set up with
+    track_changes (as create_db_engine does), whichever process issues them.
+    Anything derived from the data (e.g. cached API responses) is tagged with
+    it to tell whether it is still current.
+
+    Args:
+        db (Session): The session to read the counter through.
+
+    Returns:
+        int: A value that increases every time written data may have changed.
+    """
+    # Reason: A write later in this transaction must bump again, or whoever read
+    # this value would see changed data under the same generation.
+    db.connection().info.pop(_BUMPED, None)
+    return db.execute(select(ChangeCounter.generation).where(ChangeCounter.id == 1)).scalar() or 0
+
+
+def _bump_before_first_write(conn, cursor, statement, parameters, context, executemany):
+    # Reason: Bumped before the write on its own cursor, so results of
+    # INSERT ... RETURNING are untouched; a rollback undoes both together.
+    if conn.info.get(_BUMPED) or context is None or not (context.isinsert or context.isupdate or context.isdelete):
+        return
+    bump = cursor.connection.cursor()
+    try:
+        bump.execute(_BUMP_GENERATION)
+    finally:
+        bump.close()
+    conn.info[_BUMPED] = True
+
+
+def _end_transaction(conn, *args):
+    conn.info.pop(_BUMPED, None)
+
+
+def track_changes(engine: Engine):
+    """
+    Makes writes through a SQLite engine bump the change counter (see get_change_counter).
+
+    The counter is bumped once per transaction, just before its first INSERT,
+    UPDATE or DELETE, so batched writes such as a scan's cost one extra
+    statement per commit. Calling this again for the same engine has no effect.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): An engine on a database holding the change_counter table.
+    """
+    if event.contains(engine, "before_cursor_execute", _bump_before_first_write):
+        return
+    event.listen(engine, "before_cursor_execute", _bump_before_first_write)
+    # Reason: After a rollback (also to a savepoint) the bump may be undone too.
+    for name in ("commit", "rollback", "rollback_savepoint"):
+        event.listen(engine, name, _end_transaction)
+
+
+class DatabaseSettings(NamedTuple):
+    """
+    How the app opens its SQLite database.
+
+    Attributes:
+        db_file (str): Path to the database file.
+        read_pool_size (int): Pooled read-only connections for the GET endpoints.
+        busy_timeout_ms (int): How long a connection waits for a lock.
+        synchronous (str): The read-write connections' ``synchronous`` pragma.
+        pragmas (Tuple[Tuple[str, str], ...]): Extra pragmas set on every connection,
+                                               e.g. (("cache_size", "-65536"),).
+    """
+    db_file: str = DEFAULT_DB_FILE
+    read_pool_size: int = READ_POOL_SIZE
+    busy_timeout_ms: int = 5000
+    synchronous: str = "NORMAL"
+    pragmas: Tuple[Tuple[str, str], ...] = ()
+
+    @classmethod
+    def from_env(cls, environ: Optional[Dict[str, str]] = None) -> "DatabaseSettings":
+        """
+        Reads settings from ``DUPFINDER_*`` environment variables.
+
+        Recognized variables are ``DUPFINDER_DB_FILE``, ``DUPFINDER_READ_POOL_SIZE``,
+        ``DUPFINDER_BUSY_TIMEOUT_MS``, ``DUPFINDER_SYNCHRONOUS`` and
+        ``DUPFINDER_SQLITE_PRAGMAS`` (``name=value`` pairs separated by ``;``).
+        Unset variables keep their defaults.
+
+        Args:
+            environ (Dict[str, str], optional): Variables to read instead of os.environ.
+
+        Returns:
+            DatabaseSettings: The settings.
+
+        Raises:
+            ValueError: If a numeric setting or a pragma is malformed.
+        """
+        environ = os.environ if environ is None else environ
+        defaults = cls()
+        pragmas = []
+        for item in environ.get(f"{ENV_PREFIX}SQLITE_PRAGMAS", "").split(";"):
+            if not item.strip():
+                continue
+            name, sep, value = item.partition("=")
+            if not sep or not name.strip().isidentifier():
+                raise ValueError(f"Malformed SQLite pragma {item!r}; expected name=value.")
+            pragmas.append((name.strip(), value.strip()))
+        return cls(
+            db_file=environ.get(f"{ENV_PREFIX}DB_FILE", defaults.db_file),
+            read_pool_size=int(environ.get(f"{ENV_PREFIX}READ_POOL_SIZE", defaults.read_pool_size)),
+            busy_timeout_ms=int(environ.get(f"{ENV_PREFIX}BUSY_TIMEOUT_MS", defaults.busy_timeout_ms)),
+            synchronous=environ.get(f"{ENV_PREFIX}SYNCHRONOUS", defaults.synchronous),
+            pragmas=tuple(pragmas),
+        )
+
+    def write_pragmas(self) -> Dict[str, str]:
+        """Pragmas for read-write connections."""
+        # Reason: WAL journaling lets readers keep reading the last committed snapshot
+        # while a scan holds the write lock, instead of failing with SQLITE_BUSY or waiting.
+        # Reason: SQLite ignores foreign keys (and so ON DELETE CASCADE) unless each
+        # connection turns them on; deleted files would leave their chunks behind.
+        return {"journal_mode": "WAL", "synchronous": self.synchronous, "foreign_keys": "ON",
+                "busy_timeout": str(self.busy_timeout_ms), **dict(self.pragmas)}
+
+    def read_pragmas(self) -> Dict[str, str]:
+        """Pragmas for read-only connections."""
+        return {"query_only": "ON", "busy_timeout": str(self.busy_timeout_ms), **dict(self.pragmas)}
+
+
+def _pragma_listener(pragmas: Dict[str, str]) -> Callable:
+    """Returns a connect listener that sets the given pragmas on every new SQLite connection."""
+    statements = [f"PRAGMA {name}={value}" for name, value in pragmas.items()]
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+    return set_pragmas
+
+def create_db_engine(db_file: str = "files.db", pragmas: Optional[Dict[str, str]] = None):
     """
     Creates a SQLite database engine.
 
     Args:
         db_file (str): The path to the database file. Defaults to "files.db".
+        pragmas (Dict[str, str], optional): Pragmas set on every new connection.
+                                            Defaults to DatabaseSettings().write_pragmas().
 
     Returns:
         sqlalchemy.engine.Engine: The database engine.
     """
     # connect_args is specific to SQLite to allow multi-threaded access (like from FastAPI)
-    engine = create_engine(f"sqlite:///{db_file}", connect_args={"check_same_thread": False})
+    # Reason: A URL object passes the path as it is; in a URL string "?" would start the query.
+    engine = create_engine(URL.create("sqlite", database=db_file), connect_args={"check_same_thread": False})
+    pragmas = DatabaseSettings().write_pragmas() if pragmas is None else pragmas
+    event.listen(engine, "connect", _pragma_listener(pragmas))
+    track_changes(engine)
+    return engine
+
+
+def create_read_engine(
+    db_file: str = "files.db",
+    pool_size: int = READ_POOL_SIZE,
+    pragmas: Optional[Dict[str, str]] = None,
+):
+    """
+    Creates a pooled, read-only SQLite engine for the API read path.
+
+    The database must already exist (see create_db_and_tables); it is opened
+    with ``mode=ro`` so a read connection can never take the write lock.
+
+    Args:
+        db_file (str): The path to the database file. Defaults to "files.db".
+        pool_size (int): Number of pooled connections. Defaults to READ_POOL_SIZE.
+        pragmas (Dict[str, str], optional): Pragmas set on every new connection.
+                                            Defaults to DatabaseSettings().read_pragmas().
+
+    Returns:
+        sqlalchemy.engine.Engine: The read-only database engine.
+    """
+    # Reason: The path is percent-encoded into the SQLite URI, so "?", "#" or "%"
+    # in it cannot be read as URI syntax and open a different file.
+    url = URL.create("sqlite", database=f"file:{quote(db_file)}?mode=ro", query={"uri": "true"})
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=pool_size,
+        max_overflow=0,
+    )
+    pragmas = DatabaseSettings().read_pragmas() if pragmas is None else pragmas
+    event.listen(engine, "connect", _pragma_listener(pragmas))
     return engine
 
 
@@ -26,25 +236,214 @@ def create_db_and_tables(engine):
         engine (sqlalchemy.engine.Engine): The database engine.
     """
     Base.metadata.create_all(engine)
+    _upgrade_schema(engine)
 
 
-def get_db_session(engine):
+def _upgrade_schema(engine):
     """
-    Provides a database session context manager.
+    Brings tables created by an older version up to date.
+
+    create_all only creates missing tables, so nullable columns added to a
+    model since are added here with ALTER TABLE, and indexes added since are
+    created.
 
     Args:
         engine (sqlalchemy.engine.Engine): The database engine.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            missing = [column for column in table.columns if column.name not in existing]
+            for column in missing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+class Database:
+    """
+    The app's engines and the session factories shared by every request.
+
+    Engines are created on first use, so building an app (or importing
+    app.main) touches no database; the file and its tables are created then,
+    on a worker thread (see session_factory). Reads run on a dedicated
+    executor with one thread per pooled read connection. Engines passed in, e.g. an in-memory engine in tests, get change tracking
+    (see track_changes) but are otherwise used as they are and left for the
+    caller to dispose.
+
+    Args:
+        settings (DatabaseSettings, optional): Defaults to DatabaseSettings.from_env().
+        engine (sqlalchemy.engine.Engine, optional): A read-write engine to use.
+        read_engine (sqlalchemy.engine.Engine, optional): A read-only engine to use;
+                                                          defaults to engine when one is given.
+    """
+
+    def __init__(self, settings: Optional[DatabaseSettings] = None, engine=None, read_engine=None):
+        self.settings = settings or DatabaseSettings.from_env()
+        if engine is not None:
+            track_changes(engine)
+        self._engine = engine
+        self._read_engine = read_engine if read_engine is not None else engine
+        self._owned: List[Any] = []
+        self._sessions: Optional[sessionmaker] = None
+        self._read_sessions: Optional[sessionmaker] = None
+        self._read_executor: Optional[ThreadPoolExecutor] = None
+        # Reason: Reentrant, as the session factories create engines while holding it.
+        self._lock = threading.RLock()
+
+    @property
+    def engine(self):
+        """The read-write engine, created (with the database's tables) on first use."""
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    Path(self.settings.db_file).parent.mkdir(parents=True, exist_ok=True)
+                    engine = create_db_engine(self.settings.db_file, self.settings.write_pragmas())
+                    create_db_and_tables(engine)
+                    self._owned.append(engine)
+                    self._engine = engine
+        return self._engine
+
+    @property
+    def read_engine(self):
+        """The pooled read-only engine, created on first use."""
+        if self._read_engine is None:
+            # Reason: The read-only engine cannot create the file; the read-write one does.
+            self.engine
+            with self._lock:
+                if self._read_engine is None:
+                    engine = create_read_engine(
+                        self.settings.db_file, self.settings.read_pool_size, self.settings.read_pragmas()
+                    )
+                    self._owned.append(engine)
+                    self._read_engine = engine
+        return self._read_engine
+
+    @property
+    def sessions(self) -> sessionmaker:
+        """Factory of read-write sessions."""
+        if self._sessions is None:
+            with self._lock:
+                if self._sessions is None:
+                    self._sessions = sessionmaker(autoflush=False, bind=self.engine)
+        return self._sessions
+
+    @property
+    def read_sessions(self) -> sessionmaker:
+        """Factory of sessions on the read-only engine."""
+        if self._read_sessions is None:
+            with self._lock:
+                if self._read_sessions is None:
+                    self._read_sessions = sessionmaker(autoflush=False, bind=self.read_engine)
+        return self._read_sessions
+
+    @property
+    def read_executor(self) -> ThreadPoolExecutor:
+        """Threads running blocking reads (see run_read), one per pooled read connection."""
+        if self._read_executor is None:
+            with self._lock:
+                if self._read_executor is None:
+                    # Reason: A dedicated executor keeps read queries off the event loop without
+                    # competing with scans for the shared FastAPI/anyio threadpool.
+                    self._read_executor = ThreadPoolExecutor(
+                        max_workers=self.settings.read_pool_size, thread_name_prefix="db-read"
+                    )
+        return self._read_executor
+
+    async def session_factory(self, read: bool = False) -> sessionmaker:
+        """
+        Returns the read-write or read-only session factory from async code.
+
+        The first call creates the engines on a worker thread, since creating
+        or upgrading the database (e.g. building an index on a large table)
+        can take long and must not stall the event loop. Concurrent first
+        calls wait for the same creation.
+
+        Args:
+            read (bool): Return the factory of read-only sessions.
+
+        Returns:
+            sessionmaker: The session factory.
+        """
+        factory = self._read_sessions if read else self._sessions
+        if factory is None:
+            factory = await run_in_threadpool(lambda: self.read_sessions if read else self.sessions)
+        return factory
+
+    def dispose(self):
+        """
+        Closes the pooled connections of the engines this object created and
+        stops its read threads; both are recreated on next use.
+        """
+        with self._lock:
+            if self._read_executor is not None:
+                self._read_executor.shutdown(wait=True)
+                self._read_executor = None
+            for engine in self._owned:
+                engine.dispose()
+                if self._engine is engine:
+                    self._engine = None
+                if self._read_engine is engine:
+                    self._read_engine = None
+            if self._owned:
+                self._sessions = self._read_sessions = None
+            self._owned.clear()
+
+
+# Reason: The dependencies are async so FastAPI runs them on the event loop instead of
+# two threadpool hops per request; opening a session does not connect, and closing
+# one only returns its connection to the pool.
+async def get_db_session(request: Request) -> AsyncIterator[Session]:
+    """
+    Provides a read-write session from the app's Database (``app.state.database``).
+
+    Args:
+        request (Request): The incoming request.
+
+    Yields:
+        Session: A SQLAlchemy Session object, closed after the request.
+    """
+    session = (await request.app.state.database.session_factory())()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+async def get_read_session(request: Request) -> AsyncIterator[Session]:
+    """
+    Provides a session bound to the app's read-only engine.
+
+    Args:
+        request (Request): The incoming request.
 
     Yields:
-        Session: A SQLAlchemy Session object.
+        Session: A SQLAlchemy Session object, closed after the request.
     """
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    session = SessionLocal()
+    session = (await request.app.state.database.session_factory(read=True))()
     try:
         yield session
     finally:
         session.close()
 
+
+async def run_read(request: Request, func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Runs a blocking database read on the app's read executor and awaits its result.
+
+    Args:
+        request (Request): The incoming request, whose app's Database (``app.state.database``) is used.
+        func (Callable): The blocking function to run.
+        *args: Positional arguments passed to func.
+
+    Returns:
+        Any: Whatever func returns.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(request.app.state.database.read_executor, func, *args)
+
 # --- Add this function ---
 def find_duplicates_in_db(session: Session) -> Dict[str, List[str]]:
     """
@@ -0,0 +1,254 @@
+import hashlib
+import math
+import os
+import random
+import time
+from collections import Counter
+from pathlib import Path
+from statistics import NormalDist
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import load_exclusion_rules
+from app.core.exclusions import ExclusionRules
+from app.core.hashing import BLOCK_SIZE, partial_digest
+from app.core.scanner import _iter_directory
+
+# Number of size buckets drawn for partial hashing.
+DEFAULT_SAMPLE_SIZE = 200
+# Files kept (by reservoir sampling) per drawn size bucket, and so hashed per drawn bucket.
+# Smaller buckets are hashed whole, which makes their duplicate fraction exact.
+BUCKET_RESERVOIR_SIZE = 256
+DEFAULT_CONFIDENCE = 0.95
+
+
+class _SizeBucket:
+    """Count of files of one drawn size and a uniform random sample of their paths."""
+    __slots__ = ("count", "paths")
+
+    def __init__(self):
+        self.count = 0
+        self.paths: List[str] = []
+
+    def add(self, path: str, rng: random.Random):
+        self.count += 1
+        if len(self.paths) < BUCKET_RESERVOIR_SIZE:
+            self.paths.append(path)
+        else:
+            slot = rng.randrange(self.count)
+            if slot < BUCKET_RESERVOIR_SIZE:
+                self.paths[slot] = path
+
+
+def _descends(path: str, salt: int, subtree_fraction: float) -> bool:
+    """
+    Decides whether the walk enters a subdirectory, with probability subtree_fraction.
+
+    The decision hashes the path with a per-estimate salt rather than drawing
+    from the generator, so a second walk of the same tree enters the same subtrees.
+    """
+    if subtree_fraction == 1:
+        return True
+    digest = hashlib.blake2b(f"{salt}:{path}".encode("utf-8", "surrogateescape"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") < subtree_fraction * 2 ** 64
+
+
+def _walk_files(directory: Path, matcher, subtree_fraction: float, salt: int,
+                warn: bool = True) -> Iterator[Tuple[str, int, float]]:
+    """
+    Walks the sampled subtrees of a directory with the scanner's skip rules.
+
+    Yields:
+        Tuple[str, int, float]: (path, size, weight) of each file, the weight
+                                being the inverse probability that it was reached.
+    """
+    pending = [(str(directory), 1.0)]
+    while pending:
+        dir_path, weight = pending.pop()
+        for path, is_dir in _iter_directory(dir_path, matcher):
+            if is_dir:
+                if _descends(path, salt, subtree_fraction):
+                    pending.append((path, weight / subtree_fraction))
+                continue
+            try:
+                size = os.stat(path).st_size
+            except OSError as e:
+                if warn:
+                    print(f"Warning: Could not stat file {path}: {e}")
+                continue
+            yield path, size, weight
+
+
+def _redundant_fraction(bucket: _SizeBucket, sample_bytes: int) -> tuple:
+    """
+    Partial-hashes a bucket's sampled files to estimate the fraction of its
+    files beyond the first that are copies of another file.
+
+    A bucket sampled whole gives the exact fraction. For a larger bucket the
+    colliding pairs found in the sample are scaled up by the chance that a
+    pair lands in the sample. That estimates the bucket's pairs of copies
+    without bias; it equals the redundant files when copies come in pairs and
+    overstates larger groups of copies, so the fraction is clipped at 1.
+
+    Returns:
+        tuple: (fraction, variance of the fraction, bytes read).
+    """
+    digests = []
+    bytes_read = 0
+    for path in bucket.paths:
+        try:
+            digest, read = partial_digest(path, sample_bytes)
+        except OSError as e:
+            print(f"Warning: Could not sample file {path}: {e}")
+            continue
+        digests.append(digest)
+        bytes_read += read
+    sampled, count = len(digests), bucket.count
+    if sampled < 2:
+        return 0.0, 0.0, bytes_read
+    if sampled == count:
+        return (sampled - len(set(digests))) / (sampled - 1), 0.0, bytes_read
+    pairs = sum(copies * (copies - 1) // 2 for copies in Counter(digests).values())
+    pair_probability = sampled * (sampled - 1) / (count * (count - 1))
+    fraction = min(1.0, pairs / pair_probability / (count - 1))
+    # Reason: Sampled pairs are close to Poisson; counting at least one keeps a
+    # sample that found no pairs from claiming the bucket certainly has none.
+    variance = max(pairs, 1) * (1 - pair_probability) / (pair_probability * (count - 1)) ** 2
+    return fraction, variance, bytes_read
+
+
+def estimate_duplication(
+    directory: Path,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+    subtree_fraction: float = 1.0,
+    confidence: float = DEFAULT_CONFIDENCE,
+    sample_bytes: int = BLOCK_SIZE,
+    seed: Optional[int] = None,
+    exclusions: Optional[ExclusionRules] = None,
+) -> Dict[str, Any]:
+    """
+    Estimates how many bytes in a tree are duplicates, without a full scan.
+
+    The tree is walked with the scanner's skip rules, optionally descending
+    into each subdirectory only with probability subtree_fraction (totals are
+    then scaled up by the inverse probabilities). The walk only counts files
+    per size: only files sharing a size can be duplicates, so
+    ``(count - 1) * size`` summed over the sizes bounds the duplicate bytes
+    from above. Size buckets are then drawn with probability proportional to
+    that bound, and a second walk of the same subtrees keeps a reservoir of up
+    to BUCKET_RESERVOIR_SIZE paths for each drawn size only, so no more than
+    sample_size of them are ever held. Those files are partial-hashed (see
+    partial_digest) to estimate each drawn bucket's fraction of redundant
+    copies; the mean fraction, times the bound, estimates the duplicate
+    bytes. The bounds are a
+    normal-approximation confidence interval covering both the choice of
+    buckets and the sampling within large buckets, clipped to [0, bound].
+
+    Subtree sampling misses duplicates whose copies fall in skipped subtrees,
+    so it biases the estimate low; use it for a first look at very large trees.
+
+    Args:
+        directory (Path): The directory to examine.
+        sample_size (int): Number of size buckets to draw. Defaults to DEFAULT_SAMPLE_SIZE.
+        subtree_fraction (float): Probability of descending into each subdirectory,
+                                  in (0, 1]. Defaults to 1.0 (walk everything).
+        confidence (float): Confidence level of the bounds. Defaults to 0.95.
+        sample_bytes (int): Bytes read at each of the three sampled positions of a file.
+        seed (int, optional): Seed for reproducible sampling.
+        exclusions (ExclusionRules, optional): What to skip; defaults to the app config.
+
+    Returns:
+        Dict[str, Any]: Estimated ``files`` and ``bytes``; ``duplicate_bytes`` (bytes
+                        held by copies beyond the first) with ``duplicate_bytes_low``
+                        and ``duplicate_bytes_high``; ``candidate_bytes`` (the upper
+                        bound from size collisions); a power-of-two size ``histogram``;
+                        and the work done (``files_walked``, ``buckets_sampled``,
+                        ``bytes_read``, ``elapsed_seconds``).
+
+    Raises:
+        FileNotFoundError: If the directory does not exist.
+        ValueError: If subtree_fraction or confidence is out of range.
+    """
+    if not directory.is_dir():
+        raise FileNotFoundError(f"Directory '{directory}' not found or is not a directory.")
+    if not 0 < subtree_fraction <= 1:
+        raise ValueError("subtree_fraction must be in (0, 1].")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be in (0, 1).")
+
+    start = time.monotonic()
+    rng = random.Random(seed)
+    matcher = (exclusions or load_exclusion_rules()).matcher(str(directory))
+    # Reason: Drawn before the walk so the second walk replays its subtree choices.
+    salt = rng.getrandbits(64)
+    size_counts: Dict[int, int] = {}
+    histogram: Dict[int, List[float]] = {} # size.bit_length() -> [files, bytes], weighted
+    files_walked = walked_bytes = 0
+    estimated_files = estimated_bytes = 0.0
+
+    for path, size, weight in _walk_files(directory, matcher, subtree_fraction, salt):
+        files_walked += 1
+        walked_bytes += size
+        estimated_files += weight
+        estimated_bytes += weight * size
+        counts = histogram.setdefault(size.bit_length(), [0.0, 0.0])
+        counts[0] += weight
+        counts[1] += weight * size
+        if size:
+            size_counts[size] = size_counts.get(size, 0) + 1
+
+    candidates = [(size, count) for size, count in size_counts.items() if count > 1]
+    del size_counts
+    bounds = [size * (count - 1) for size, count in candidates]
+    candidate_bytes = sum(bounds)
+    fractions, bytes_read = [], 0
+    if candidate_bytes:
+        # Reason: Drawing proportionally to each bucket's bound makes the mean
+        # fraction an unbiased estimate of duplicate_bytes / candidate_bytes.
+        draws = Counter(candidates[index][0] for index in
+                        rng.choices(range(len(candidates)), weights=bounds, k=sample_size))
+        buckets = {size: _SizeBucket() for size in draws}
+        for path, size, _ in _walk_files(directory, matcher, subtree_fraction, salt, warn=False):
+            bucket = buckets.get(size)
+            if bucket is not None:
+                bucket.add(path, rng)
+        measured: Dict[int, tuple] = {} # Size -> (fraction, variance)
+        for size, times in draws.items():
+            fraction, variance, read = _redundant_fraction(buckets.pop(size), sample_bytes)
+            measured[size] = (fraction, variance)
+            bytes_read += read
+            fractions.extend([fraction] * times)
+
+    if fractions:
+        mean = sum(fractions) / len(fractions)
+        if len(fractions) > 1:
+            variance = sum((f - mean) ** 2 for f in fractions) / (len(fractions) - 1) / len(fractions)
+            # Reason: A bucket drawn several times repeats its sampling error in every draw.
+            variance += sum(times ** 2 * measured[size][1] for size, times in draws.items()) / len(fractions) ** 2
+            half_width = NormalDist().inv_cdf(0.5 + confidence / 2) * math.sqrt(variance)
+        else:
+            half_width = 1.0 # A single draw says nothing about the spread
+        low, high = max(0.0, mean - half_width), min(1.0, mean + half_width)
+    else:
+        mean = low = high = 0.0
+
+    # Reason: Extrapolate from the walked subtrees to the whole tree.
+    scale = estimated_bytes / walked_bytes if walked_bytes else 1.0
+    return {
+        "files": round(estimated_files),
+        "bytes": round(estimated_bytes),
+        "candidate_bytes": round(candidate_bytes * scale),
+        "duplicate_bytes": round(candidate_bytes * mean * scale),
+        "duplicate_bytes_low": round(candidate_bytes * low * scale),
+        "duplicate_bytes_high": round(candidate_bytes * high * scale),
+        "confidence": confidence,
+        "histogram": [
+            {"min_size": 1 << (bits - 1) if bits else 0, "max_size": (1 << bits) - 1,
+             "files": round(counts[0]), "bytes": round(counts[1])}
+            for bits, counts in sorted(histogram.items())
+        ],
+        "files_walked": files_walked,
+        "subtree_fraction": subtree_fraction,
+        "buckets_sampled": len(fractions),
+        "bytes_read": bytes_read,
+        "elapsed_seconds": round(time.monotonic() - start, 3),
+    }
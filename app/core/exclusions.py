@@ -0,0 +1,303 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterable, NamedTuple, Optional, Pattern, Tuple
+
+IGNORE_FILE_NAME = ".dupignore"
+DIRECTORY_CACHE_SIZE = 1024
+
+
+class IgnoreRule(NamedTuple):
+    """One compiled gitignore-style pattern."""
+    regex: Pattern
+    negated: bool
+    dir_only: bool
+
+
+def _translate(pattern: str) -> str:
+    """Translates the glob part of a gitignore pattern into a regular expression."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            # Reason: "**/" matches zero or more leading directories.
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            # Reason: A trailing "/**" matches everything inside.
+            out.append("/.*")
+            i += 3
+        elif c == "*":
+            out.append("[^/]*")
+            while i < n and pattern[i] == "*":
+                i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 2 if pattern.startswith(("[!", "[^"), i) else i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body[:1] in ("!", "^"):
+                body = "^" + body[1:]
+            out.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+def compile_pattern(line: str) -> Optional[IgnoreRule]:
+    """
+    Compiles one line of a gitignore-style pattern file.
+
+    Supports ``#`` comments, ``!`` negation, a trailing ``/`` for directories
+    only, ``*``, ``?``, ``[...]`` and ``**``. A pattern containing a ``/``
+    (other than a trailing one) is anchored to the directory that defines it;
+    otherwise it matches at any depth.
+
+    Args:
+        line (str): The pattern line.
+
+    Returns:
+        IgnoreRule, optional: The compiled rule, or None for blank lines and comments.
+
+    Raises:
+        re.error: If the pattern is malformed, e.g. a reversed range like ``[z-a]``.
+    """
+    line = line.rstrip("\n")
+    # Reason: Trailing spaces are ignored unless escaped with a backslash.
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    line = stripped
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith(("\\#", "\\!")):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    anchored = "/" in line
+    regex = ("" if anchored else "(?:.*/)?") + _translate(line.lstrip("/"))
+    return IgnoreRule(re.compile(regex + r"\Z", re.DOTALL), negated, dir_only)
+
+
+def compile_patterns(lines: Iterable[str], source: str = "exclude_patterns") -> Tuple[IgnoreRule, ...]:
+    """Compiles pattern lines, dropping blank lines and comments, and skipping malformed patterns with a warning."""
+    rules = []
+    for line in lines:
+        try:
+            rule = compile_pattern(line)
+        except re.error as e:
+            print(f"Warning: Skipping invalid pattern {line.strip()!r} in {source}: {e}")
+            continue
+        if rule is not None:
+            rules.append(rule)
+    return tuple(rules)
+
+
+def _decide(rules: Tuple[IgnoreRule, ...], relative_path: str, is_dir: bool) -> Optional[bool]:
+    """Returns whether the last rule matching relative_path excludes it, or None if none matches."""
+    # Reason: Later patterns override earlier ones, so the first match from the end decides.
+    for rule in reversed(rules):
+        if rule.dir_only and not is_dir:
+            continue
+        if rule.regex.match(relative_path):
+            return not rule.negated
+    return None
+
+
+class ExclusionRules:
+    """
+    Compiled, root-independent exclusion settings.
+
+    Args:
+        patterns (Iterable[str]): Gitignore-style patterns, relative to the scan root.
+        extensions (Iterable[str]): File extensions to skip, matched case-insensitively.
+        min_size (int, optional): Skip files smaller than this many bytes.
+        max_size (int, optional): Skip files larger than this many bytes.
+        ignore_file_name (str, optional): Name of per-directory pattern files;
+                                          None disables them.
+    """
+
+    def __init__(
+        self,
+        patterns: Iterable[str] = (),
+        extensions: Iterable[str] = (),
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        ignore_file_name: Optional[str] = IGNORE_FILE_NAME,
+    ):
+        self.rules = compile_patterns(patterns)
+        self.extensions = tuple(
+            ("." + ext.lstrip(".")).lower() for ext in extensions if ext.strip(".")
+        )
+        self.min_size = min_size
+        self.max_size = max_size
+        self.ignore_file_name = ignore_file_name
+
+    @classmethod
+    def from_config(cls, config_data: dict) -> "ExclusionRules":
+        """
+        Builds rules from a config dict (see app.core.config.read_config).
+
+        Recognized keys are ``excluded_directories`` (directory names skipped at
+        any depth, as before), ``exclude_patterns``, ``excluded_extensions``,
+        ``min_file_size`` and ``max_file_size``.
+
+        Args:
+            config_data (dict): The configuration data.
+
+        Returns:
+            ExclusionRules: The compiled rules.
+        """
+        # Reason: Escape legacy directory names so glob characters in them stay literal.
+        legacy = [re.sub(r"([*?\[\\!#])", r"\\\1", name) + "/" for name in config_data.get("excluded_directories", [])]
+        return cls(
+            patterns=legacy + list(config_data.get("exclude_patterns", [])),
+            extensions=config_data.get("excluded_extensions", []),
+            min_size=config_data.get("min_file_size"),
+            max_size=config_data.get("max_file_size"),
+        )
+
+    @property
+    def has_size_rules(self) -> bool:
+        """Whether files must be stat'ed to apply these rules."""
+        return self.min_size is not None or self.max_size is not None
+
+    def excludes_size(self, size: int) -> bool:
+        """Checks a file size against the configured bounds."""
+        return (self.min_size is not None and size < self.min_size) or (
+            self.max_size is not None and size > self.max_size
+        )
+
+    def matcher(self, root: str) -> "ExclusionMatcher":
+        """Returns a matcher applying these rules to a scan of root."""
+        return ExclusionMatcher(root, self)
+
+
+class DirectoryFilter:
+    """
+    The exclusion rules in effect inside one directory: the scan's rules plus
+    every per-directory pattern file from the root down.
+
+    Args:
+        rules (ExclusionRules): The scan's settings.
+        sources (tuple): (prefix, rules) pairs, outermost first, where prefix is this
+                         directory's path relative to the defining directory.
+    """
+    __slots__ = ("rules", "sources")
+
+    def __init__(self, rules: ExclusionRules, sources: Tuple[Tuple[str, Tuple[IgnoreRule, ...]], ...]):
+        self.rules = rules
+        self.sources = sources
+
+    def excludes(self, name: str, is_dir: bool) -> bool:
+        """
+        Checks whether an entry of this directory is excluded.
+
+        Args:
+            name (str): The entry's name.
+            is_dir (bool): Whether the entry is a directory.
+
+        Returns:
+            bool: True if the entry (and, for a directory, its subtree) is skipped.
+        """
+        if not is_dir and self.rules.extensions and name.lower().endswith(self.rules.extensions):
+            return True
+        # Reason: Deeper pattern files take precedence, so check them first.
+        for prefix, rules in reversed(self.sources):
+            decision = _decide(rules, prefix + name, is_dir)
+            if decision is not None:
+                return decision
+        return False
+
+
+class ExclusionMatcher:
+    """
+    Applies ExclusionRules to one scan, loading per-directory pattern files once.
+
+    Filters for recently listed directories are kept in a bounded LRU cache, so
+    each pattern file is read once per scan for trees with good locality (such
+    as a depth-first walk) without memory growing with the size of the tree.
+
+    Args:
+        root (str): The scan root that patterns are anchored to; relative roots
+                    are taken relative to the current directory.
+        rules (ExclusionRules): The compiled settings.
+        cache_size (int): Maximum number of cached directory filters.
+    """
+
+    def __init__(self, root: str, rules: ExclusionRules, cache_size: int = DIRECTORY_CACHE_SIZE):
+        # Reason: Directory paths are compared with the root by prefix, so both are
+        # made absolute; "." or "a/../b" would otherwise match none of their children.
+        self.root = os.path.abspath(str(root))
+        self.rules = rules
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _read_ignore_file(self, dir_path: str) -> Tuple[IgnoreRule, ...]:
+        if not self.rules.ignore_file_name:
+            return ()
+        ignore_path = os.path.join(dir_path, self.rules.ignore_file_name)
+        try:
+            with open(ignore_path, "r", encoding="utf-8", errors="replace") as f:
+                return compile_patterns(f, ignore_path)
+        except FileNotFoundError:
+            return ()
+        except OSError as e:
+            print(f"Warning: Could not read ignore file {ignore_path}: {e}")
+            return ()
+
+    def _sources(self, dir_path: str) -> Tuple[Tuple[str, Tuple[IgnoreRule, ...]], ...]:
+        with self._lock:
+            sources = self._cache.get(dir_path)
+            if sources is not None:
+                self._cache.move_to_end(dir_path)
+                return sources
+        if dir_path != self.root and dir_path.startswith(self.root.rstrip(os.sep) + os.sep):
+            name = os.path.basename(dir_path) + "/"
+            sources = tuple((prefix + name, rules) for prefix, rules in self._sources(os.path.dirname(dir_path)))
+        else:
+            # Reason: The root (or anything outside it) only sees the scan's own patterns.
+            sources = (("", self.rules.rules),)
+        own = self._read_ignore_file(dir_path)
+        if own:
+            sources += (("", own),)
+        with self._lock:
+            self._cache[dir_path] = sources
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return sources
+
+    def directory(self, dir_path: str) -> DirectoryFilter:
+        """
+        Returns the filter for the entries of a directory under the root.
+
+        Args:
+            dir_path (str): The directory about to be listed.
+
+        Returns:
+            DirectoryFilter: The rules in effect for its entries.
+        """
+        return DirectoryFilter(self.rules, self._sources(os.path.abspath(dir_path)))
+
+    def excludes_size(self, size: int) -> bool:
+        """Checks a file size against the configured bounds."""
+        return self.rules.excludes_size(size)
+
@@ -0,0 +1,401 @@
+import errno
+import hashlib
+import mmap
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Generator, List, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError: # Not on Windows, which has no O_DIRECT either
+    fcntl = None
+
+if TYPE_CHECKING:
+    from app.core.throttle import ScanThrottle
+
+# Read size used by every hashing path.
+BLOCK_SIZE = 65536  # Read in 64k chunks
+
+# Content-defined chunking parameters (bytes). Boundaries are placed where the
+# rolling hash matches CHUNK_AVG_SIZE's mask, so an edit only changes the
+# chunks around it instead of shifting every later fixed-size block.
+CHUNK_MIN_SIZE = 256 * 1024
+CHUNK_AVG_SIZE = 1024 * 1024
+CHUNK_MAX_SIZE = 4 * 1024 * 1024
+# Size of a stored chunk digest (BLAKE2b truncated to 128 bits).
+CHUNK_DIGEST_SIZE = 16
+
+# Page-cache policies for reading files (see read_blocks).
+CACHE_POLICY_DEFAULT = "default"   # Plain buffered reads
+CACHE_POLICY_DONTNEED = "dontneed" # Sequential readahead, pages dropped once hashed
+CACHE_POLICY_DIRECT = "direct"     # As dontneed, but O_DIRECT for files >= DIRECT_IO_MIN_SIZE
+CACHE_POLICIES = (CACHE_POLICY_DEFAULT, CACHE_POLICY_DONTNEED, CACHE_POLICY_DIRECT)
+# Pages behind the read position are dropped every DROP_BEHIND_SIZE bytes.
+DROP_BEHIND_SIZE = 8 * 1024 * 1024
+DIRECT_IO_MIN_SIZE = 64 * 1024 * 1024
+# O_DIRECT needs reads aligned to the logical block size; 4 KiB covers common devices.
+DIRECT_IO_ALIGNMENT = 4096
+DIRECT_IO_BLOCK_SIZE = 1024 * 1024
+# Holes of sparse files are fed to digests in zero blocks of up to this size.
+HOLE_BLOCK_SIZE = 1024 * 1024
+
+
+def _boundary_table() -> bytes:
+    """
+    Builds the one-bit gear table used by the rolling boundary hash.
+
+    Maps each byte value to 0 or 1; about half of the values map to 0.
+    """
+    # Reason: Derived deterministically so chunk boundaries are stable across runs and hosts.
+    # Reason: 0x00 and 0xFF (fill/padding bytes) never count towards a boundary, so
+    # large zeroed regions are cut at max_size instead of at every min_size.
+    return bytes(
+        0 if hashlib.sha256(bytes([value])).digest()[0] & 1 and value not in (0x00, 0xFF) else 1
+        for value in range(256)
+    )
+
+
+_BOUNDARY_TABLE = _boundary_table()
+
+
+class ZeroBlock(bytes):
+    """
+    A block of zeros standing for part of a sparse file's hole.
+
+    It hashes like the zeros a plain read returns, but was never read from
+    disk, so I/O accounting (see ScanThrottle.throttled) skips it.
+    """
+
+
+_HOLE_BLOCK = ZeroBlock(HOLE_BLOCK_SIZE)
+
+
+def read_blocks(
+    file_path: Union[str, Path],
+    block_size: int = BLOCK_SIZE,
+    cache_policy: str = CACHE_POLICY_DEFAULT,
+) -> Generator[bytes, None, None]:
+    """
+    Streams a file's content in fixed-size blocks.
+
+    With CACHE_POLICY_DONTNEED the kernel is told the file is read sequentially
+    (for readahead) and the pages already consumed are dropped as the read
+    advances, so hashing a large tree does not evict other workloads' hot data
+    from the page cache. CACHE_POLICY_DIRECT additionally bypasses the page
+    cache with O_DIRECT for files of at least DIRECT_IO_MIN_SIZE, falling back
+    to dontneed where O_DIRECT is unsupported (e.g. tmpfs). On platforms
+    without posix_fadvise both behave like the default.
+
+    Sparse files (fewer blocks allocated than their size needs) are read
+    extent by extent: only data ranges are read, and every hole is yielded as
+    ZeroBlock instances, so digests match those of a plain read.
+
+    Args:
+        file_path (Union[str, Path]): The path to the file.
+        block_size (int): Maximum number of bytes per block. Defaults to BLOCK_SIZE.
+        cache_policy (str): One of CACHE_POLICIES. Defaults to CACHE_POLICY_DEFAULT.
+
+    Yields:
+        bytes: Successive blocks of the file.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If cache_policy is unknown.
+    """
+    if cache_policy not in CACHE_POLICIES:
+        raise ValueError(f"Unknown cache policy {cache_policy!r}; expected one of {', '.join(CACHE_POLICIES)}.")
+    if _is_sparse(file_path):
+        # Reason: Holes have no pages to keep out of the cache, so direct falls back to drop-behind.
+        yield from _read_sparse(file_path, block_size, drop_behind=cache_policy != CACHE_POLICY_DEFAULT)
+        return
+    if cache_policy == CACHE_POLICY_DEFAULT or not hasattr(os, "posix_fadvise"):
+        with open(file_path, 'rb') as file:
+            while True:
+                data = file.read(block_size)
+                if not data:
+                    break
+                yield data
+        return
+    if cache_policy == CACHE_POLICY_DIRECT:
+        fd = _open_direct(file_path)
+        if fd is not None:
+            yield from _read_direct(fd)
+            return
+    yield from _read_drop_behind(file_path, block_size)
+
+
+def _is_sparse(file_path: Union[str, Path]) -> bool:
+    """Checks whether a file has fewer blocks allocated than its size needs, where SEEK_DATA exists."""
+    if not hasattr(os, "SEEK_DATA"):
+        return False
+    file_stat = os.stat(file_path)
+    blocks = getattr(file_stat, "st_blocks", None)
+    # Reason: st_blocks counts 512-byte units whatever the filesystem's block size.
+    return blocks is not None and blocks * 512 < file_stat.st_size
+
+
+def _zero_blocks(length: int) -> Generator[bytes, None, None]:
+    """Yields length zero bytes as ZeroBlock instances, reusing one shared full-size block."""
+    while length >= HOLE_BLOCK_SIZE:
+        yield _HOLE_BLOCK
+        length -= HOLE_BLOCK_SIZE
+    if length:
+        yield ZeroBlock(length)
+
+
+def _read_sparse(file_path: Union[str, Path], block_size: int, drop_behind: bool = False) -> Generator[bytes, None, None]:
+    """
+    Reads a sparse file's data extents, found with SEEK_DATA/SEEK_HOLE, and
+    yields its holes as zeros without reading them.
+    """
+    drop_behind = drop_behind and hasattr(os, "posix_fadvise")
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        offset = dropped = 0
+        while offset < size:
+            try:
+                data_start = min(os.lseek(fd, offset, os.SEEK_DATA), size)
+            except OSError as e:
+                if e.errno != errno.ENXIO: # ENXIO: no data past offset, the rest is a hole
+                    raise
+                data_start = size
+            yield from _zero_blocks(data_start - offset)
+            if data_start >= size:
+                break
+            data_end = min(os.lseek(fd, data_start, os.SEEK_HOLE), size)
+            offset = data_start
+            while offset < data_end:
+                data = os.pread(fd, min(block_size, data_end - offset), offset)
+                if not data: # Truncated while being read
+                    return
+                offset += len(data)
+                if drop_behind and offset - dropped >= DROP_BEHIND_SIZE:
+                    os.posix_fadvise(fd, dropped, offset - dropped, os.POSIX_FADV_DONTNEED)
+                    dropped = offset
+                yield data
+    finally:
+        if drop_behind:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        os.close(fd)
+
+
+def _read_drop_behind(file_path: Union[str, Path], block_size: int) -> Generator[bytes, None, None]:
+    """Reads a file with sequential readahead, dropping its pages from the cache behind the reader."""
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        offset = dropped = 0
+        while True:
+            data = os.read(fd, block_size)
+            if not data:
+                break
+            offset += len(data)
+            if offset - dropped >= DROP_BEHIND_SIZE:
+                os.posix_fadvise(fd, dropped, offset - dropped, os.POSIX_FADV_DONTNEED)
+                dropped = offset
+            yield data
+    finally:
+        # Reason: Also drops whatever readahead fetched past the last full window.
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        os.close(fd)
+
+
+def _open_direct(file_path: Union[str, Path]) -> Optional[int]:
+    """Opens a large file with O_DIRECT, or returns None if it is small or O_DIRECT is unavailable."""
+    o_direct = getattr(os, "O_DIRECT", None)
+    if o_direct is None:
+        return None
+    try:
+        if os.stat(file_path).st_size < DIRECT_IO_MIN_SIZE:
+            return None
+        return os.open(file_path, os.O_RDONLY | o_direct)
+    except OSError as e:
+        if e.errno == errno.EINVAL: # The filesystem does not support O_DIRECT
+            return None
+        raise
+
+
+def _read_direct(fd: int) -> Generator[bytes, None, None]:
+    """Reads an O_DIRECT descriptor into an aligned buffer, bypassing the page cache."""
+    # Reason: Anonymous mmaps are page-aligned, as O_DIRECT requires of the buffer.
+    buffer = mmap.mmap(-1, DIRECT_IO_BLOCK_SIZE)
+    offset = 0
+    try:
+        while True:
+            count = os.readv(fd, [buffer])
+            if not count:
+                break
+            yield buffer[:count]
+            offset += count
+            # Reason: A short read (the file's tail, or before EOF on a signal or
+            # some filesystems) leaves the offset unaligned, which O_DIRECT reads
+            # reject; the rest is read through the page cache instead.
+            if offset % DIRECT_IO_ALIGNMENT and fcntl is not None:
+                flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+                if flags & os.O_DIRECT:
+                    fcntl.fcntl(fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+    finally:
+        buffer.close()
+        os.close(fd)
+
+
+class ContentDefinedChunker:
+    """
+    Splits a byte stream into content-defined chunks with a rolling gear hash
+    (FastCDC-style: no boundary checks before min_size, forced cut at max_size).
+
+    The gear table is one bit wide, so the low ``k`` bits of the rolling hash
+    are exactly the table bits of the last ``k`` bytes, and "hash & mask == 0"
+    means "the last k bytes all map to 0". That lets the search run in C via
+    ``bytes.translate`` and ``bytes.find`` instead of a per-byte Python loop.
+    Boundaries depend only on the bytes just before them, so an insertion only
+    changes the chunks around it.
+
+    Only the running digest of the current chunk and a window of k - 1 bytes are
+    kept, so memory does not depend on chunk or file size. Feed data with
+    update() and call finish() once.
+
+    Args:
+        min_size (int): Smallest chunk emitted, except for the final one.
+        avg_size (int): Expected distance from min_size to a boundary; must be a
+                        power of two.
+        max_size (int): Largest chunk emitted.
+    """
+
+    def __init__(self, min_size: int = CHUNK_MIN_SIZE, avg_size: int = CHUNK_AVG_SIZE, max_size: int = CHUNK_MAX_SIZE):
+        if avg_size & (avg_size - 1) or not 0 < min_size <= avg_size <= max_size:
+            raise ValueError("Chunk sizes must satisfy 0 < min <= avg <= max with avg a power of two.")
+        self.min_size = min_size
+        self.max_size = max_size
+        # Reason: Waiting for k consecutive zero bits takes about 2 ** (k + 1) bytes.
+        window = max(avg_size.bit_length() - 2, 1)
+        self._needle = bytes(window)
+        self._tail_size = window - 1
+        self.chunks: List[Tuple[bytes, int]] = []
+        self._start_chunk()
+
+    def _start_chunk(self):
+        self._length = 0
+        self._tail = b""
+        self._digest = hashlib.blake2b(digest_size=CHUNK_DIGEST_SIZE)
+
+    def _emit(self):
+        self.chunks.append((self._digest.digest(), self._length))
+        self._start_chunk()
+
+    def _consume(self, data: memoryview, bits: bytes, start: int, stop: int):
+        self._digest.update(data[start:stop])
+        self._length += stop - start
+        if self._tail_size:
+            self._tail = (self._tail + bits[max(start, stop - self._tail_size):stop])[-self._tail_size:]
+
+    def update(self, data: bytes):
+        """
+        Consumes the next part of the stream.
+
+        Args:
+            data (bytes): The next bytes of the stream.
+        """
+        view = memoryview(data)
+        bits = bytes(data).translate(_BOUNDARY_TABLE)
+        pos, end = 0, len(data)
+        while pos < end:
+            if self._length < self.min_size:
+                # Reason: No boundary can fall inside the first min_size bytes; don't search them.
+                stop = min(pos + self.min_size - self._length, end)
+                self._consume(view, bits, pos, stop)
+                pos = stop
+                continue
+
+            limit = min(end, pos + self.max_size - self._length)
+            # Reason: Prefix the window carried over from earlier data so boundaries
+            # spanning two update() calls are still found.
+            found = (self._tail + bits[pos:limit]).find(self._needle)
+            stop = limit if found < 0 else pos + found + len(self._needle) - len(self._tail)
+            self._consume(view, bits, pos, stop)
+            pos = stop
+            if found >= 0 or self._length >= self.max_size:
+                self._emit()
+
+    def finish(self) -> List[Tuple[bytes, int]]:
+        """
+        Flushes the final partial chunk.
+
+        Returns:
+            List[Tuple[bytes, int]]: Every chunk as (digest, length), in stream order.
+        """
+        if self._length:
+            self._emit()
+        return self.chunks
+
+
+def hash_file_and_chunks(
+    file_path: Union[str, Path],
+    chunker: Optional[ContentDefinedChunker] = None,
+    cache_policy: str = CACHE_POLICY_DEFAULT,
+    throttle: Optional["ScanThrottle"] = None,
+) -> Tuple[str, List[Tuple[bytes, int]]]:
+    """
+    Computes a file's SHA-256 digest and its content-defined chunks in one pass.
+
+    Args:
+        file_path (Union[str, Path]): The path to the file.
+        chunker (ContentDefinedChunker, optional): A fresh chunker; a default one
+                                                   is created if omitted.
+        cache_policy (str): Page-cache policy for the read, see read_blocks.
+        throttle (ScanThrottle, optional): Rate limits applied to the read.
+
+    Returns:
+        Tuple[str, List[Tuple[bytes, int]]]: The hexadecimal SHA-256 digest and the
+                                             (digest, length) of every chunk.
+
+    Raises:
+        OSError: If the file cannot be read.
+    """
+    chunker = chunker or ContentDefinedChunker()
+    hasher = hashlib.sha256()
+    blocks = read_blocks(file_path, cache_policy=cache_policy)
+    for data in throttle.throttled(blocks) if throttle else blocks:
+        hasher.update(data)
+        chunker.update(data)
+    return hasher.hexdigest(), chunker.finish()
+
+
+def partial_digest(file_path: Union[str, Path], sample_size: int = BLOCK_SIZE) -> Tuple[bytes, int]:
+    """
+    Digests the start, middle and end of a file instead of all of it.
+
+    Equal full digests imply equal partial digests, so files with different
+    partial digests are certainly different; equal ones are very likely (but
+    not certainly) duplicates.
+
+    Args:
+        file_path (Union[str, Path]): The path to the file.
+        sample_size (int): Bytes read at each of the three positions.
+
+    Returns:
+        Tuple[bytes, int]: A BLAKE2b digest of the size and the sampled bytes,
+                           and the number of bytes read.
+
+    Raises:
+        OSError: If the file cannot be read.
+    """
+    hasher = hashlib.blake2b(digest_size=CHUNK_DIGEST_SIZE)
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        hasher.update(size.to_bytes(8, "little"))
+        if size <= 3 * sample_size:
+            offsets = [0]
+            sample_size = size
+        else:
+            offsets = [0, (size - sample_size) // 2, size - sample_size]
+        read = 0
+        for offset in offsets:
+            data = os.pread(fd, sample_size, offset)
+            hasher.update(data)
+            read += len(data)
+    finally:
+        os.close(fd)
+    return hasher.digest(), read
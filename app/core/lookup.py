@@ -0,0 +1,225 @@
+import hashlib
+import math
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import distinct, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.db import get_change_counter
+from app.models.file_entry import FileEntry
+
+DEFAULT_ERROR_RATE = 0.01
+MIN_CAPACITY = 1024
+BUILD_BATCH_SIZE = 10000
+# Digests per IN (...) query, well below SQLite's bound-parameter limit.
+LOOKUP_BATCH_SIZE = 500
+# While writes keep coming (e.g. from a scan in another process) lookups start
+# a rebuild at most this often; lookups in between go straight to the database.
+MIN_REBUILD_INTERVAL = 30.0 # Seconds
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter over strings.
+
+    Membership tests never give false negatives; false positives occur at
+    about error_rate once capacity items have been added.
+
+    Args:
+        capacity (int): Number of items the filter is sized for.
+        error_rate (float): Target false-positive rate at capacity.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = DEFAULT_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _hashes(self, item: str) -> Tuple[int, int]:
+        # Reason: SHA-256 hex digests are already uniform, so their bits are used
+        # directly; anything else is hashed first.
+        if len(item) == 64:
+            try:
+                return int(item[:16], 16), int(item[16:32], 16) | 1
+            except ValueError:
+                pass
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    def add(self, item: str):
+        """Adds an item."""
+        # Reason: Two 64-bit values give all k positions (double hashing).
+        h1, h2 = self._hashes(item)
+        bits, num_bits = self.bits, self.num_bits
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % num_bits
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, items: Iterable[str]):
+        """Adds every item of an iterable."""
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        h1, h2 = self._hashes(item)
+        bits, num_bits = self.bits, self.num_bits
+        # Reason: Most absent items hit a clear bit within the first probes.
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % num_bits
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class DigestFilter:
+    """
+    A Bloom filter of every indexed digest, rebuilt when the index changes.
+
+    The filter is tagged with the database change counter it was built at
+    (see app.core.db.get_change_counter), like cached API responses. A stale
+    filter could miss newly indexed digests, so it is never consulted; lookups
+    go to the database until a rebuild, run on a background thread, catches
+    up. Rebuilds are started when a scan finishes and, at most once per
+    min_rebuild_interval, when a lookup finds the filter stale (e.g. after
+    writes by another process).
+
+    Args:
+        error_rate (float): Target false-positive rate.
+        min_rebuild_interval (float): Minimum seconds between rebuilds started by lookups.
+    """
+
+    def __init__(self, error_rate: float = DEFAULT_ERROR_RATE, min_rebuild_interval: float = MIN_REBUILD_INTERVAL):
+        self.error_rate = error_rate
+        self.min_rebuild_interval = min_rebuild_interval
+        self.rebuilt_at = float("-inf")
+        # Reason: One attribute, so lock-free readers never pair a filter with another build's generation.
+        self._built: Optional[Tuple[int, BloomFilter]] = None
+        self._lock = threading.Lock()
+
+    def build(self, session: Session) -> BloomFilter:
+        """
+        Builds a filter holding every distinct digest in the index.
+
+        Args:
+            session (Session): The database session.
+
+        Returns:
+            BloomFilter: The new filter, also kept for later lookups.
+        """
+        # Reason: Read the counter first; writes during the build leave the filter stale.
+        generation = get_change_counter(session)
+        distinct_digests = session.scalar(select(func.count(distinct(FileEntry.hash))))
+        bloom = BloomFilter(max(MIN_CAPACITY, distinct_digests), self.error_rate)
+        rows = session.execute(select(FileEntry.hash).distinct().execution_options(yield_per=BUILD_BATCH_SIZE))
+        bloom.update(rows.scalars())
+        self._built = (generation, bloom)
+        return bloom
+
+    def current(self, session: Session) -> Optional[BloomFilter]:
+        """
+        Returns the filter if it reflects the index as it is now.
+
+        A stale filter is not rebuilt on the caller's thread; a background
+        rebuild is started instead, subject to min_rebuild_interval.
+
+        Args:
+            session (Session): The database session; its engine is used for the rebuild.
+
+        Returns:
+            BloomFilter, optional: The filter, or None while it is stale or not yet built.
+        """
+        built = self._built
+        if built is not None and built[0] == get_change_counter(session):
+            return built[1]
+        self.rebuild_in_background(session.get_bind())
+        return None
+
+    def rebuild_in_background(self, engine, force: bool = False) -> Optional[threading.Thread]:
+        """
+        Starts rebuilding the filter on a background thread.
+
+        Args:
+            engine (sqlalchemy.engine.Engine): The engine to read the digests through.
+                                               Sessions bound to a single connection
+                                               (e.g. in tests) are not shared with the
+                                               thread; nothing is started for them.
+            force (bool): Ignore min_rebuild_interval, e.g. once a scan has finished.
+
+        Returns:
+            threading.Thread, optional: The started thread, or None if no rebuild was
+                                        started (one is already running, the last one
+                                        was too recent, or engine is not an Engine).
+        """
+        if not isinstance(engine, Engine):
+            return None
+        if not force and time.monotonic() - self.rebuilt_at < self.min_rebuild_interval:
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None
+        self.rebuilt_at = time.monotonic()
+
+        def rebuild():
+            try:
+                with Session(engine) as session:
+                    self.build(session)
+            except Exception as e:
+                print(f"Warning: Could not rebuild the digest filter: {e}")
+            finally:
+                self._lock.release()
+
+        thread = threading.Thread(target=rebuild, name="digest-filter", daemon=True)
+        thread.start()
+        return thread
+
+
+def lookup_digests(
+    db: Session,
+    queries: Iterable[Tuple[str, Optional[int]]],
+    digest_filter: Optional[DigestFilter] = None,
+) -> Dict[str, object]:
+    """
+    Finds the indexed paths of many digests at once.
+
+    Digests the filter rules out are answered without a query; the rest are
+    looked up in batches using the hash index.
+
+    Args:
+        db (Session): The database session.
+        queries (Iterable[Tuple[str, Optional[int]]]): (digest, size) pairs; a size
+                                                       of None matches any size.
+        digest_filter (DigestFilter, optional): Filter of the indexed digests.
+
+    Returns:
+        Dict[str, object]: ``matches``, a list of {hash, size, paths} for each query
+                           with at least one indexed file, in query order, plus
+                           ``checked`` and ``filtered`` (queries answered by the filter).
+    """
+    queries = [(digest.lower(), size) for digest, size in queries]
+    bloom = digest_filter.current(db) if digest_filter is not None else None
+    candidates = {digest for digest, _ in queries if bloom is None or digest in bloom}
+    filtered = sum(1 for digest, _ in queries if digest not in candidates)
+
+    found: Dict[str, List[Tuple[int, str]]] = {}
+    ordered = sorted(candidates)
+    for start in range(0, len(ordered), LOOKUP_BATCH_SIZE):
+        batch = ordered[start:start + LOOKUP_BATCH_SIZE]
+        rows = db.execute(
+            select(FileEntry.hash, FileEntry.size, FileEntry.path)
+            .where(FileEntry.hash.in_(batch))
+            .order_by(FileEntry.path)
+        )
+        for file_hash, size, path in rows:
+            found.setdefault(file_hash, []).append((size, path))
+
+    matches = []
+    for digest, size in queries:
+        paths = [path for file_size, path in found.get(digest, ()) if size is None or file_size == size]
+        if paths:
+            matches.append({"hash": digest, "size": size, "paths": paths})
+    return {"matches": matches, "checked": len(queries), "filtered": filtered}
@@ -0,0 +1,86 @@
+"""
+Page-cache residency of files, for checking and benchmarking the cache policies
+of app.core.hashing.
+
+Residency is read with mincore(2) on a mapping of the file that is never
+touched, and pages are dropped with posix_fadvise(2), so both are Linux-specific.
+"""
+import ctypes
+import ctypes.util
+import mmap
+import os
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+_MAP_FAILED = ctypes.c_void_p(-1).value
+_libc: Optional[ctypes.CDLL] = None
+
+
+def _load_libc() -> ctypes.CDLL:
+    """Loads libc with the mmap/munmap/mincore signatures, once."""
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.mmap.restype = ctypes.c_void_p
+        libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+        libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_ubyte)]
+        _libc = libc
+    return _libc
+
+
+def resident_pages(path: Path) -> Tuple[int, int]:
+    """
+    Counts a file's pages that are in the page cache.
+
+    Maps the file without touching it and asks the kernel with mincore(2).
+
+    Args:
+        path (Path): The file to inspect.
+
+    Returns:
+        Tuple[int, int]: (resident pages, total pages).
+
+    Raises:
+        OSError: If the file cannot be mapped or inspected.
+    """
+    libc = _load_libc()
+    size = os.path.getsize(path)
+    pages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+    if not pages:
+        return 0, 0
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        address = libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+        if address in (None, _MAP_FAILED):
+            raise OSError(ctypes.get_errno(), f"mmap failed for {path}")
+        try:
+            vector = (ctypes.c_ubyte * pages)()
+            if libc.mincore(address, size, vector) != 0:
+                raise OSError(ctypes.get_errno(), f"mincore failed for {path}")
+            return sum(byte & 1 for byte in vector), pages
+        finally:
+            libc.munmap(address, size)
+    finally:
+        os.close(fd)
+
+
+def resident_fraction(paths: Iterable[Path]) -> float:
+    """Returns the fraction of the files' pages that are in the page cache."""
+    resident = total = 0
+    for path in paths:
+        file_resident, file_total = resident_pages(path)
+        resident += file_resident
+        total += file_total
+    return resident / total if total else 0.0
+
+
+def evict(paths: Iterable[Path]):
+    """Flushes the files and asks the kernel to drop their pages from the page cache."""
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
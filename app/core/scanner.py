@@ -1,20 +1,55 @@
 # /home/echeadle/15_DupFiles/find-dup-files/app/core/scanner.py
 from pathlib import Path  # <-- Import Path here
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
+from sqlalchemy import String, and_, bindparam, delete, func, insert, literal, select, update
+from sqlalchemy.orm import aliased
+from app.core.archives import ARCHIVE_SEPARATOR, ArchiveLimits, hash_archive_members, is_archive
+from app.core.config import load_exclusion_rules
+from app.core.exclusions import ExclusionMatcher, ExclusionRules
+from app.core.throttle import ScanThrottle, register_throttle, unregister_throttle
+from app.core.hashing import BLOCK_SIZE, CACHE_POLICIES, CACHE_POLICY_DEFAULT, hash_file_and_chunks, read_blocks
+from app.models.file_chunk import FileChunk
 from app.models.file_entry import FileEntry
-from typing import Generator, Dict, List
+from app.models.scan_job import ScanFrontier, ScanJob
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Generator, Dict, List, Optional, Tuple, Union
 import os
 import hashlib
 import json
+import time
+
+# Files and directories processed between checkpoint commits of a scan job.
+CHECKPOINT_INTERVAL = 500
+# Longest a scan keeps written work uncommitted, holding SQLite's write lock,
+# e.g. while a files/s or bytes/s limit slows hashing down.
+CHECKPOINT_SECONDS = 2.0
+# Threads hashing files during a scan (hashlib releases the GIL on large reads).
+HASH_WORKERS = min(4, os.cpu_count() or 1)
+# Maximum number of files/markers queued between the lookup and writer stages.
+PIPELINE_DEPTH = 256
+# Files looked up, or written, per statement.
+DB_BATCH_SIZE = 128
+
+# Chunk digests shared by more files than this (e.g. zero-filled blocks) are
+# ignored when pairing files, so a few very common chunks can't make the
+# pairwise self-join quadratic in the number of files.
+CHUNK_FANOUT_LIMIT = 64
 
 # Function to hash files (assuming this exists or needs to be added)
-def hash_file(file_path: Path) -> str:
+def hash_file(
+    file_path: Union[str, Path],
+    cache_policy: str = CACHE_POLICY_DEFAULT,
+    throttle: Optional[ScanThrottle] = None,
+) -> str:
     """
     Computes the SHA-256 hash of a file.
 
     Args:
-        file_path (Path): The path to the file.
+        file_path (Union[str, Path]): The path to the file.
+        cache_policy (str): Page-cache policy for the read (see app.core.hashing.read_blocks).
+                            Defaults to CACHE_POLICY_DEFAULT.
+        throttle (ScanThrottle, optional): Rate limits applied to the read.
 
     Returns:
         str: The hexadecimal SHA-256 hash of the file content.
@@ -23,167 +58,1027 @@ def hash_file(file_path: Path) -> str:
         OSError: If the file cannot be read.
     """
     hasher = hashlib.sha256()
-    buffer_size = 65536  # Read in 64k chunks
     try:
-        with open(file_path, 'rb') as file:
-            while True:
-                data = file.read(buffer_size)
-                if not data:
-                    break
-                hasher.update(data)
+        blocks = read_blocks(file_path, BLOCK_SIZE, cache_policy)
+        for data in throttle.throttled(blocks) if throttle else blocks:
+            hasher.update(data)
     except OSError as e:
         print(f"Error reading file {file_path} for hashing: {e}")
         raise # Re-raise the exception to be caught by the caller
     return hasher.hexdigest()
 
 
-def scan_directory(directory: Path, db: Session):
+def _has_chunks(db: Session, file_id: int) -> bool:
+    """Checks whether chunk digests are stored for a file entry."""
+    return db.execute(select(FileChunk.file_id).where(FileChunk.file_id == file_id).limit(1)).first() is not None
+
+
+def _store_chunks(db: Session, file_id: int, chunks: Optional[List[Tuple[bytes, int]]]):
+    """Replaces the stored chunk digests of a file entry (None just clears them)."""
+    db.execute(delete(FileChunk).where(FileChunk.file_id == file_id))
+    if chunks:
+        # Reason: Core executemany; chunk rows never need to live in the identity map.
+        db.execute(insert(FileChunk), [
+            {"file_id": file_id, "seq": seq, "digest": digest, "length": length}
+            for seq, (digest, length) in enumerate(chunks)
+        ])
+
+
+class FileRecord:
     """
-    Scans a directory, hashes files, and stores/updates file entries in the database.
+    Compact per-file state passed between scan pipeline stages.
+
+    Plain __slots__ records are used instead of ORM instances so nothing
+    accumulates in the session's identity map while a scan runs.
+    """
+    __slots__ = ("path", "size", "mtime", "mtime_ns", "dev", "inode", "entry_id", "moved_from_id",
+                 "moved_from_path", "wants_chunks", "reused", "hash", "chunks")
+
+    def __init__(self, path: str, file_stat: os.stat_result, entry_id: Optional[int], wants_chunks: bool,
+                 known_hash: Optional[str] = None):
+        self.path = path
+        self.size = file_stat.st_size
+        self.mtime = file_stat.st_mtime
+        self.mtime_ns = file_stat.st_mtime_ns
+        self.dev = _sqlite_int(file_stat.st_dev)
+        self.inode = _sqlite_int(file_stat.st_ino)
+        self.entry_id = entry_id # Existing row to update, or None to insert
+        self.moved_from_id: Optional[int] = None # Row of a moved file to take over
+        self.moved_from_path: Optional[str] = None # That row's old path
+        self.wants_chunks = wants_chunks
+        self.reused = known_hash is not None # Digest taken from the index, content not read
+        self.hash: Optional[str] = known_hash
+        self.chunks: Optional[List[Tuple[bytes, int]]] = None
+
+
+class _ArchiveRecord:
+    """Pipeline item: an archive whose members are (re)indexed under virtual paths."""
+    __slots__ = ("path", "members")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.members: Optional[list] = None # ArchiveMembers, once hashed
+
+
+class _DirectoryDone:
+    """Pipeline marker: every file of a frontier directory has been queued."""
+    __slots__ = ("frontier_id", "subdirectories")
+
+    def __init__(self, frontier_id: int, subdirectories: List[str]):
+        self.frontier_id = frontier_id
+        self.subdirectories = subdirectories
+
+
+def _sqlite_int(value: int) -> int:
+    """Maps an unsigned 64-bit stat field (st_dev, st_ino) into SQLite's signed INTEGER range."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _path_exists(path: str) -> bool:
+    """Checks whether anything (including a dangling symlink) exists at path."""
+    try:
+        os.lstat(path)
+    except OSError:
+        return False
+    return True
+
+
+def _match_moved_files(
+    db: Session,
+    candidates: List[Tuple[str, os.stat_result]],
+    chunk_threshold: Optional[int],
+    moving: set,
+) -> List[FileRecord]:
+    """
+    Builds records for paths not yet in the index, reusing the digest of any
+    row with the same (st_dev, st_ino, size, mtime_ns) content identity.
+
+    If the matched row's path is gone the file was moved or renamed: the record
+    takes that row over, retiring the old path in the same transaction. If the
+    old path still exists (a hard link, or a new file that the scan will index
+    at that path) a new row is inserted with the inherited digest. Either way
+    the file is not read.
 
     Args:
-        directory (Path): The directory to scan.
         db (Session): The database session.
+        candidates (List[Tuple[str, os.stat_result]]): Unindexed paths and their stat results.
+        chunk_threshold (int, optional): Chunk-indexing threshold, see scan_directory.
+        moving (set): Ids of rows already being taken over by in-flight records.
+
+    Returns:
+        List[FileRecord]: One record per candidate.
     """
-    # Walk through the directory tree.
-    for file_path in walk_directory(directory): # walk_directory now expects Path
+    by_identity = {}
+    if candidates:
+        for row in db.execute(
+            select(FileEntry.id, FileEntry.path, FileEntry.hash, FileEntry.size,
+                   FileEntry.mtime_ns, FileEntry.dev, FileEntry.inode)
+            .where(FileEntry.inode.in_({_sqlite_int(file_stat.st_ino) for _, file_stat in candidates}))
+        ):
+            by_identity.setdefault((row.dev, row.inode, row.size, row.mtime_ns), []).append(row)
+
+    records = []
+    for path, file_stat in candidates:
+        wants_chunks = chunk_threshold is not None and file_stat.st_size >= chunk_threshold
+        record = FileRecord(path, file_stat, None, wants_chunks)
+        identity = (record.dev, record.inode, record.size, record.mtime_ns)
+        for row in by_identity.get(identity, []):
+            if row.id not in moving and not _path_exists(row.path):
+                # Reason: The row (and its chunks) moves with the file.
+                record.moved_from_id, record.moved_from_path = row.id, row.path
+                record.hash, record.reused = row.hash, True
+                moving.add(row.id)
+                break
+        else:
+            if identity in by_identity and not wants_chunks:
+                # Reason: Old path still in use; chunks for a new row would need a read anyway.
+                record.hash, record.reused = by_identity[identity][0].hash, True
+        records.append(record)
+    return records
+
+
+def _prepare_records(
+    db: Session,
+    file_paths: List[str],
+    chunk_threshold: Optional[int],
+    moving: Optional[set] = None,
+) -> List[FileRecord]:
+    """
+    Stats a batch of files and checks them against the database (lookup stage).
+
+    Args:
+        db (Session): The database session.
+        file_paths (List[str]): The files to examine (at most DB_BATCH_SIZE).
+        chunk_threshold (int, optional): Chunk-indexing threshold, see scan_directory.
+        moving (set, optional): Ids of rows being taken over by moved files still
+                                in flight; updated in place.
+
+    Returns:
+        List[FileRecord]: Records for the files that need hashing or updating.
+    """
+    moving = set() if moving is None else moving
+    stats = []
+    for file_path in file_paths:
         # Get file size and modification time.
         try:
-            file_stat = file_path.stat() # Get stat result once
-            file_size = file_stat.st_size
-            file_mtime = file_stat.st_mtime
+            file_stat = os.stat(file_path) # Get stat result once
         except OSError as e:
             print(f"Warning: Could not stat file {file_path}: {e}")
             continue # Skip this file if stat fails
+        stats.append((file_path, file_stat))
+    if not stats:
+        return []
 
-        # Check if file needs hashing based on DB entry
-        existing_entry = db.query(FileEntry).filter_by(path=str(file_path)).first()
-        if existing_entry and existing_entry.size == file_size and existing_entry.mtime == file_mtime:
-            # File hasn't changed, skip hashing
+    # Check which files need hashing based on DB entries (one query per batch)
+    existing = {
+        row.path: row
+        for row in db.execute(
+            select(FileEntry.path, FileEntry.id, FileEntry.hash, FileEntry.size, FileEntry.mtime, FileEntry.inode)
+            .where(FileEntry.path.in_([path for path, _ in stats]))
+        )
+    }
+    records, unindexed = [], []
+    for path, file_stat in stats:
+        wants_chunks = chunk_threshold is not None and file_stat.st_size >= chunk_threshold
+        row = existing.get(path)
+        if row is None:
+            unindexed.append((path, file_stat))
             continue
+        if row.size == file_stat.st_size and row.mtime == file_stat.st_mtime:
+            # File hasn't changed, skip hashing (unless its chunks are still missing)
+            if not wants_chunks or _has_chunks(db, row.id):
+                if row.inode is None:
+                    # Reason: Backfill the content-identity key of rows indexed before it existed.
+                    records.append(FileRecord(path, file_stat, row.id, wants_chunks, known_hash=row.hash))
+                continue
+        records.append(FileRecord(path, file_stat, row.id, wants_chunks))
+    records.extend(_match_moved_files(db, unindexed, chunk_threshold, moving))
+    return records
 
-        # Hash the file.
-        try:
-            file_hash = hash_file(file_path)
-        except OSError as e:
-            print(f"Warning: Could not hash file {file_path}: {e}")
-            continue # Skip this file if hashing fails
-
-        # Create or update FileEntry.
-        if existing_entry:
-            existing_entry.hash = file_hash
-            existing_entry.size = file_size
-            existing_entry.mtime = file_mtime
-            entry_to_save = existing_entry
+
+def _hash_record(
+    record: FileRecord,
+    cache_policy: str = CACHE_POLICY_DEFAULT,
+    throttle: Optional[ScanThrottle] = None,
+) -> FileRecord:
+    """
+    Hashes a record's file (hashing stage; runs on the hash worker threads).
+
+    Args:
+        record (FileRecord): The record to fill in.
+        cache_policy (str): Page-cache policy for the read.
+        throttle (ScanThrottle, optional): The scan's rate limits and priorities.
+
+    Returns:
+        FileRecord: The same record, with hash (and chunks) set, or hash None on failure.
+    """
+    try:
+        if throttle:
+            throttle.before_file()
+        if record.wants_chunks:
+            # Reason: One read feeds both the whole-file digest and the chunker.
+            record.hash, record.chunks = hash_file_and_chunks(record.path, cache_policy=cache_policy, throttle=throttle)
         else:
-            entry_to_save = FileEntry(path=str(file_path), hash=file_hash, size=file_size, mtime=file_mtime)
+            record.hash = hash_file(record.path, cache_policy, throttle)
+    except OSError as e:
+        print(f"Warning: Could not hash file {record.path}: {e}")
+        record.hash = None # Skip this file if hashing fails
+    return record
+
+
+def _has_members(db: Session, archive_path: str) -> bool:
+    """Checks whether any member of an archive is indexed."""
+    conditions = _file_filters(path_prefix=archive_path + ARCHIVE_SEPARATOR)
+    return db.execute(select(FileEntry.id).where(*conditions).limit(1)).first() is not None
+
+
+def _hash_archive(
+    record: _ArchiveRecord,
+    limits: ArchiveLimits,
+    exclusions: Optional[ExclusionRules] = None,
+    throttle: Optional[ScanThrottle] = None,
+) -> _ArchiveRecord:
+    """Hashes an archive's members (hashing stage; runs on the hash worker threads)."""
+    try:
+        record.members = list(hash_archive_members(record.path, limits, exclusions, throttle))
+    except Exception as e:
+        # Reason: A bug or odd error in one archive must not fail the whole scan.
+        print(f"Warning: Could not read archive {record.path}: {e}")
+        record.members = None # Keep the members indexed so far
+    return record
+
 
-        # Store or update the file entry in the database.
+def _write_archive_members(db: Session, record: _ArchiveRecord) -> int:
+    """
+    Replaces the indexed members of an archive (writer stage).
+
+    Args:
+        db (Session): The database session.
+        record (_ArchiveRecord): An archive that went through _hash_archive.
+
+    Returns:
+        int: The number of members stored; 0 if the archive could not be read.
+    """
+    if record.members is None:
+        return 0
+    files = FileEntry.__table__
+    # Reason: An archive can hold one name several times; the last one wins, as when extracting.
+    members = {m.path: m for m in record.members}
+    try:
+        with db.begin_nested():
+            # Reason: Members are replaced as a whole, so ones removed from the archive disappear too.
+            db.execute(delete(files).where(*_file_filters(path_prefix=record.path + ARCHIVE_SEPARATOR)))
+            if members:
+                db.execute(insert(files), [
+                    {"path": m.path, "hash": m.hash, "size": m.size, "mtime": m.mtime} for m in members.values()
+                ])
+        return len(members)
+    except Exception as e:
+        print(f"Error storing members of archive {record.path}: {e}")
+        return 0
+
+
+def _execute_writes(db: Session, records: List[FileRecord]):
+    """Inserts/updates a batch of hashed records and their chunks with Core statements."""
+    files = FileEntry.__table__
+    connection = db.connection()
+
+    def values(r: FileRecord) -> dict:
+        return {"hash": r.hash, "size": r.size, "mtime": r.mtime,
+                "dev": r.dev, "inode": r.inode, "mtime_ns": r.mtime_ns}
+
+    inserted = [r for r in records if r.entry_id is None and r.moved_from_id is None]
+    new_rows = [r for r in inserted if r.chunks is None]
+    if new_rows:
+        connection.execute(insert(files), [{"path": r.path, **values(r)} for r in new_rows])
+    # Reason: Chunked files need their new id, so they are inserted one at a time.
+    for record in inserted:
+        if record.chunks is not None:
+            result = connection.execute(insert(files).values(path=record.path, **values(record)))
+            _store_chunks(db, result.inserted_primary_key[0], record.chunks)
+
+    # Reason: Taking over a moved file's row retires its old path in this same transaction.
+    moved = [r for r in records if r.moved_from_id is not None]
+    updated = [r for r in records if r.entry_id is not None]
+    for batch, new_path in ((moved, True), (updated, False)):
+        if not batch:
+            continue
+        new_values = {name: bindparam(f"b_{name}") for name in ("hash", "size", "mtime", "dev", "inode", "mtime_ns")}
+        if new_path:
+            new_values["path"] = bindparam("b_path")
+        connection.execute(
+            update(files).where(files.c.id == bindparam("b_id")).values(**new_values),
+            [
+                {"b_id": r.moved_from_id if new_path else r.entry_id, "b_path": r.path,
+                 **{f"b_{name}": value for name, value in values(r).items()}}
+                for r in batch
+            ],
+        )
+    # Reason: A moved archive's members move with it instead of being read again.
+    for record in moved:
+        if is_archive(record.moved_from_path):
+            old_prefix = record.moved_from_path + ARCHIVE_SEPARATOR
+            connection.execute(
+                update(files).prefix_with("OR REPLACE").where(*_file_filters(path_prefix=old_prefix))
+                .values(path=literal(record.path + ARCHIVE_SEPARATOR, String)
+                        + func.substr(files.c.path, len(old_prefix) + 1, type_=String))
+            )
+    # Reason: A rehashed file's old chunk digests are stale either way.
+    for record in updated:
+        if not record.reused:
+            _store_chunks(db, record.entry_id, record.chunks)
+
+
+def _write_records(db: Session, records: List[FileRecord]) -> int:
+    """
+    Stores a batch of hashed records (writer stage).
+
+    Args:
+        db (Session): The database session.
+        records (List[FileRecord]): Records that went through _hash_record.
+
+    Returns:
+        int: The number of entries stored.
+    """
+    records = [r for r in records if r.hash is not None]
+    if not records:
+        return 0
+    # Store or update the file entries in the database.
+    try:
+        # Reason: A savepoint confines a failure to this batch instead of discarding
+        # everything written since the last checkpoint.
+        with db.begin_nested():
+            _execute_writes(db, records)
+        return len(records)
+    except Exception:
+        pass
+    # Reason: Retry one by one so a bad row (e.g. an unencodable path) only loses itself.
+    stored = 0
+    for record in records:
         try:
-            db.add(entry_to_save)
-            db.flush() # Flush changes within the loop
+            with db.begin_nested():
+                _execute_writes(db, [record])
+            stored += 1
         except Exception as e:
-            print(f"Error adding/flushing entry for {file_path}: {e}")
-            db.rollback() # Rollback if adding this specific entry fails
+            print(f"Error adding/flushing entry for {record.path}: {e}")
+    return stored
+
+
+def _checkpoint(db: Session, job_id: int, files_seen: int, files_hashed: int, status: str = "running"):
+    """Records the job's progress and commits everything written so far."""
+    db.execute(
+        update(ScanJob)
+        .where(ScanJob.id == job_id)
+        .values(status=status, files_seen=files_seen, files_hashed=files_hashed, updated_at=time.time())
+    )
+    db.commit()
+    # Reason: Nothing from the scan needs to stay in the identity map between checkpoints.
+    db.expunge_all()
+
 
+def _run_scan_job(
+    db: Session,
+    job_id: int,
+    checkpoint_every: int,
+    hash_workers: int,
+    exclusions: Optional[ExclusionRules] = None,
+    throttle: Optional[ScanThrottle] = None,
+) -> ScanJob:
+    """
+    Works through a scan job's persisted frontier until it is empty.
+
+    Files flow through three stages: lookup (stat and database check, on this
+    thread), hashing (hash_workers threads) and writing (on this thread, in
+    queue order). Lookups and writes are batched DB_BATCH_SIZE files per
+    statement. At most PIPELINE_DEPTH items are in flight between lookup and
+    writing, and the frontier lives in the database, so memory stays flat no
+    matter how many files the tree holds. Progress is committed every
+    checkpoint_every files and directories, and at least every
+    CHECKPOINT_SECONDS once something was written, so a throttled scan never
+    holds the write lock (or hides its progress) for long.
+
+    A directory's subdirectories are queued, and the directory removed from the
+    frontier, only when its _DirectoryDone marker reaches the writer, i.e. after
+    all its files are stored, in the same transaction. After a crash a
+    directory is either still pending (and is re-listed; files already stored
+    are skipped without rehashing) or done together with its children being
+    queued. Finished subtrees are never walked again.
+
+    If the job indexes archive members, new or changed zip/tar archives also
+    go through the hashing stage as _ArchiveRecords, whose members replace
+    the archive's previously indexed members.
+
+    Args:
+        db (Session): The database session.
+        job_id (int): The job to run.
+        checkpoint_every (int): Commit after this many stored files and finished directories.
+        hash_workers (int): Number of hashing threads.
+        exclusions (ExclusionRules, optional): What to skip; defaults to the app config.
+        throttle (ScanThrottle, optional): Rate limits and priorities; defaults to none.
+                                           Registered under job_id while the job runs
+                                           so they can be changed (see app.core.throttle).
+
+    Returns:
+        ScanJob: The completed job.
+    """
+    job = db.get(ScanJob, job_id)
+    chunk_threshold = job.chunk_threshold
+    cache_policy = job.cache_policy or CACHE_POLICY_DEFAULT
+    archive_limits = None
+    if job.archive_max_members is not None:
+        archive_limits = ArchiveLimits(job.archive_max_bytes, job.archive_max_members)
+    # Reason: Compiled once per scan; .dupignore files are then read once per directory.
+    matcher = (exclusions or load_exclusion_rules()).matcher(job.root)
+    files_seen, files_hashed = job.files_seen, job.files_hashed
+    db.expunge_all()
+
+    in_flight = deque() # (FileRecord or _DirectoryDone, Future or None), in queue order
+    write_buffer = [] # Hashed records waiting for the next batched write
+    claimed = set() # Frontier ids whose marker is still in flight
+    moving = set() # Ids of moved files' rows being taken over by in-flight records
+    pending_work = 0 # Work written since the last checkpoint
+    last_checkpoint = time.monotonic()
+
+    def flush_writes():
+        nonlocal files_hashed, pending_work
+        if write_buffer:
+            files_hashed += _write_records(db, write_buffer)
+            pending_work += len(write_buffer)
+            moving.difference_update(r.moved_from_id for r in write_buffer if r.moved_from_id is not None)
+            write_buffer.clear()
+
+    def checkpoint():
+        nonlocal pending_work, last_checkpoint
+        flush_writes()
+        _checkpoint(db, job_id, files_seen, files_hashed)
+        pending_work = 0
+        last_checkpoint = time.monotonic()
+
+    def result_of(future):
+        # Reason: A throttled hash can take long; commit instead of holding the write lock meanwhile.
+        while pending_work:
+            try:
+                return future.result(timeout=max(0.0, last_checkpoint + CHECKPOINT_SECONDS - time.monotonic()))
+            except TimeoutError:
+                checkpoint()
+        return future.result()
+
+    def write_oldest():
+        nonlocal files_hashed, pending_work
+        item, future = in_flight.popleft()
+        if isinstance(item, _ArchiveRecord):
+            files_hashed += _write_archive_members(db, result_of(future))
+            pending_work += 1
+        elif isinstance(item, _DirectoryDone):
+            # Reason: The directory's files must be stored before it leaves the frontier.
+            flush_writes()
+            if item.subdirectories:
+                db.execute(
+                    insert(ScanFrontier).prefix_with("OR IGNORE"),
+                    [{"job_id": job_id, "path": path} for path in item.subdirectories],
+                )
+            db.execute(delete(ScanFrontier).where(ScanFrontier.id == item.frontier_id))
+            claimed.discard(item.frontier_id)
+            pending_work += 1
+        else:
+            write_buffer.append(result_of(future) if future is not None else item)
+            if len(write_buffer) >= DB_BATCH_SIZE:
+                flush_writes()
+        if pending_work >= checkpoint_every or (
+            pending_work and time.monotonic() - last_checkpoint >= CHECKPOINT_SECONDS
+        ):
+            checkpoint()
+
+    def enqueue(item, future=None):
+        in_flight.append((item, future))
+        # Reason: Bounded queue; the lookup stage waits for the writer when full.
+        if len(in_flight) > PIPELINE_DEPTH:
+            write_oldest()
+
+    def enqueue_files(file_paths: List[str]):
+        rehashed = set()
+        moved_from = {} # New path -> old path of moved files; their members are moved by the writer
+        for record in _prepare_records(db, file_paths, chunk_threshold, moving):
+            # Reason: Records whose digest is already known skip the hashing stage.
+            enqueue(record, None if record.reused else executor.submit(_hash_record, record, cache_policy, throttle))
+            if not record.reused:
+                rehashed.add(record.path)
+            if record.moved_from_id is not None:
+                moved_from[record.path] = record.moved_from_path
+        if archive_limits is None:
+            return
+        for path in file_paths:
+            # Reason: An unchanged archive is only expanded if its members were never indexed.
+            if is_archive(path) and (path in rehashed or not _has_members(db, moved_from.get(path, path))):
+                archive = _ArchiveRecord(path)
+                enqueue(archive, executor.submit(_hash_archive, archive, archive_limits, matcher.rules, throttle))
+
+    throttle = throttle or ScanThrottle()
+    register_throttle(job_id, throttle)
+    executor = ThreadPoolExecutor(max_workers=hash_workers, thread_name_prefix="scan-hash")
     try:
-        db.commit() # Commit all changes at the end of the scan
-    except Exception as e:
-        print(f"Error committing changes after scan: {e}")
-        db.rollback()
+        while True:
+            # Reason: Newest entry first gives a depth-first walk, keeping the frontier small.
+            pending = db.execute(
+                select(ScanFrontier.id, ScanFrontier.path)
+                .where(ScanFrontier.job_id == job_id, ScanFrontier.id.not_in(claimed))
+                .order_by(ScanFrontier.id.desc())
+                .limit(1)
+            ).first()
+            if pending is None:
+                if not in_flight:
+                    break
+                # Reason: Children appear in the frontier once in-flight markers are written.
+                write_oldest()
+                continue
+            frontier_id, dir_path = pending
+            claimed.add(frontier_id)
 
+            subdirectories, file_batch = [], []
+            for path, is_dir in _iter_directory(dir_path, matcher):
+                if is_dir:
+                    subdirectories.append(path)
+                    continue
+                files_seen += 1
+                file_batch.append(path)
+                if len(file_batch) >= DB_BATCH_SIZE:
+                    enqueue_files(file_batch)
+                    file_batch = []
+            enqueue_files(file_batch)
+            enqueue(_DirectoryDone(frontier_id, subdirectories))
 
-def walk_directory(directory: Path, config_file: str = None) -> Generator[Path, None, None]:
+        flush_writes()
+        _checkpoint(db, job_id, files_seen, files_hashed, status="completed")
+    finally:
+        # Reason: On a crash, don't keep hashing files whose results will be discarded.
+        executor.shutdown(wait=True, cancel_futures=True)
+        unregister_throttle(job_id)
+    return db.get(ScanJob, job_id)
+
+
+def scan_directory(
+    directory: Path,
+    db: Session,
+    chunk_threshold: Optional[int] = None,
+    checkpoint_every: int = CHECKPOINT_INTERVAL,
+    hash_workers: int = HASH_WORKERS,
+    exclusions: Optional[ExclusionRules] = None,
+    cache_policy: str = CACHE_POLICY_DEFAULT,
+    throttle: Optional[ScanThrottle] = None,
+    archive_limits: Optional[ArchiveLimits] = None,
+) -> ScanJob:
     """
-    Recursively walks through a directory and yields the paths of all files found.
+    Scans a directory, hashes files, and stores/updates file entries in the database.
+
+    The scan is recorded as a ScanJob whose pending directories are persisted
+    and committed every checkpoint_every files or CHECKPOINT_SECONDS, whichever
+    comes first, so an interrupted scan can be continued with resume_scan.
+    Memory use does not grow with the size of the tree (see _run_scan_job).
 
     Args:
-        directory (Path): The path to the directory to walk.
-        config_file (str, optional): The path to the config file. Defaults to None.
+        directory (Path): The directory to scan.
+        db (Session): The database session.
+        chunk_threshold (int, optional): Also index content-defined chunks of files
+                                         at least this many bytes large, for
+                                         find_partial_duplicates. Defaults to None (off).
+        checkpoint_every (int): Commit after this many files and directories.
+                                Defaults to CHECKPOINT_INTERVAL.
+        hash_workers (int): Number of hashing threads. Defaults to HASH_WORKERS.
+        exclusions (ExclusionRules, optional): Paths, sizes and extensions to skip.
+                                               Defaults to the rules in the app config
+                                               (see app.core.config.load_exclusion_rules).
+        cache_policy (str): Page-cache policy for reading files; "dontneed" or "direct"
+                            keep the scan from evicting other data from the page cache
+                            (see app.core.hashing.read_blocks). Kept for resume_scan.
+                            Defaults to CACHE_POLICY_DEFAULT.
+        throttle (ScanThrottle, optional): Bandwidth/file-rate limits, adaptive
+                                           latency backoff and worker priorities.
+                                           Adjustable while the scan runs via
+                                           app.core.throttle.get_throttle(job_id).
+        archive_limits (ArchiveLimits, optional): Also index the members of zip and tar
+                                                  archives, as ``archive!/member`` paths,
+                                                  reading at most this much of each archive
+                                                  (see app.core.archives). Kept for resume_scan.
+                                                  Defaults to None (archives are plain files).
 
-    Yields:
-        Path: The path to each file found in the directory.
+    Returns:
+        ScanJob: The completed scan job.
+
+    Raises:
+        FileNotFoundError: If the directory does not exist.
+        ValueError: If cache_policy is unknown.
     """
-    # Reason: Ensure directory exists before proceeding.
+    if cache_policy not in CACHE_POLICIES:
+        raise ValueError(f"Unknown cache policy {cache_policy!r}; expected one of {', '.join(CACHE_POLICIES)}.")
     if not directory.is_dir():
-        # Use FileNotFoundError for consistency with os.walk behavior if path doesn't exist
         raise FileNotFoundError(f"Directory '{directory}' not found or is not a directory.")
 
-    excluded_directories = []
+    now = time.time()
+    job_id = db.execute(insert(ScanJob).values(
+        root=str(directory), status="running", chunk_threshold=chunk_threshold, cache_policy=cache_policy,
+        archive_max_bytes=archive_limits.max_bytes if archive_limits else None,
+        archive_max_members=archive_limits.max_members if archive_limits else None,
+        files_seen=0, files_hashed=0, started_at=now, updated_at=now,
+    )).inserted_primary_key[0]
+    db.execute(insert(ScanFrontier).values(job_id=job_id, path=str(directory)))
+    db.commit() # The job is resumable from here on
+    return _run_scan_job(db, job_id, checkpoint_every, hash_workers, exclusions, throttle)
+
+
+def resume_scan(
+    job_id: int,
+    db: Session,
+    checkpoint_every: int = CHECKPOINT_INTERVAL,
+    hash_workers: int = HASH_WORKERS,
+    exclusions: Optional[ExclusionRules] = None,
+    throttle: Optional[ScanThrottle] = None,
+) -> ScanJob:
+    """
+    Continues an interrupted scan from its last checkpoint.
+
+    Args:
+        job_id (int): The id of the ScanJob to continue.
+        db (Session): The database session.
+        checkpoint_every (int): Commit after this many files and directories.
+                                Defaults to CHECKPOINT_INTERVAL.
+        hash_workers (int): Number of hashing threads. Defaults to HASH_WORKERS.
+        exclusions (ExclusionRules, optional): Paths, sizes and extensions to skip.
+                                               Defaults to the rules in the app config.
+        throttle (ScanThrottle, optional): Rate limits and priorities, see scan_directory.
+
+    Returns:
+        ScanJob: The completed scan job (returned as is if it already completed).
+
+    Raises:
+        LookupError: If no scan job has this id.
+    """
+    job = db.get(ScanJob, job_id)
+    if job is None:
+        raise LookupError(f"Scan job {job_id} not found.")
+    if job.status == "completed":
+        return job
+    return _run_scan_job(db, job_id, checkpoint_every, hash_workers, exclusions, throttle)
+
+
+def _load_exclusion_rules(config_path: Optional[Path]) -> ExclusionRules:
+    """
+    Reads and compiles the exclusion settings of a JSON config file.
+
+    Args:
+        config_path (Path, optional): The config file; None means no configured exclusions.
+
+    Returns:
+        ExclusionRules: The compiled rules (per-directory .dupignore files still apply).
+    """
     # Reason: Load exclusion config only if specified and exists.
-    config_path = Path(config_file) if config_file else None
     if config_path and config_path.is_file():
         try:
             with open(config_path, "r") as f:
-                config_data = json.load(f)
-                # Reason: Safely get excluded_directories list, default to empty list if key missing.
-                excluded_directories = config_data.get("excluded_directories", [])
+                return ExclusionRules.from_config(json.load(f))
         except (json.JSONDecodeError, OSError) as e:
             print(f"Warning: Could not load or parse config file {config_path}: {e}")
             # Continue without exclusions if config fails to load
+    return ExclusionRules()
 
-    # Reason: Use os.walk for efficient directory traversal. Convert Path to string for os.walk.
-    for root, dirs, files in os.walk(str(directory)):
-        root_path = Path(root)
-        # Filter out directories to exclude from further traversal
-        # Reason: Modify dirs[:] in-place as required by os.walk API.
-        # Reason: Exclude common hidden/system directories and configured exclusions.
-        dirs[:] = [d for d in dirs if not d.startswith(('.', '__')) and d not in excluded_directories]
-
-        for file in files:
-            # Reason: Exclude common hidden files.
-            if file.startswith('.'):
-                continue
 
-            file_path = root_path / file
+def _iter_directory(
+    dir_path: str,
+    exclusions: Optional[ExclusionMatcher] = None,
+    config_path: Optional[Path] = None,
+) -> Generator[Tuple[str, bool], None, None]:
+    """
+    Lists one directory, applying the same skip rules as walk_directory.
 
-            # Reason: Skip symbolic links as per requirements.
-            if file_path.is_symlink():
-                continue
+    Excluded subdirectories are never yielded, so their whole subtree is pruned
+    without being listed. Paths are plain strings: building a Path interns every
+    name component, which would make memory grow with the number of files scanned.
 
+    Args:
+        dir_path (str): The directory to list.
+        exclusions (ExclusionMatcher, optional): The scan's exclusion rules.
+        config_path (Path, optional): A config file to leave out of the results.
+
+    Yields:
+        Tuple[str, bool]: Each kept entry's path and whether it is a subdirectory.
+    """
+    directory_filter = exclusions.directory(dir_path) if exclusions else None
+    check_size = exclusions is not None and exclusions.rules.has_size_rules
+    config_file = str(config_path) if config_path else None
+    try:
+        entries = os.scandir(dir_path)
+    except OSError as e:
+        print(f"Warning: Could not list directory {dir_path}: {e}")
+        return
+    with entries:
+        for entry in entries:
+            try:
+                # Reason: follow_symlinks=False skips symlinked directories and files alike.
+                if entry.is_dir(follow_symlinks=False):
+                    # Reason: Exclude common hidden/system directories and configured exclusions.
+                    if not entry.name.startswith(('.', '__')) and not (
+                        directory_filter and directory_filter.excludes(entry.name, True)
+                    ):
+                        yield entry.path, True
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                # Reason: Exclude common hidden files.
+                if entry.name.startswith('.'):
+                    continue
+                if directory_filter and directory_filter.excludes(entry.name, False):
+                    continue
+                if check_size and exclusions.excludes_size(entry.stat(follow_symlinks=False).st_size):
+                    continue
+            except OSError:
+                continue
             # Reason: Avoid processing the configuration file itself if it's within the scanned directory.
-            if config_path and file_path == config_path:
+            if config_file and entry.path == config_file:
                 continue
+            yield entry.path, False
+
+
+def walk_directory(directory: Path, config_file: str = None) -> Generator[Path, None, None]:
+    """
+    Recursively walks through a directory and yields the paths of all files found.
+
+    Args:
+        directory (Path): The path to the directory to walk.
+        config_file (str, optional): The path to the config file. Defaults to None.
+
+    Yields:
+        Path: The path to each file found in the directory.
+    """
+    # Reason: Ensure directory exists before proceeding.
+    if not directory.is_dir():
+        # Use FileNotFoundError for consistency with os.walk behavior if path doesn't exist
+        raise FileNotFoundError(f"Directory '{directory}' not found or is not a directory.")
+
+    config_path = Path(config_file) if config_file else None
+    exclusions = _load_exclusion_rules(config_path).matcher(str(directory))
+
+    # Reason: Explicit stack over _iter_directory so the walk and checkpointed
+    # scans (see _run_scan_job) apply exactly the same skip rules.
+    pending = [str(directory)]
+    while pending:
+        for path, is_dir in _iter_directory(pending.pop(), exclusions, config_path):
+            if is_dir:
+                pending.append(path)
+            else:
+                # Reason: Yield only valid file paths.
+                yield Path(path)
+
+
+def _file_filters(min_size: Optional[int] = None, path_prefix: Optional[str] = None) -> list:
+    """Builds WHERE conditions restricting files by minimum size and path prefix."""
+    conditions = []
+    if min_size:
+        conditions.append(FileEntry.size >= min_size)
+    if path_prefix:
+        # Reason: A half-open range is case-sensitive (unlike LIKE in SQLite) and
+        # can use the unique index on path.
+        upper = path_prefix[:-1] + chr(ord(path_prefix[-1]) + 1)
+        conditions.append(and_(FileEntry.path >= path_prefix, FileEntry.path < upper))
+    return conditions
 
-            # Reason: Yield only valid file paths.
-            yield file_path
+
+def _duplicate_groups(conditions: list):
+    """Returns a subquery of duplicated hashes with their member count, size and wasted bytes."""
+    count = func.count()
+    size = func.max(FileEntry.size)
+    return (
+        select(
+            FileEntry.hash,
+            count.label("count"),
+            size.label("size"),
+            ((count - 1) * size).label("wasted"),
+        )
+        .where(*conditions)
+        .group_by(FileEntry.hash)
+        .having(count > 1)
+        .subquery()
+    )
 
 
-def find_duplicates(db: Session) -> Dict[str, List[str]]:
+DUPLICATE_ORDERS = ("wasted", "count", "size")
+
+
+def _ranked_hashes(groups, order_by: Optional[str]):
+    """Selects the hashes of a _duplicate_groups subquery, largest first by order_by."""
+    ranked = select(groups.c.hash)
+    if order_by is not None:
+        if order_by not in DUPLICATE_ORDERS:
+            raise ValueError(f"Unknown order_by {order_by!r}; expected one of {', '.join(DUPLICATE_ORDERS)}.")
+        # Reason: Tie-break on hash so pages are stable between requests.
+        ranked = ranked.order_by(groups.c[order_by].desc(), groups.c.hash)
+    return ranked
+
+
+def find_duplicates(
+    db: Session,
+    min_size: Optional[int] = None,
+    path_prefix: Optional[str] = None,
+    order_by: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, List[str]]:
     """
     Finds and returns a dictionary of duplicate file groups {hash: [paths]}.
 
+    Grouping, ranking and limiting are done with SQL aggregates over the
+    (hash, size) index; only the paths of the selected groups are fetched.
+
     Args:
         db (Session): The database session.
+        min_size (int, optional): Only consider files at least this many bytes large.
+        path_prefix (str, optional): Only consider files whose path starts with this.
+        order_by (str, optional): "wasted" (bytes reclaimable by keeping one copy),
+                                  "count" (number of copies) or "size" (file size),
+                                  largest first. Defaults to None (no particular order).
+        limit (int, optional): Return at most this many groups.
 
     Returns:
         Dict[str, List[str]]: A dictionary where keys are file hashes
                               and values are lists of paths for duplicate files.
                               Only includes hashes that appear more than once.
+                              Groups are in the requested order.
     """
     duplicates_dict = {}
+    conditions = _file_filters(min_size, path_prefix)
 
     # Step 1: Find hashes that appear more than once
     # Reason: Subquery efficiently identifies hashes associated with more than one file.
-    subquery = (
-        select(FileEntry.hash)
-        .group_by(FileEntry.hash)
-        .having(func.count(FileEntry.id) > 1)
-        .subquery()
-    )
+    ranked = _ranked_hashes(_duplicate_groups(conditions), order_by)
+    if limit is not None:
+        ranked = ranked.limit(limit)
 
-    # Step 2: Select all file entries whose hash is in the subquery result
-    # Reason: Retrieve all FileEntry objects that are part of a duplicate group.
-    stmt = select(FileEntry).where(FileEntry.hash.in_(select(subquery.c.hash)))
+    if order_by is not None:
+        # Reason: Seed the dict in rank order; paths are then fetched in one query.
+        for (file_hash,) in db.execute(ranked):
+            duplicates_dict[file_hash] = []
+        if not duplicates_dict:
+            return duplicates_dict
+        ranked = list(duplicates_dict)
 
-    # Reason: Execute the query and get all results.
-    duplicate_entries = db.execute(stmt).scalars().all()
+    # Step 2: Select (hash, path) for every file whose hash is in the subquery result
+    # Reason: Plain Core rows avoid building an ORM instance per duplicate file.
+    stmt = select(FileEntry.hash, FileEntry.path).where(FileEntry.hash.in_(ranked), *conditions)
 
     # Step 3: Group the paths by hash
     # Reason: Construct the required dictionary format {hash: [path1, path2, ...]}.
-    for entry in duplicate_entries:
-        if entry.hash not in duplicates_dict:
-            duplicates_dict[entry.hash] = []
-        duplicates_dict[entry.hash].append(entry.path)
+    for file_hash, file_path in db.execute(stmt):
+        duplicates_dict.setdefault(file_hash, []).append(file_path)
 
     return duplicates_dict
+
+
+def find_duplicate_groups(
+    db: Session,
+    offset: int = 0,
+    limit: int = 100,
+    order_by: str = "wasted",
+    min_size: Optional[int] = None,
+    path_prefix: Optional[str] = None,
+    max_paths: int = 50,
+) -> Dict[str, Any]:
+    """
+    Returns one page of ranked duplicate groups with their sizes.
+
+    Ranking, paging and truncating each group's path list all happen in SQL,
+    so the cost of a page does not depend on the number or size of groups.
+
+    Args:
+        db (Session): The database session.
+        offset (int): Number of ranked groups to skip.
+        limit (int): Maximum number of groups in the page.
+        order_by (str): "wasted", "count" or "size", largest first.
+        min_size (int, optional): Only consider files at least this many bytes large.
+        path_prefix (str, optional): Only consider files whose path starts with this.
+        max_paths (int): Maximum number of paths listed per group.
+
+    Returns:
+        Dict[str, Any]: ``total`` (number of groups) and ``groups``, a list of
+                        {"hash", "size", "count", "wasted", "paths"} with paths
+                        sorted and cut to max_paths.
+    """
+    conditions = _file_filters(min_size, path_prefix)
+    groups = _duplicate_groups(conditions)
+    total = db.execute(select(func.count()).select_from(groups)).scalar_one()
+    page = _ranked_hashes(groups, order_by).add_columns(groups.c.size, groups.c.count, groups.c.wasted)
+    page_groups = {
+        row.hash: {"hash": row.hash, "size": row.size, "count": row.count, "wasted": row.wasted, "paths": []}
+        for row in db.execute(page.offset(offset).limit(limit))
+    }
+    if page_groups:
+        position = func.row_number().over(partition_by=FileEntry.hash, order_by=FileEntry.path).label("position")
+        members = (
+            select(FileEntry.hash, FileEntry.path, position)
+            .where(FileEntry.hash.in_(list(page_groups)), *conditions)
+            .subquery()
+        )
+        for file_hash, file_path in db.execute(
+            select(members.c.hash, members.c.path).where(members.c.position <= max_paths).order_by(members.c.position)
+        ):
+            page_groups[file_hash]["paths"].append(file_path)
+    return {"total": total, "groups": list(page_groups.values())}
+
+
+def duplicate_stats(db: Session, min_size: Optional[int] = None, path_prefix: Optional[str] = None) -> Dict[str, int]:
+    """
+    Computes index-wide totals with SQL aggregates.
+
+    Args:
+        db (Session): The database session.
+        min_size (int, optional): Only consider files at least this many bytes large.
+        path_prefix (str, optional): Only consider files whose path starts with this.
+
+    Returns:
+        Dict[str, int]: ``files`` and ``bytes`` indexed, ``duplicate_groups``,
+                        ``duplicate_files`` (files in those groups) and
+                        ``reclaimable_bytes`` (freed by keeping one copy per group).
+    """
+    conditions = _file_filters(min_size, path_prefix)
+    files, total_bytes = db.execute(
+        select(func.count(), func.coalesce(func.sum(FileEntry.size), 0)).where(*conditions)
+    ).one()
+    groups = _duplicate_groups(conditions)
+    duplicate_groups, duplicate_files, reclaimable = db.execute(
+        select(func.count(), func.coalesce(func.sum(groups.c.count), 0), func.coalesce(func.sum(groups.c.wasted), 0))
+    ).one()
+    return {
+        "files": files,
+        "bytes": total_bytes,
+        "duplicate_groups": duplicate_groups,
+        "duplicate_files": duplicate_files,
+        "reclaimable_bytes": reclaimable,
+    }
+
+
+def find_partial_duplicates(db: Session, min_ratio: float = 0.5, limit: int = 100) -> Dict[str, Any]:
+    """
+    Finds pairs of chunk-indexed files that share content without being identical.
+
+    Uses the chunk digests stored by scan_directory(chunk_threshold=...). Pairs
+    are ranked by shared bytes; files with equal whole-file hashes are left to
+    find_duplicates.
+
+    Args:
+        db (Session): The database session.
+        min_ratio (float): Minimum shared bytes as a fraction of the larger file.
+        limit (int): Maximum number of pairs to return.
+
+    Returns:
+        Dict[str, Any]: ``pairs`` (list of dicts with path_a, path_b, size_a, size_b,
+                        shared_bytes and shared_ratio) and
+                        ``estimated_dedup_savings_bytes``, the bytes block-level
+                        deduplication would save across all chunk-indexed files.
+    """
+    chunk = FileChunk.__table__
+
+    # Step 1: Each distinct chunk once per file, ignoring very common digests
+    popular = (
+        select(chunk.c.digest)
+        .group_by(chunk.c.digest)
+        .having(func.count(func.distinct(chunk.c.file_id)) > CHUNK_FANOUT_LIMIT)
+    )
+    file_chunks = (
+        select(chunk.c.file_id, chunk.c.digest, chunk.c.length)
+        .where(chunk.c.digest.not_in(popular))
+        .distinct()
+        .subquery()
+    )
+
+    # Step 2: Sum the bytes of chunks each pair of files has in common
+    a, b = file_chunks.alias("a"), file_chunks.alias("b")
+    shared = (
+        select(a.c.file_id.label("file_a"), b.c.file_id.label("file_b"), func.sum(a.c.length).label("shared_bytes"))
+        .join_from(a, b, and_(a.c.digest == b.c.digest, a.c.file_id < b.c.file_id))
+        .group_by(a.c.file_id, b.c.file_id)
+        .subquery()
+    )
+
+    # Step 3: Attach paths and sizes, filter by ratio, rank by shared bytes
+    file_a, file_b = aliased(FileEntry), aliased(FileEntry)
+    # Reason: SQLite's two-argument max() is the scalar maximum, not the aggregate.
+    shared_ratio = (shared.c.shared_bytes * 1.0 / func.max(file_a.size, file_b.size, 1)).label("shared_ratio")
+    stmt = (
+        select(file_a.path, file_b.path, file_a.size, file_b.size, shared.c.shared_bytes, shared_ratio)
+        .join(file_a, file_a.id == shared.c.file_a)
+        .join(file_b, file_b.id == shared.c.file_b)
+        .where(file_a.hash != file_b.hash, shared_ratio >= min_ratio)
+        .order_by(shared.c.shared_bytes.desc())
+        .limit(limit)
+    )
+    pairs = [
+        {"path_a": path_a, "path_b": path_b, "size_a": size_a, "size_b": size_b,
+         "shared_bytes": shared_bytes, "shared_ratio": ratio}
+        for path_a, path_b, size_a, size_b, shared_bytes, ratio in db.execute(stmt)
+    ]
+
+    # Step 4: Every extra copy of a chunk is a block dedup would not store again
+    copies = (
+        select(chunk.c.length, func.count().label("copies"))
+        .group_by(chunk.c.digest, chunk.c.length)
+        .subquery()
+    )
+    savings = db.execute(select(func.coalesce(func.sum((copies.c.copies - 1) * copies.c.length), 0))).scalar_one()
+
+    return {"pairs": pairs, "estimated_dedup_savings_bytes": savings}
@@ -0,0 +1,91 @@
+import gzip
+import json
+from typing import Any, Iterable, Optional, Sequence, Tuple
+
+# Reason: orjson is an optional speed-up; the stdlib encoder produces the same JSON.
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# Bodies smaller than this are not worth compressing.
+GZIP_MIN_SIZE = 1024
+# Level 1 compresses JSON listings within ~5% of level 5 at half the CPU time,
+# which every cache miss pays while a scan keeps changing the data.
+GZIP_LEVEL = 1
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Serializes data to compact UTF-8 JSON, using orjson when it is installed.
+
+    Args:
+        data (Any): JSON-compatible data (dicts, lists, str, int, float, None).
+
+    Returns:
+        bytes: The encoded JSON document.
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def rows_to_json(columns: Sequence[str], rows: Iterable[Tuple]) -> bytes:
+    """
+    Serializes Core result rows as a JSON array of objects, without building
+    ORM instances or validating each row through a Pydantic model.
+
+    Args:
+        columns (Sequence[str]): Object keys, in the same order as each row's values.
+        rows (Iterable[Tuple]): Row tuples, e.g. from ``session.execute(select(...))``.
+
+    Returns:
+        bytes: The encoded JSON array.
+    """
+    return dumps([dict(zip(columns, row)) for row in rows])
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """
+    Checks whether an Accept-Encoding header allows a gzip response.
+
+    Args:
+        accept_encoding (str, optional): The raw Accept-Encoding header value.
+
+    Returns:
+        bool: True if gzip (or ``*``) is listed with a non-zero quality.
+    """
+    if not accept_encoding:
+        return False
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        return quality > 0
+    return False
+
+
+def maybe_gzip(body: bytes, use_gzip: bool) -> Tuple[bytes, Optional[str]]:
+    """
+    Compresses a body when the client negotiated gzip and it is large enough.
+
+    Args:
+        body (bytes): The uncompressed body.
+        use_gzip (bool): Whether the client accepts gzip.
+
+    Returns:
+        Tuple[bytes, Optional[str]]: The body to send and its Content-Encoding
+                                     (None if sent uncompressed).
+    """
+    if not use_gzip or len(body) < GZIP_MIN_SIZE:
+        return body, None
+    # Reason: mtime=0 keeps the output deterministic, so its strong ETag is stable.
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
@@ -0,0 +1,295 @@
+"""
+Portable index snapshots.
+
+A snapshot is a gzip stream holding a versioned header followed by file
+records sorted by (digest, size, mtime, host, path), so snapshots taken on
+separate nodes can be combined with a streaming k-way merge whose memory use
+does not depend on how many records they hold.
+
+Layout (big-endian, inside the gzip stream)::
+
+    header:  b"DUPSNAP\\0" | version u16
+    record:  0x01 | digest 32B | size u64 | mtime f64 | host_len u16 | path_len u16 | host | path
+    trailer: 0x00 | record count u64
+
+Usage:
+    python -m app.core.snapshot export --db files.db --output node1.snap [--host NAME]
+    python -m app.core.snapshot merge --output all.snap node1.snap node2.snap ...
+    python -m app.core.snapshot import --db central.db node1.snap node2.snap ...
+"""
+import argparse
+import gzip
+import heapq
+import socket
+import struct
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, NamedTuple, Optional, Union
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.models.file_entry import FileEntry
+
+MAGIC = b"DUPSNAP\0"
+FORMAT_VERSION = 1
+DIGEST_SIZE = 32 # SHA-256
+GZIP_LEVEL = 6
+EXPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 1000
+
+_HEADER = struct.Struct(">8sH")
+_RECORD = struct.Struct(f">{DIGEST_SIZE}sQdHH")
+_COUNT = struct.Struct(">Q")
+_RECORD_TAG = b"\x01"
+_END_TAG = b"\x00"
+
+
+class SnapshotRecord(NamedTuple):
+    """One indexed file; tuples order by (digest, size, mtime, host, path)."""
+    digest: bytes
+    size: int
+    mtime: float
+    host: str
+    path: str
+
+
+class SnapshotWriter:
+    """
+    Streams sorted records into a snapshot file.
+
+    Args:
+        output (Union[str, Path]): The snapshot file to create.
+
+    Raises:
+        ValueError: From write() if records are not in sorted order.
+    """
+
+    def __init__(self, output: Union[str, Path]):
+        self._file = gzip.open(output, "wb", compresslevel=GZIP_LEVEL)
+        self._file.write(_HEADER.pack(MAGIC, FORMAT_VERSION))
+        self._last: Optional[SnapshotRecord] = None
+        self.count = 0
+
+    def write(self, record: SnapshotRecord):
+        """Appends one record."""
+        if self._last is not None and record < self._last:
+            raise ValueError(f"Snapshot records must be sorted; {record.path!r} follows {self._last.path!r}.")
+        host, path = record.host.encode("utf-8"), record.path.encode("utf-8")
+        self._file.write(_RECORD_TAG + _RECORD.pack(record.digest, record.size, record.mtime, len(host), len(path)))
+        self._file.write(host + path)
+        self._last = record
+        self.count += 1
+
+    def close(self):
+        """Writes the trailer and closes the file."""
+        if self._file is not None:
+            self._file.write(_END_TAG + _COUNT.pack(self.count))
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._file is not None:
+            # Reason: Leave no trailer, so an aborted export is rejected as truncated.
+            self._file.close()
+            self._file = None
+
+
+def _read_exact(stream: BinaryIO, size: int, source: str) -> bytes:
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError(f"Snapshot {source} is truncated.")
+    return data
+
+
+def read_snapshot(source: Union[str, Path]) -> Iterator[SnapshotRecord]:
+    """
+    Streams the records of a snapshot file.
+
+    Args:
+        source (Union[str, Path]): The snapshot file.
+
+    Yields:
+        SnapshotRecord: Each record, in sorted order.
+
+    Raises:
+        ValueError: If the file is not a snapshot, has an unsupported version,
+                    is truncated, or is not sorted.
+    """
+    with gzip.open(source, "rb") as stream:
+        try:
+            magic, version = _HEADER.unpack(_read_exact(stream, _HEADER.size, source))
+        except (OSError, EOFError) as e:
+            raise ValueError(f"{source} is not a snapshot file: {e}") from e
+        if magic != MAGIC:
+            raise ValueError(f"{source} is not a snapshot file.")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Snapshot {source} has unsupported format version {version}.")
+        count = 0
+        last = None
+        try:
+            while True:
+                tag = _read_exact(stream, 1, source)
+                if tag == _END_TAG:
+                    (expected,) = _COUNT.unpack(_read_exact(stream, _COUNT.size, source))
+                    if expected != count:
+                        raise ValueError(f"Snapshot {source} holds {count} records, trailer says {expected}.")
+                    return
+                if tag != _RECORD_TAG:
+                    raise ValueError(f"Snapshot {source} is corrupt (record tag {tag!r}).")
+                digest, size, mtime, host_len, path_len = _RECORD.unpack(_read_exact(stream, _RECORD.size, source))
+                names = _read_exact(stream, host_len + path_len, source)
+                record = SnapshotRecord(
+                    digest, size, mtime,
+                    names[:host_len].decode("utf-8"), names[host_len:].decode("utf-8"),
+                )
+                if last is not None and record < last:
+                    raise ValueError(f"Snapshot {source} is not sorted at {record.path!r}.")
+                last = record
+                count += 1
+                yield record
+        except EOFError as e:
+            raise ValueError(f"Snapshot {source} is truncated.") from e
+
+
+def write_snapshot(records: Iterable[SnapshotRecord], output: Union[str, Path]) -> int:
+    """
+    Writes sorted records to a snapshot file.
+
+    Args:
+        records (Iterable[SnapshotRecord]): The records, in sorted order.
+        output (Union[str, Path]): The snapshot file to create.
+
+    Returns:
+        int: The number of records written.
+    """
+    with SnapshotWriter(output) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.count
+
+
+def export_snapshot(db: Session, output: Union[str, Path], host: Optional[str] = None) -> int:
+    """
+    Exports the file index to a snapshot.
+
+    Rows are streamed from the database already sorted, so memory use does
+    not grow with the size of the index.
+
+    Args:
+        db (Session): The database session.
+        output (Union[str, Path]): The snapshot file to create.
+        host (str, optional): Host name recorded with every file. Defaults to this machine's.
+
+    Returns:
+        int: The number of records written.
+    """
+    host = socket.gethostname() if host is None else host
+    rows = db.execute(
+        select(FileEntry.hash, FileEntry.size, FileEntry.mtime, FileEntry.path)
+        .order_by(FileEntry.hash, FileEntry.size, FileEntry.mtime, FileEntry.path)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    return write_snapshot(
+        (SnapshotRecord(bytes.fromhex(file_hash), size, mtime, host, path) for file_hash, size, mtime, path in rows),
+        output,
+    )
+
+
+def merge_snapshots(sources: Iterable[Union[str, Path]]) -> Iterator[SnapshotRecord]:
+    """
+    Streams the records of several snapshots as one sorted sequence.
+
+    Uses a k-way merge, holding one pending record per input.
+
+    Args:
+        sources (Iterable[Union[str, Path]]): The snapshot files.
+
+    Yields:
+        SnapshotRecord: Every input record, in sorted order.
+    """
+    return heapq.merge(*(read_snapshot(source) for source in sources))
+
+
+def import_records(db: Session, records: Iterable[SnapshotRecord]) -> int:
+    """
+    Stores snapshot records in the file index, as ``host:path`` paths.
+
+    A record whose path is already indexed replaces that row's digest, size
+    and mtime. Records are written in batches and committed at the end.
+
+    Args:
+        db (Session): The database session.
+        records (Iterable[SnapshotRecord]): The records to store.
+
+    Returns:
+        int: The number of records stored.
+    """
+    stmt = sqlite_insert(FileEntry.__table__)
+    # Reason: Keep the existing row (and its id) when a node is re-imported.
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["path"],
+        set_={"hash": stmt.excluded.hash, "size": stmt.excluded.size, "mtime": stmt.excluded.mtime},
+    )
+    connection = db.connection()
+    batch: List[dict] = []
+    count = 0
+    for record in records:
+        batch.append({
+            "path": f"{record.host}:{record.path}", "hash": record.digest.hex(),
+            "size": record.size, "mtime": record.mtime,
+        })
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            connection.execute(stmt, batch)
+            count += len(batch)
+            batch.clear()
+    if batch:
+        connection.execute(stmt, batch)
+        count += len(batch)
+    db.commit()
+    return count
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Write a database's file index to a snapshot.")
+    export_parser.add_argument("--db", required=True, help="SQLite database to export")
+    export_parser.add_argument("--output", required=True, help="Snapshot file to create")
+    export_parser.add_argument("--host", help="Host name to record (default: this machine's)")
+    merge_parser = commands.add_parser("merge", help="Merge snapshots into one snapshot.")
+    merge_parser.add_argument("--output", required=True, help="Snapshot file to create")
+    merge_parser.add_argument("snapshots", nargs="+", help="Snapshot files to merge")
+    import_parser = commands.add_parser("import", help="Merge snapshots into a database.")
+    import_parser.add_argument("--db", required=True, help="SQLite database to import into (created if missing)")
+    import_parser.add_argument("snapshots", nargs="+", help="Snapshot files to import")
+    args = parser.parse_args(argv)
+
+    if args.command == "merge":
+        count = write_snapshot(merge_snapshots(args.snapshots), args.output)
+        print(f"Merged {len(args.snapshots)} snapshots ({count} records) into {args.output}")
+        return
+
+    # Reason: Imported here so snapshot merging works without a database.
+    from app.core.db import create_db_and_tables, create_db_engine
+    engine = create_db_engine(args.db)
+    try:
+        create_db_and_tables(engine)
+        with Session(engine) as session:
+            if args.command == "export":
+                count = export_snapshot(session, args.output, args.host)
+                print(f"Exported {count} records to {args.output}")
+            else:
+                count = import_records(session, merge_snapshots(args.snapshots))
+                print(f"Imported {count} records from {len(args.snapshots)} snapshots into {args.db}")
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
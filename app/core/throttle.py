@@ -0,0 +1,266 @@
+import ctypes
+import ctypes.util
+import os
+import platform
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional
+
+from app.core.hashing import ZeroBlock
+
+# Adaptive backoff: delay added after each read while the smoothed read
+# latency stays above the job's latency target.
+MIN_BACKOFF = 0.001 # Seconds
+MAX_BACKOFF = 0.5 # Seconds
+LATENCY_SMOOTHING = 0.2 # Weight of the newest sample in the moving average
+# Longest single wait, so rate changes made while a worker waits apply promptly.
+MAX_WAIT_SLICE = 0.1 # Seconds
+
+IO_PRIORITY_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+_IOPRIO_CLASS_NONE = 0 # The default: I/O priority follows the thread's niceness
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+_SYS_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket whose rate can be changed while in use.
+
+    A caller may take more tokens than are available; the bucket then goes into
+    debt and later callers wait until it is repaid, so requests larger than the
+    burst size (such as a whole read block) still average out to the rate.
+
+    Args:
+        rate (float, optional): Tokens per second; None means unlimited.
+        burst (float, optional): Bucket capacity. Defaults to one second's worth.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None):
+        self._cond = threading.Condition()
+        self._last = time.monotonic()
+        self.rate = None
+        self.burst = 0.0
+        self.tokens = 0.0
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate: Optional[float], burst: Optional[float] = None):
+        """Changes the rate (None for unlimited); waiting callers re-check immediately."""
+        with self._cond:
+            self._refill()
+            self.rate = rate
+            self.burst = burst if burst is not None else (rate or 0.0)
+            self.tokens = min(self.tokens, self.burst)
+            self._cond.notify_all()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, amount: float = 1.0):
+        """Takes amount tokens, blocking while the bucket is in debt."""
+        with self._cond:
+            while True:
+                if self.rate is None:
+                    return
+                self._refill()
+                if self.tokens >= 0:
+                    self.tokens -= amount
+                    return
+                self._cond.wait(min(-self.tokens / self.rate, MAX_WAIT_SLICE))
+
+
+def _set_io_priority(io_class: Optional[str], level: int):
+    """
+    Sets the calling thread's I/O scheduling class and level via ioprio_set(2) (Linux only).
+
+    An io_class of None restores the default, where I/O priority follows niceness.
+    """
+    syscall_number = _SYS_IOPRIO_SET.get(platform.machine())
+    if platform.system() != "Linux" or syscall_number is None:
+        print(f"Warning: I/O priority is not supported on {platform.system()} {platform.machine()}.")
+        return
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if io_class is None:
+        value = _IOPRIO_CLASS_NONE << _IOPRIO_CLASS_SHIFT
+    else:
+        value = (IO_PRIORITY_CLASSES[io_class] << _IOPRIO_CLASS_SHIFT) | level
+    if libc.syscall(syscall_number, _IOPRIO_WHO_PROCESS, threading.get_native_id(), value) != 0:
+        errno = ctypes.get_errno()
+        print(f"Warning: Could not set I/O priority {io_class or 'none'}/{level}: {os.strerror(errno)}")
+
+
+class ScanThrottle:
+    """
+    Rate limits and priorities shared by all hashing workers of one scan.
+
+    Every setting can be changed with update() while the scan runs; workers
+    pick the change up at their next file or read. Clearing nice or
+    io_priority puts a worker back at the niceness and I/O class it had
+    before (raising priority again may need privileges, e.g. CAP_SYS_NICE).
+
+    Args:
+        bytes_per_second (int, optional): Read bandwidth limit.
+        files_per_second (float, optional): Limit on files opened per second.
+        latency_target_ms (float, optional): Back off while the smoothed read
+                                             latency exceeds this.
+        nice (int, optional): Niceness applied to the hashing threads (Unix).
+        io_priority (str, optional): I/O scheduling class for the hashing
+                                     threads, one of IO_PRIORITY_CLASSES (Linux).
+        io_priority_level (int): Level within the class, 0 (highest) to 7.
+    """
+    SETTINGS = ("bytes_per_second", "files_per_second", "latency_target_ms", "nice", "io_priority", "io_priority_level")
+
+    def __init__(
+        self,
+        bytes_per_second: Optional[int] = None,
+        files_per_second: Optional[float] = None,
+        latency_target_ms: Optional[float] = None,
+        nice: Optional[int] = None,
+        io_priority: Optional[str] = None,
+        io_priority_level: int = 4,
+    ):
+        self._lock = threading.Lock()
+        self._bytes = TokenBucket()
+        self._files = TokenBucket()
+        self._thread_state = threading.local()
+        self._priority_version = 0
+        self.bytes_per_second = self.files_per_second = self.latency_target_ms = None
+        self.nice = self.io_priority = None
+        self.io_priority_level = 4
+        self.latency_ewma = 0.0 # Seconds
+        self.backoff = 0.0 # Seconds
+        self.update(
+            bytes_per_second=bytes_per_second, files_per_second=files_per_second,
+            latency_target_ms=latency_target_ms, nice=nice,
+            io_priority=io_priority, io_priority_level=io_priority_level,
+        )
+
+    def update(self, **settings):
+        """
+        Changes some of the settings, leaving the others as they are.
+
+        Args:
+            **settings: Any of SETTINGS; None removes a limit.
+
+        Raises:
+            ValueError: For an unknown setting or I/O priority class.
+        """
+        unknown = set(settings) - set(self.SETTINGS)
+        if unknown:
+            raise ValueError(f"Unknown throttle settings: {', '.join(sorted(unknown))}.")
+        if settings.get("io_priority") not in (None, *IO_PRIORITY_CLASSES):
+            raise ValueError(f"Unknown I/O priority class {settings['io_priority']!r}.")
+        if "io_priority_level" in settings and settings["io_priority_level"] is None:
+            settings["io_priority_level"] = 4 # The kernel's default best-effort level
+        with self._lock:
+            for name, value in settings.items():
+                setattr(self, name, value)
+            if "bytes_per_second" in settings:
+                self._bytes.set_rate(self.bytes_per_second)
+            if "files_per_second" in settings:
+                # Reason: A burst of one file keeps a files/s limit smooth.
+                self._files.set_rate(self.files_per_second, 1.0 if self.files_per_second else None)
+            if "latency_target_ms" in settings and self.latency_target_ms is None:
+                self.backoff = 0.0
+            if {"nice", "io_priority", "io_priority_level"} & set(settings):
+                self._priority_version += 1
+
+    def settings(self) -> Dict[str, object]:
+        """Returns the current settings and the adaptive backoff state."""
+        with self._lock:
+            state = {name: getattr(self, name) for name in self.SETTINGS}
+        state["read_latency_ms"] = round(self.latency_ewma * 1000, 3)
+        state["backoff_ms"] = round(self.backoff * 1000, 3)
+        return state
+
+    def _apply_priority(self):
+        """Applies nice/ioprio to the calling worker thread if they changed since it last did."""
+        version = self._priority_version
+        state = self._thread_state
+        if getattr(state, "version", 0) == version:
+            return
+        state.version = version
+        thread_id = threading.get_native_id()
+        # Reason: Once a thread's niceness was changed, clearing the setting must undo it.
+        if hasattr(os, "setpriority") and (self.nice is not None or hasattr(state, "default_nice")):
+            if not hasattr(state, "default_nice"):
+                state.default_nice = os.getpriority(os.PRIO_PROCESS, thread_id)
+            nice = state.default_nice if self.nice is None else self.nice
+            try:
+                # Reason: On Linux a thread id targets just that thread, not the whole process.
+                os.setpriority(os.PRIO_PROCESS, thread_id, nice)
+            except OSError as e:
+                print(f"Warning: Could not set scan worker niceness to {nice}: {e}")
+        if self.io_priority is not None or getattr(state, "io_priority_set", False):
+            state.io_priority_set = True
+            _set_io_priority(self.io_priority, self.io_priority_level)
+
+    def before_file(self):
+        """Called by a worker before it opens a file."""
+        self._apply_priority()
+        self._files.acquire(1)
+
+    def _after_read(self, size: int, latency: float):
+        self._bytes.acquire(size)
+        target = self.latency_target_ms
+        if target is None:
+            return
+        # Reason: Racy updates from several workers only blur the average slightly.
+        self.latency_ewma += LATENCY_SMOOTHING * (latency - self.latency_ewma)
+        if self.latency_ewma > target / 1000:
+            self.backoff = min(MAX_BACKOFF, max(self.backoff * 2, MIN_BACKOFF))
+        elif self.backoff:
+            self.backoff = self.backoff / 2 if self.backoff > MIN_BACKOFF else 0.0
+        if self.backoff:
+            time.sleep(self.backoff)
+
+    def throttled(self, blocks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Passes blocks through, timing each read and applying the limits.
+
+        Args:
+            blocks (Iterable[bytes]): A block stream such as read_blocks(); the
+                                      time to produce each block is its read latency.
+                                      ZeroBlocks (holes of sparse files) are not reads
+                                      and pass through unthrottled.
+
+        Yields:
+            bytes: The same blocks.
+        """
+        iterator = iter(blocks)
+        while True:
+            start = time.monotonic()
+            data = next(iterator, None)
+            if data is None:
+                return
+            if isinstance(data, ZeroBlock):
+                yield data
+                continue
+            self._after_read(len(data), time.monotonic() - start)
+            yield data
+
+
+# Throttles of running scans, keyed by job id, so limits can be changed mid-scan.
+_active_throttles: Dict[int, ScanThrottle] = {}
+_registry_lock = threading.Lock()
+
+
+def register_throttle(job_id: int, throttle: ScanThrottle):
+    """Makes a running job's throttle adjustable through get_throttle."""
+    with _registry_lock:
+        _active_throttles[job_id] = throttle
+
+
+def unregister_throttle(job_id: int):
+    """Forgets a job's throttle once the job stops running."""
+    with _registry_lock:
+        _active_throttles.pop(job_id, None)
+
+
+def get_throttle(job_id: int) -> Optional[ScanThrottle]:
+    """Returns the throttle of a running job, or None if the job is not running."""
+    with _registry_lock:
+        return _active_throttles.get(job_id)
@@ -1,13 +1,15 @@
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-import os
 from pathlib import Path # Import Path
+from typing import Optional
 
 # Import the router from api.routes
 from app.api import routes as api_routes
-from app.core.db import create_db_engine, create_db_and_tables, get_db_session
+from app.core.cache import ResponseCache
+from app.core.db import Database, DatabaseSettings, get_db_session, get_read_session
+from app.core.lookup import DigestFilter
 
 # Determine the base directory of the 'app' package
 APP_DIR = Path(__file__).resolve().parent
@@ -15,27 +17,48 @@ APP_DIR = Path(__file__).resolve().parent
 STATIC_DIR = APP_DIR / "static"
 # Templates directory is relative to the app directory
 TEMPLATES_DIR = APP_DIR / "templates" # Define templates directory
-# DB file can be relative to the project root (one level up from app)
-DB_FILE = APP_DIR.parent / "files.db"
 
-# Create engine and tables globally (or manage through lifespan events)
-# Ensure the directory for the DB file exists if it's not in the root
-DB_FILE.parent.mkdir(parents=True, exist_ok=True)
-engine = create_db_engine(str(DB_FILE))
-create_db_and_tables(engine)
 
-def get_app(db_session_override = None) -> FastAPI:
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Disposes of the app's database engines on shutdown (they are created on first use)."""
+    try:
+        yield
+    finally:
+        app.state.database.dispose()
+
+
+def get_app(
+    db_session_override = None,
+    db_file: Optional[str] = None,
+    database: Optional[Database] = None,
+) -> FastAPI:
     """
     Creates and configures the FastAPI application instance.
 
+    No database is opened here: engines are created on the first request that
+    needs one, configured from DatabaseSettings (``DUPFINDER_*`` environment
+    variables), and disposed when the app shuts down.
+
     Args:
         db_session_override (Session, optional): A session to override the default
                                                  dependency, used for testing. Defaults to None.
+        db_file (str, optional): Serve this database file instead of the configured
+                                 one; its tables are created if missing. Defaults to None.
+        database (Database, optional): Use this Database, e.g. one wrapping engines
+                                       created by a test. Defaults to None.
 
     Returns:
         FastAPI: The configured FastAPI application instance.
     """
-    app = FastAPI(title="Duplicate File Finder")
+    app = FastAPI(title="Duplicate File Finder", lifespan=lifespan)
+    if database is None:
+        settings = DatabaseSettings.from_env()
+        database = Database(settings._replace(db_file=db_file) if db_file else settings)
+    app.state.database = database
+    # Per-app so apps serving different databases never share cached bodies.
+    app.state.response_cache = ResponseCache()
+    app.state.digest_filter = DigestFilter()
 
     # --- Dependency Override for Testing ---
     if db_session_override:
@@ -47,23 +70,7 @@ def get_app(db_session_override = None) -> FastAPI:
                 # Test fixture should handle session closing/rollback
                 pass
         app.dependency_overrides[get_db_session] = override_get_db
-    else:
-        # Use the actual dependency generator for the real app
-        def actual_get_db():
-            session_gen = get_db_session(engine) # Use global engine
-            try:
-                session = next(session_gen)
-                yield session
-            finally:
-                try:
-                    next(session_gen) # Ensure generator cleanup runs
-                except StopIteration:
-                    pass # Normal finish
-                except Exception as e:
-                    print(f"Error closing session from generator: {e}")
-
-        app.dependency_overrides[get_db_session] = actual_get_db
-
+        app.dependency_overrides[get_read_session] = override_get_db
 
     # --- Include API Routes ---
     app.include_router(api_routes.router)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer
+from app.models.file_entry import Base
+
+
+class ChangeCounter(Base):
+    __tablename__ = "change_counter"
+
+    # Reason: A single row (id 1), bumped in the same transaction as every write.
+    id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0, doc="Incremented by every INSERT, UPDATE or DELETE")
+
+    def __repr__(self):
+        return f"<ChangeCounter(generation={self.generation})>"
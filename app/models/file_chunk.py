@@ -0,0 +1,15 @@
+from sqlalchemy import Column, ForeignKey, Integer, LargeBinary
+from app.models.file_entry import Base
+
+
+class FileChunk(Base):
+    __tablename__ = "file_chunks"
+
+    # Reason: Composite key keeps the side table compact (no surrogate id column).
+    file_id = Column(Integer, ForeignKey("files.id", ondelete="CASCADE"), primary_key=True, doc="Owning file entry")
+    seq = Column(Integer, primary_key=True, doc="Position of the chunk within the file")
+    digest = Column(LargeBinary(16), index=True, nullable=False, doc="Truncated BLAKE2b digest of the chunk")
+    length = Column(Integer, nullable=False, doc="Size of the chunk in bytes")
+
+    def __repr__(self):
+        return f"<FileChunk(file_id={self.file_id}, seq={self.seq}, length={self.length})>"
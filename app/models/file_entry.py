@@ -1,17 +1,26 @@
 # /home/echeadle/15_DupFiles/find-dup-files/app/models/file_entry.py
 from sqlalchemy.orm import declarative_base  # Updated import for SQLAlchemy 2.0+
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Integer, String, Float, Index
 
 Base = declarative_base()
 
 class FileEntry(Base):
     __tablename__ = "files"  # Explicitly set table name
+    __table_args__ = (
+        # Reason: Content-identity lookups for moved/renamed files (see scanner._match_moved_files).
+        Index("ix_files_inode_dev", "inode", "dev"),
+        # Reason: Covers the GROUP BY hash aggregates of duplicate ranking and stats.
+        Index("ix_files_hash_size", "hash", "size"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     path = Column(String, unique=True, index=True, nullable=False, doc="Absolute path to the file")
     hash = Column(String, index=True, nullable=False, doc="SHA-256 hash of the file content")
     size = Column(Integer, nullable=False, doc="Size of the file in bytes")
     mtime = Column(Float, nullable=False, doc="Last modification time (timestamp)")
+    dev = Column(Integer, nullable=True, doc="Device id (st_dev) when last scanned")
+    inode = Column(Integer, nullable=True, doc="Inode number (st_ino) when last scanned")
+    mtime_ns = Column(Integer, nullable=True, doc="Last modification time in nanoseconds")
 
     def __repr__(self):
         # Reason: Provide a helpful string representation for debugging.
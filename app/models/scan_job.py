@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Float, ForeignKey, Integer, String, UniqueConstraint
+from app.models.file_entry import Base
+
+
+class ScanJob(Base):
+    __tablename__ = "scan_jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    root = Column(String, nullable=False, doc="Absolute path of the scanned directory")
+    status = Column(String, nullable=False, default="running", doc="'running' or 'completed'")
+    chunk_threshold = Column(Integer, nullable=True, doc="Chunk-indexing threshold the scan was started with")
+    cache_policy = Column(String, nullable=True, doc="Page-cache policy for reads (None means 'default')")
+    archive_max_bytes = Column(Integer, nullable=True, doc="Per-archive byte limit when indexing archive members")
+    archive_max_members = Column(
+        Integer, nullable=True, doc="Per-archive member limit; None means archive members are not indexed"
+    )
+    files_seen = Column(Integer, nullable=False, default=0, doc="Files examined as of the last checkpoint")
+    files_hashed = Column(Integer, nullable=False, default=0, doc="Files (re)hashed as of the last checkpoint")
+    started_at = Column(Float, nullable=False, doc="Start time (timestamp)")
+    updated_at = Column(Float, nullable=False, doc="Time of the last checkpoint (timestamp)")
+
+    def __repr__(self):
+        return f"<ScanJob(id={self.id}, root='{self.root}', status='{self.status}')>"
+
+
+class ScanFrontier(Base):
+    __tablename__ = "scan_frontier"
+    # Reason: Re-listing a directory after a resume must not queue its children twice.
+    __table_args__ = (UniqueConstraint("job_id", "path"),)
+
+    # Reason: Autoincrementing id doubles as stack order (newest first = depth-first).
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(Integer, ForeignKey("scan_jobs.id", ondelete="CASCADE"), index=True, nullable=False)
+    path = Column(String, nullable=False, doc="Absolute path of a directory still to be scanned")
+
+    def __repr__(self):
+        return f"<ScanFrontier(job_id={self.job_id}, path='{self.path}')>"
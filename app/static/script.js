@@ -15,61 +15,215 @@ document.addEventListener('DOMContentLoaded', () => {
         return; // Stop script execution if elements are missing
     }
 
+    // --- Virtualized duplicate list ---
+    // Groups are fetched from /api/duplicates/groups a page at a time, ranked on
+    // the server, and flattened into fixed-height rows (one header row per group,
+    // then its paths). Only the rows inside the viewport are in the DOM, so
+    // rendering cost depends on the window size, not on the number of duplicates.
+    const PAGE_SIZE = 200;      // Groups per request
+    const MAX_PATHS = 50;       // Paths listed per group (the rest are summarized)
+    const ROW_HEIGHT = 24;      // Pixels; must match .virtual-row in style.css
+    const OVERSCAN_ROWS = 10;   // Extra rows rendered above and below the viewport
+    const PREFETCH_ROWS = 100;  // Load the next page this many rows before the end
+
+    const sortOrderSelect = document.getElementById('sortOrder');
+    const view = {
+        generation: 0,   // Bumped on every reload so stale responses are dropped
+        order: 'wasted',
+        groups: [],
+        rowStarts: [],   // Index of each loaded group's header row
+        totalRows: 0,
+        totalGroups: 0,
+        loading: false,
+        viewport: null,
+        spacer: null,
+        rows: null,
+        renderQueued: false,
+    };
+
+    function formatBytes(bytes) {
+        const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+        let value = bytes;
+        let unit = 0;
+        while (value >= 1024 && unit < units.length - 1) {
+            value /= 1024;
+            unit++;
+        }
+        return `${unit === 0 ? value : value.toFixed(1)} ${units[unit]}`;
+    }
+
+    async function fetchJson(url) {
+        const response = await fetch(url);
+        if (!response.ok) {
+            // Try to get error details from the response body if available
+            let errorMsg = `HTTP error! status: ${response.status}`;
+            try {
+                const errorData = await response.json();
+                errorMsg = errorData.detail || errorMsg;
+            } catch (e) {
+                // Ignore if response body is not JSON or empty
+            }
+            throw new Error(errorMsg);
+        }
+        return response.json();
+    }
+
+    function groupRowCount(group) {
+        return 1 + group.paths.length + (group.count > group.paths.length ? 1 : 0);
+    }
+
+    // Finds the group containing a row by binary search over the row starts.
+    function groupIndexForRow(row) {
+        let low = 0;
+        let high = view.rowStarts.length - 1;
+        while (low < high) {
+            const mid = (low + high + 1) >> 1;
+            if (view.rowStarts[mid] <= row) {
+                low = mid;
+            } else {
+                high = mid - 1;
+            }
+        }
+        return low;
+    }
+
+    function createRow(group, offsetInGroup) {
+        const rowDiv = document.createElement('div');
+        if (offsetInGroup === 0) {
+            rowDiv.className = 'virtual-row dup-group-header';
+            rowDiv.innerHTML = `<code>${group.hash.substring(0, 12)}...</code> `;
+            rowDiv.appendChild(document.createTextNode(
+                `${group.count} copies × ${formatBytes(group.size)}, ${formatBytes(group.wasted)} wasted`
+            ));
+        } else if (offsetInGroup <= group.paths.length) {
+            const filePath = group.paths[offsetInGroup - 1];
+            rowDiv.className = 'virtual-row dup-path';
+            rowDiv.textContent = filePath;
+            rowDiv.title = filePath; // Full path on hover; long paths are cut with an ellipsis
+        } else {
+            rowDiv.className = 'virtual-row dup-more';
+            rowDiv.textContent = `... and ${group.count - group.paths.length} more`;
+        }
+        return rowDiv;
+    }
+
+    function renderVisibleRows() {
+        view.renderQueued = false;
+        if (!view.viewport) {
+            return;
+        }
+        view.spacer.style.height = `${view.totalRows * ROW_HEIGHT}px`;
+        const first = Math.max(0, Math.floor(view.viewport.scrollTop / ROW_HEIGHT) - OVERSCAN_ROWS);
+        const visible = Math.ceil(view.viewport.clientHeight / ROW_HEIGHT) + 2 * OVERSCAN_ROWS;
+        const last = Math.min(view.totalRows, first + visible);
+
+        const fragment = document.createDocumentFragment();
+        if (first < last) {
+            let groupIndex = groupIndexForRow(first);
+            for (let row = first; row < last; row++) {
+                if (groupIndex + 1 < view.rowStarts.length && view.rowStarts[groupIndex + 1] <= row) {
+                    groupIndex++;
+                }
+                fragment.appendChild(createRow(view.groups[groupIndex], row - view.rowStarts[groupIndex]));
+            }
+        }
+        view.rows.style.transform = `translateY(${first * ROW_HEIGHT}px)`;
+        view.rows.replaceChildren(fragment);
+
+        if (last + PREFETCH_ROWS >= view.totalRows && view.groups.length < view.totalGroups) {
+            loadNextPage();
+        }
+    }
+
+    function scheduleRender() {
+        // Reason: Coalesce scroll events into at most one render per frame.
+        if (!view.renderQueued) {
+            view.renderQueued = true;
+            requestAnimationFrame(renderVisibleRows);
+        }
+    }
+
+    async function loadNextPage() {
+        if (view.loading) {
+            return;
+        }
+        view.loading = true;
+        const generation = view.generation;
+        try {
+            const params = new URLSearchParams({
+                offset: view.groups.length,
+                limit: PAGE_SIZE,
+                order_by: view.order,
+                max_paths: MAX_PATHS,
+            });
+            const page = await fetchJson(`/api/duplicates/groups?${params}`);
+            if (generation !== view.generation) {
+                return; // The list was reloaded while this page was in flight
+            }
+            view.totalGroups = page.total;
+            page.groups.forEach(group => {
+                view.rowStarts.push(view.totalRows);
+                view.groups.push(group);
+                view.totalRows += groupRowCount(group);
+            });
+            scheduleRender();
+        } catch (error) {
+            console.error('Error fetching duplicate groups:', error);
+            statusMessageDiv.textContent = `Status: Error fetching duplicates - ${error.message}`;
+            statusMessageDiv.style.color = 'red';
+        } finally {
+            if (generation === view.generation) {
+                view.loading = false;
+            }
+        }
+    }
+
     // Function to fetch and display duplicates
     async function fetchDuplicates() {
         statusMessageDiv.textContent = 'Status: Fetching duplicates...';
         statusMessageDiv.style.color = '#333'; // Reset color
         resultsContainer.innerHTML = '<h2>Scan Results</h2><p>Loading...</p>'; // Clear previous results
 
+        view.generation++;
+        const generation = view.generation;
+        Object.assign(view, {
+            order: sortOrderSelect ? sortOrderSelect.value : 'wasted',
+            groups: [], rowStarts: [], totalRows: 0, totalGroups: 0, loading: false, viewport: null,
+        });
+
         try {
-            // *** Use /api/ prefix ***
-            const response = await fetch('/api/duplicates');
-            if (!response.ok) {
-                // Try to get error details from the response body if available
-                let errorMsg = `HTTP error! status: ${response.status}`;
-                try {
-                    const errorData = await response.json();
-                    errorMsg = errorData.detail || errorMsg;
-                } catch (e) {
-                    // Ignore if response body is not JSON or empty
-                }
-                throw new Error(errorMsg);
+            const stats = await fetchJson('/api/stats');
+            if (generation !== view.generation) {
+                return;
             }
-            const duplicatesData = await response.json();
 
             resultsContainer.innerHTML = '<h2>Scan Results</h2>'; // Clear loading message
 
-            let duplicateGroupsFound = 0;
-            if (Object.keys(duplicatesData).length > 0) {
-                for (const hash in duplicatesData) {
-                    const files = duplicatesData[hash];
-                    if (files.length > 1) { // Only show groups with actual duplicates
-                        duplicateGroupsFound++;
-                        const groupDiv = document.createElement('div');
-                        groupDiv.className = 'dup-group';
-
-                        const title = document.createElement('h4');
-                        // Show partial hash for readability
-                        title.innerHTML = `Duplicate Group (Hash: <code>${hash.substring(0, 12)}...</code>)`;
-                        groupDiv.appendChild(title);
-
-                        const fileList = document.createElement('ul');
-                        files.forEach(filePath => {
-                            const listItem = document.createElement('li');
-                            listItem.textContent = filePath;
-                            fileList.appendChild(listItem);
-                        });
-                        groupDiv.appendChild(fileList);
-                        resultsContainer.appendChild(groupDiv);
-                    }
-                }
-            }
-
-            // Display message if no duplicate groups were rendered
-            if (duplicateGroupsFound === 0) {
+            // Display message if there are no duplicate groups
+            if (stats.duplicate_groups === 0) {
                 resultsContainer.innerHTML += '<p>No duplicate files found in the database.</p>';
+                statusMessageDiv.textContent = 'Status: Duplicates loaded successfully.';
+                return;
             }
 
+            const summary = document.createElement('p');
+            summary.className = 'dup-summary';
+            summary.textContent = `${stats.duplicate_groups} duplicate groups, ${stats.duplicate_files} files, `
+                + `${formatBytes(stats.reclaimable_bytes)} reclaimable.`;
+            resultsContainer.appendChild(summary);
+
+            view.viewport = document.createElement('div');
+            view.viewport.className = 'virtual-viewport';
+            view.spacer = document.createElement('div');
+            view.spacer.className = 'virtual-spacer';
+            view.rows = document.createElement('div');
+            view.rows.className = 'virtual-rows';
+            view.spacer.appendChild(view.rows);
+            view.viewport.appendChild(view.spacer);
+            view.viewport.addEventListener('scroll', scheduleRender, { passive: true });
+            resultsContainer.appendChild(view.viewport);
+
+            await loadNextPage();
             statusMessageDiv.textContent = 'Status: Duplicates loaded successfully.';
 
         } catch (error) {
@@ -80,6 +234,12 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // Re-rank on the server when the sort order changes
+    if (sortOrderSelect) {
+        sortOrderSelect.addEventListener('change', fetchDuplicates);
+    }
+    window.addEventListener('resize', scheduleRender);
+
     // Event listener for the scan button
     scanBtn.addEventListener('click', async () => {
         const directoryPath = scanDirInput.value.trim();
@@ -0,0 +1,68 @@
+"""
+Benchmark: cost of importing the app and of per-request session setup.
+
+Times ``import app.main`` in fresh interpreters (only the app's own module,
+after its dependencies are imported) and the round trip of a cheap endpoint
+that opens a database session, through the in-process TestClient.
+
+Usage:
+    python -m benchmarks.bench_app_startup [--imports 5] [--requests 2000]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+_IMPORT_SCRIPT = (
+    "import time, fastapi, sqlalchemy, app.api.routes, app.core.db\n"
+    "start = time.perf_counter()\n"
+    "import app.main\n"
+    "print(time.perf_counter() - start)\n"
+)
+
+
+def time_import(runs: int, db_file: str) -> float:
+    """Returns the median seconds spent importing app.main itself."""
+    env = {**os.environ, "DUPFINDER_DB_FILE": db_file}
+    root = Path(__file__).resolve().parent.parent
+    samples = [
+        float(subprocess.run(
+            [sys.executable, "-c", _IMPORT_SCRIPT], check=True, capture_output=True, text=True, env=env, cwd=root,
+        ).stdout)
+        for _ in range(runs)
+    ]
+    return statistics.median(samples)
+
+
+def time_requests(count: int, db_file: str) -> float:
+    """Returns the mean seconds per GET /api/scan/jobs request."""
+    from app.main import get_app
+    with TestClient(get_app(db_file=db_file)) as client:
+        for _ in range(min(count, 200)): # Warm up the pools
+            client.get("/api/scan/jobs")
+        start = time.perf_counter()
+        for _ in range(count):
+            client.get("/api/scan/jobs")
+        return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--imports", type=int, default=5, help="Fresh interpreters to time the import in (default: 5)")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests to time (default: 2000)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = str(Path(tmp) / "bench.db")
+        print(f"{'import app.main':<20}{time_import(args.imports, db_file) * 1000:10.1f} ms")
+        print(f"{'GET /api/scan/jobs':<20}{time_requests(args.requests, db_file) * 1e6:10.0f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: batch content lookups with and without the digest Bloom filter.
+
+Fills a database with synthetic rows, then looks up batches of digests of
+which only a fraction are indexed (as when an ingestion pipeline checks
+mostly new files), reporting lookups per second for each path.
+
+Usage:
+    python -m benchmarks.bench_lookup [--rows 1000000] [--batch 5000] [--hit-ratio 0.05]
+"""
+import argparse
+import hashlib
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.db import create_db_engine, create_db_and_tables
+from app.core.lookup import DigestFilter, lookup_digests
+from app.models.file_entry import FileEntry
+
+
+def _digest(i: int) -> str:
+    return hashlib.sha256(i.to_bytes(8, "little")).hexdigest()
+
+
+def populate(session: Session, rows: int, batch_size: int = 50_000):
+    """Inserts rows whose digests are _digest(0) .. _digest(rows - 1)."""
+    for start in range(0, rows, batch_size):
+        session.execute(insert(FileEntry), [
+            {"path": f"/data/{i:09d}.bin", "hash": _digest(i), "size": i % 65536, "mtime": 0.0}
+            for i in range(start, min(start + batch_size, rows))
+        ])
+    session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Indexed files (default: 1000000)")
+    parser.add_argument("--batch", type=int, default=5000, help="Digests per lookup request (default: 5000)")
+    parser.add_argument("--batches", type=int, default=20, help="Lookup requests per run (default: 20)")
+    parser.add_argument("--hit-ratio", type=float, default=0.05, help="Fraction of indexed digests (default: 0.05)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(str(Path(tmp) / "lookup.db"))
+        create_db_and_tables(engine)
+        with Session(engine) as session:
+            populate(session, args.rows)
+            batches = [
+                [
+                    (_digest(rng.randrange(args.rows) if rng.random() < args.hit_ratio else args.rows + rng.randrange(10 ** 9)), None)
+                    for _ in range(args.batch)
+                ]
+                for _ in range(args.batches)
+            ]
+
+            digest_filter = DigestFilter()
+            start = time.perf_counter()
+            bloom = digest_filter.build(session)
+            build = time.perf_counter() - start
+            print(f"{args.rows} rows; filter built in {build:.2f} s ({len(bloom.bits) / 1e6:.1f} MB, {bloom.num_hashes} hashes)")
+
+            for name, active_filter in (("sqlite only", None), ("bloom filter", digest_filter)):
+                checked = filtered = matched = 0
+                start = time.perf_counter()
+                for queries in batches:
+                    result = lookup_digests(session, queries, active_filter)
+                    checked += result["checked"]
+                    filtered += result["filtered"]
+                    matched += len(result["matches"])
+                elapsed = time.perf_counter() - start
+                print(f"{name:<13} {checked / elapsed:12,.0f} lookups/s   "
+                      f"{matched} matched   {filtered} answered by the filter")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: /api/files and /api/duplicates serialization paths.
+
+Compares the previous path (ORM rows validated through the Pydantic FileEntry
+model, duplicates through Dict[str, List[str]] validation) with the fast path
+in app.core.serialization (Core row tuples straight to orjson/json, plus
+optional gzip).
+
+Usage:
+    python -m benchmarks.bench_serialization [--rows 1000000]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from pydantic import TypeAdapter
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.api.routes import FileEntry as FileEntrySchema, _load_all_files, _load_duplicates
+from app.core import serialization
+from app.core.db import create_db_engine, create_db_and_tables
+from app.models.file_entry import FileEntry
+
+
+def populate(session: Session, rows: int, batch_size: int = 50_000):
+    """Inserts synthetic rows where every hash is shared by two files."""
+    for start in range(0, rows, batch_size):
+        session.execute(insert(FileEntry), [
+            {"path": f"/data/dir{i % 1000}/file{i}.bin", "hash": f"{i // 2:064x}", "size": i, "mtime": 1.7e9 + i}
+            for i in range(start, min(start + batch_size, rows))
+        ])
+    session.commit()
+
+
+def timed(label: str, func):
+    """Runs func once and prints its wall time and output size."""
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:8.3f} s {len(result) / 1e6:10.1f} MB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of file rows (default: 1,000,000)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(str(Path(tmp) / "bench.db"))
+        create_db_and_tables(engine)
+        with Session(engine) as session:
+            populate(session, args.rows)
+            print(f"rows={args.rows} orjson={'yes' if serialization.orjson else 'no'}")
+
+            files_adapter = TypeAdapter(List[FileEntrySchema])
+            duplicates_adapter = TypeAdapter(Dict[str, List[str]])
+
+            def files_model_path():
+                entries = session.execute(select(FileEntry)).scalars().all()
+                body = files_adapter.dump_json([FileEntrySchema.model_validate(e) for e in entries])
+                session.expunge_all()
+                return body
+
+            def duplicates_model_path():
+                groups = {}
+                duplicate_hashes = select(FileEntry.hash).group_by(FileEntry.hash).having(func.count(FileEntry.id) > 1)
+                for entry in session.execute(select(FileEntry).where(FileEntry.hash.in_(duplicate_hashes))).scalars():
+                    groups.setdefault(entry.hash, []).append(entry.path)
+                body = duplicates_adapter.dump_json(duplicates_adapter.validate_python(groups))
+                session.expunge_all()
+                return body
+
+            timed("files: ORM + Pydantic validation", files_model_path)
+            body = timed("files: Core rows + fast encoder", lambda: _load_all_files(session))
+            timed("files: fast encoder + gzip", lambda: serialization.maybe_gzip(body, True)[0])
+            timed("duplicates: ORM + Pydantic validation", duplicates_model_path)
+            body = timed("duplicates: Core rows + fast encoder", lambda: _load_duplicates(session))
+            timed("duplicates: fast encoder + gzip", lambda: serialization.maybe_gzip(body, True)[0])
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
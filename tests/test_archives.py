@@ -0,0 +1,199 @@
+import hashlib
+import io
+import os
+import tarfile
+import tracemalloc
+import zipfile
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.core import scanner
+from app.core.archives import ArchiveLimits, hash_archive_members, is_archive, member_path
+from app.core.exclusions import ExclusionRules
+from app.core.scanner import find_duplicates, scan_directory
+from app.models.file_entry import Base, FileEntry
+
+
+@pytest.fixture(name="session")
+def archive_session_fixture():
+    """Provides a session on a fresh in-memory database."""
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def _write_zip(path: Path, members: dict):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+
+def _write_tar(path: Path, members: dict, mode: str = "w:gz"):
+    with tarfile.open(path, mode) as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+def _indexed(session: Session) -> dict:
+    return dict(session.execute(select(FileEntry.path, FileEntry.hash)).all())
+
+
+@pytest.mark.parametrize("suffix, mode", [(".tar", "w"), (".tar.gz", "w:gz"), (".tar.xz", "w:xz"), (".zip", None)])
+def test_members_hash_like_loose_files(tmp_path: Path, suffix: str, mode: str):
+    """Test that every archive format yields members with the digests of the same content on disk."""
+    members = {"docs/report.txt": b"report" * 1000, "./top.bin": os.urandom(200000), "empty": b""}
+    archive = tmp_path / f"bundle{suffix}"
+    if mode is None:
+        _write_zip(archive, members)
+    else:
+        _write_tar(archive, members, mode)
+
+    assert is_archive(archive)
+    found = {m.path: (m.hash, m.size) for m in hash_archive_members(archive)}
+    assert found == {
+        member_path(archive, name): (hashlib.sha256(data).hexdigest(), len(data)) for name, data in members.items()
+    }
+    assert member_path(archive, "./top.bin") == f"{archive}!/top.bin"
+
+
+def test_archive_limits_stop_reading(tmp_path: Path):
+    """Test that member-count and decompressed-byte limits stop reading an archive."""
+    archive = tmp_path / "many.zip"
+    _write_zip(archive, {f"f{i}": bytes([i]) * 10 for i in range(10)})
+    assert len(list(hash_archive_members(archive, ArchiveLimits(max_members=4)))) == 4
+
+    # Reason: 64 MB of zeros compresses to almost nothing, like a decompression bomb.
+    bomb = tmp_path / "bomb.tar.gz"
+    _write_tar(bomb, {"small": b"x" * 100, "zeros": bytes(64 * 1024 * 1024), "after": b"y"})
+    members = list(hash_archive_members(bomb, ArchiveLimits(max_bytes=1024 * 1024)))
+    assert [Path(m.path).name for m in members] == ["small"]
+
+
+def test_corrupt_archive_is_skipped(tmp_path: Path):
+    """Test that a truncated or bogus archive gives a warning instead of an error."""
+    (tmp_path / "bogus.zip").write_bytes(b"not a zip")
+    archive = tmp_path / "cut.tar.gz"
+    _write_tar(archive, {"a": os.urandom(100000)})
+    archive.write_bytes(archive.read_bytes()[:5000])
+    assert list(hash_archive_members(tmp_path / "bogus.zip")) == []
+    assert list(hash_archive_members(archive)) == []
+
+
+def test_member_memory_stays_bounded(tmp_path: Path):
+    """Test that hashing a large member streams it instead of loading it."""
+    archive = tmp_path / "large.tar.gz"
+    with tarfile.open(archive, "w:gz") as tar:
+        info = tarfile.TarInfo("large.bin")
+        info.size = 128 * 1024 * 1024
+        tar.addfile(info, io.BytesIO(bytes(info.size)))
+
+    tracemalloc.start()
+    try:
+        members = list(hash_archive_members(archive))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert members[0].size == 128 * 1024 * 1024
+    assert peak < 8 * 1024 * 1024
+
+
+def test_scan_indexes_archive_members(session: Session, tmp_path: Path, monkeypatch):
+    """Test that archive members take part in duplicate detection and are only re-read when the archive changes."""
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "loose.txt").write_bytes(b"shared content")
+    _write_zip(root / "backup.zip", {"copy/loose.txt": b"shared content", "other": b"only in the zip"})
+    expanded = []
+    real_hash_archive_members = scanner.hash_archive_members
+    monkeypatch.setattr(
+        scanner, "hash_archive_members",
+        lambda path, *args: expanded.append(path) or real_hash_archive_members(path, *args),
+    )
+
+    scan_directory(root, session, exclusions=ExclusionRules())
+    assert f"{root}/backup.zip!/other" not in _indexed(session)
+    assert expanded == []
+
+    scan_directory(root, session, exclusions=ExclusionRules(), archive_limits=ArchiveLimits())
+    assert sorted(find_duplicates(session).popitem()[1]) == [f"{root}/backup.zip!/copy/loose.txt", f"{root}/loose.txt"]
+    scan_directory(root, session, exclusions=ExclusionRules(), archive_limits=ArchiveLimits())
+    assert expanded == [str(root / "backup.zip")]
+
+    _write_zip(root / "backup.zip", {"renamed": b"only in the zip"})
+    os.utime(root / "backup.zip", (1, 1))
+    job = scan_directory(root, session, exclusions=ExclusionRules(), archive_limits=ArchiveLimits(max_members=7))
+    assert job.archive_max_members == 7
+    members = sorted(path for path in _indexed(session) if "!/" in path)
+    assert members == [f"{root}/backup.zip!/renamed"]
+
+
+def test_unsupported_member_compression_is_skipped(tmp_path: Path, capsys):
+    """Test that a member with an unsupported compression method is skipped and the rest are still read."""
+    archive = tmp_path / "deflate64.zip"
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zf:
+        zf.writestr("odd.bin", b"odd")
+        zf.writestr("plain.txt", b"plain")
+    data = bytearray(archive.read_bytes())
+    # Reason: Mark the first member as deflate64 (method 9) in its local and central headers.
+    data[8:10] = (9).to_bytes(2, "little")
+    central = data.find(b"PK\x01\x02")
+    data[central + 10:central + 12] = (9).to_bytes(2, "little")
+    archive.write_bytes(bytes(data))
+
+    assert [m.path for m in hash_archive_members(archive)] == [member_path(archive, "plain.txt")]
+    assert f"Skipping archive member {member_path(archive, 'odd.bin')}" in capsys.readouterr().out
+
+
+def test_archive_failure_only_skips_that_archive(session: Session, tmp_path: Path, monkeypatch):
+    """Test that an unexpected error while reading an archive leaves the rest of the scan intact."""
+    (tmp_path / "loose.txt").write_bytes(b"loose")
+    _write_zip(tmp_path / "broken.zip", {"a": b"a"})
+
+    def fail(*args):
+        raise MemoryError("out of memory")
+
+    monkeypatch.setattr(scanner, "hash_archive_members", fail)
+    job = scan_directory(tmp_path, session, exclusions=ExclusionRules(), archive_limits=ArchiveLimits())
+    assert job.status == "completed"
+    assert sorted(_indexed(session)) == [str(tmp_path / "broken.zip"), str(tmp_path / "loose.txt")]
+
+
+def test_renamed_archive_keeps_its_members(session: Session, tmp_path: Path, monkeypatch):
+    """Test that renaming an indexed archive moves its members instead of re-reading them."""
+    _write_zip(tmp_path / "old.zip", {"a.txt": b"member a", "b.txt": b"member b"})
+    expanded = []
+    real_hash_archive_members = scanner.hash_archive_members
+    monkeypatch.setattr(
+        scanner, "hash_archive_members",
+        lambda path, *args: expanded.append(path) or real_hash_archive_members(path, *args),
+    )
+    scan_directory(tmp_path, session, exclusions=ExclusionRules(), archive_limits=ArchiveLimits())
+    (tmp_path / "old.zip").rename(tmp_path / "new.zip")
+    scan_directory(tmp_path, session, exclusions=ExclusionRules(), archive_limits=ArchiveLimits())
+
+    assert expanded == [str(tmp_path / "old.zip")]
+    assert sorted(_indexed(session)) == [
+        str(tmp_path / "new.zip"), f"{tmp_path}/new.zip!/a.txt", f"{tmp_path}/new.zip!/b.txt",
+    ]
+    assert find_duplicates(session) == {}
+
+
+def test_repeated_member_names_keep_the_last(session: Session, tmp_path: Path):
+    """Test that a tar holding one name twice indexes that name once, with the later content."""
+    archive = tmp_path / "twice.tar"
+    with tarfile.open(archive, "w") as tar:
+        for data in (b"first", b"second"):
+            info = tarfile.TarInfo("same.txt")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    job = scan_directory(tmp_path, session, exclusions=ExclusionRules(), archive_limits=ArchiveLimits())
+    assert _indexed(session)[f"{archive}!/same.txt"] == hashlib.sha256(b"second").hexdigest()
+    assert job.files_hashed == 2
@@ -0,0 +1,228 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, event, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from app.core.cache import ResponseCache, etag_matches, make_etag
+from app.core.db import create_db_and_tables, create_db_engine, get_change_counter, track_changes
+from app.core.exclusions import ExclusionRules
+from app.core.scanner import scan_directory
+from app.main import get_app
+from app.models.file_entry import Base, FileEntry
+import pytest
+
+# --- Fixtures for cache tests ---
+
+@pytest.fixture(scope="function", name="engine")
+def cache_engine_fixture():
+    """Create an in-memory SQLite engine for each cache test function."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    track_changes(engine)
+    yield engine
+
+
+@pytest.fixture(scope="function", name="session")
+def cache_session_fixture(engine):
+    """Create a new session for each cache test, rolling back changes."""
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection)
+    yield session
+    session.close()
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.fixture(name="client")
+def cache_client_fixture(session: Session):
+    """Create a TestClient whose app uses the test session."""
+    client = TestClient(get_app(db_session_override=session))
+    yield client
+
+
+@pytest.fixture(name="statements")
+def statement_counter_fixture(engine):
+    """Collects every SQL statement executed on the test engine."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def _add_duplicates(session: Session, prefix: str = "/data"):
+    session.add_all([
+        FileEntry(path=f"{prefix}/a.txt", hash="h1", size=10, mtime=1.0),
+        FileEntry(path=f"{prefix}/b.txt", hash="h1", size=10, mtime=1.0),
+        FileEntry(path=f"{prefix}/c.txt", hash="h2", size=5, mtime=1.0),
+    ])
+    session.flush()
+
+# --- ResponseCache tests ---
+
+def test_cache_hit_and_generation_miss():
+    """
+    Test that an entry is returned only for the generation it was stored at.
+    """
+    cache = ResponseCache()
+    stored = cache.put("/api/duplicates?", 1, b"{}")
+    assert cache.get("/api/duplicates?", 1) == stored
+    assert cache.get("/api/duplicates?", 2) is None
+    # Reason: The stale entry is dropped on the miss.
+    assert len(cache) == 0
+
+
+def test_cache_evicts_least_recently_used_by_count():
+    """
+    Test that the entry limit evicts the least recently used key.
+    """
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", 1, b"1")
+    cache.put("b", 1, b"2")
+    cache.get("a", 1) # "b" is now least recently used
+    cache.put("c", 1, b"3")
+    assert cache.get("a", 1) is not None
+    assert cache.get("b", 1) is None
+    assert cache.get("c", 1) is not None
+
+
+def test_cache_evicts_by_total_bytes():
+    """
+    Test that the byte limit bounds the total size of cached bodies.
+    """
+    cache = ResponseCache(max_bytes=10)
+    cache.put("a", 1, b"x" * 6)
+    cache.put("b", 1, b"y" * 6)
+    assert cache.get("a", 1) is None
+    assert cache.total_bytes == 6
+    # Reason: A body larger than the whole budget is never stored.
+    cache.put("huge", 1, b"z" * 11)
+    assert cache.get("huge", 1) is None
+    assert cache.total_bytes == 6
+
+
+def test_etag_matches():
+    """
+    Test If-None-Match parsing, including lists, wildcards and weak tags.
+    """
+    etag = make_etag(b"body")
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches(f"W/{etag}", etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+# --- API tests ---
+
+def test_duplicates_returns_strong_etag(client: TestClient, session: Session):
+    """
+    Test that /api/duplicates carries a strong ETag and the usual body.
+    """
+    _add_duplicates(session)
+    response = client.get("/api/duplicates")
+    assert response.status_code == 200
+    assert response.headers["etag"] == make_etag(response.content)
+    assert not response.headers["etag"].startswith("W/")
+    assert response.json() == {"h1": ["/data/a.txt", "/data/b.txt"]}
+
+
+def test_unchanged_poll_gets_304_without_query(client: TestClient, session: Session, statements: list):
+    """
+    Test that a poll with a current If-None-Match gets 304 and runs no query beyond the change counter.
+    """
+    _add_duplicates(session)
+    for url in ("/api/duplicates", "/api/files"):
+        etag = client.get(url).headers["etag"]
+        statements.clear()
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        assert len(statements) == 1 and "change_counter" in statements[0]
+
+
+def test_write_invalidates_cached_response(client: TestClient, session: Session):
+    """
+    Test that a database write changes the ETag and refreshes the body.
+    """
+    _add_duplicates(session)
+    first = client.get("/api/duplicates")
+    generation = get_change_counter(session)
+
+    session.add(FileEntry(path="/data/d.txt", hash="h2", size=5, mtime=1.0))
+    session.flush()
+    assert get_change_counter(session) > generation
+
+    response = client.get("/api/duplicates", headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == 200
+    assert response.headers["etag"] != first.headers["etag"]
+    assert set(response.json()) == {"h1", "h2"}
+
+
+def test_write_from_another_engine_invalidates_cache(tmp_path):
+    """
+    Test that a commit through a separate engine, as another process would make,
+    changes the ETag served by the app.
+    """
+    db_file = str(tmp_path / "shared.db")
+    other = create_db_engine(db_file)
+    create_db_and_tables(other)
+    with TestClient(get_app(db_file=db_file)) as client:
+        first = client.get("/api/duplicates")
+        with Session(other) as writer:
+            _add_duplicates(writer)
+            writer.commit()
+        response = client.get("/api/duplicates", headers={"If-None-Match": first.headers["etag"]})
+        assert response.status_code == 200
+        assert response.json() == {"h1": ["/data/a.txt", "/data/b.txt"]}
+    other.dispose()
+
+
+def test_scan_bumps_change_counter(tmp_path, session: Session):
+    """
+    Test that the Core statements a scan writes with bump the change counter.
+    """
+    (tmp_path / "a.txt").write_text("a")
+    generation = get_change_counter(session)
+    scan_directory(tmp_path, session, exclusions=ExclusionRules())
+    assert get_change_counter(session) > generation
+
+
+def test_counter_is_bumped_once_per_transaction(engine):
+    """
+    Test that a transaction's writes bump the change counter once, and that a
+    write after the counter was read bumps it again.
+    """
+    with Session(engine) as session:
+        generation = get_change_counter(session)
+        _add_duplicates(session)
+        session.add(FileEntry(path="/data/d.txt", hash="h3", size=1, mtime=1.0))
+        session.flush()
+        assert get_change_counter(session) == generation + 1
+        session.add(FileEntry(path="/data/e.txt", hash="h4", size=1, mtime=1.0))
+        session.flush()
+        assert get_change_counter(session) == generation + 2
+        session.commit()
+
+
+def test_untracked_engines_are_left_alone():
+    """
+    Test that engines not set up for change tracking issue no counter writes,
+    even on databases without the change_counter table.
+    """
+    other = create_engine("sqlite:///:memory:")
+    table = Table("t", MetaData(), Column("x", Integer))
+    table.metadata.create_all(other)
+    with other.begin() as connection:
+        connection.execute(insert(table).values(x=1))
+        assert connection.execute(select(table.c.x)).scalar() == 1
+    other.dispose()
@@ -1,10 +1,22 @@
+import asyncio
 import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
 from pathlib import Path
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from app.core.db import create_db_engine, create_db_and_tables, get_db_session
+from sqlalchemy import delete, func, select, text
+from app.core.db import (
+    Database, DatabaseSettings, create_db_engine, create_db_and_tables, create_read_engine, get_db_session,
+)
 # Remove store_file_entry from import
-from app.core.scanner import hash_file
+from app.core.exclusions import ExclusionRules
+from app.core.scanner import hash_file, scan_directory
+from app.models.file_chunk import FileChunk
 from app.models.file_entry import FileEntry
 import pytest
 
@@ -63,28 +75,176 @@ def test_create_db_and_tables(tmp_path: Path):
     assert "files" in inspector.get_table_names()
 
 
+def test_deleted_files_leave_no_orphaned_chunks(tmp_path: Path):
+    """
+    Test that deleting file entries also deletes their chunk digests.
+    """
+    (tmp_path / "tree").mkdir()
+    (tmp_path / "tree" / "big.bin").write_bytes(os.urandom(1024 * 1024))
+    engine = create_db_engine(str(tmp_path / "fk.db"))
+    create_db_and_tables(engine)
+    with Session(engine) as session:
+        scan_directory(tmp_path / "tree", session, chunk_threshold=1, exclusions=ExclusionRules())
+        assert session.scalar(select(func.count()).select_from(FileChunk)) > 0
+        session.execute(delete(FileEntry))
+        session.commit()
+        orphans = session.scalar(
+            select(func.count()).select_from(FileChunk).outerjoin(FileEntry, FileChunk.file_id == FileEntry.id)
+            .where(FileEntry.id.is_(None))
+        )
+        assert orphans == 0
+    engine.dispose()
+
+
 def test_get_db_session(engine): # Use the function-scoped engine fixture
     """
-    Test that get_db_session provides a usable database session.
+    Test that get_db_session provides a usable session from the app's shared factory.
     """
-    session_generator = get_db_session(engine)
-    try:
-        session = next(session_generator)
-        assert isinstance(session, Session)
-        # Test if session is active
-        assert session.is_active
-        # Test a simple query
-        session.execute(select(1))
-    except Exception as e:
-        pytest.fail(f"Failed to get or use session: {e}")
-    finally:
-        # Ensure generator cleanup runs
+    database = Database(engine=engine)
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(database=database)))
+
+    async def use_session():
+        session_generator = get_db_session(request)
+        session = await session_generator.__anext__()
         try:
-            next(session_generator)
-        except StopIteration:
-            pass # Expected behavior
-        except Exception as e:
-            print(f"Error during session generator cleanup: {e}")
+            assert isinstance(session, Session)
+            assert session.is_active
+            session.execute(select(1))
+        finally:
+            await session_generator.aclose()
+        return session
+
+    session = asyncio.run(use_session())
+    assert session.bind is engine
+    assert database.sessions is database.sessions # One factory for every request
+
+
+def test_database_settings_from_env():
+    """
+    Test that database settings are read from DUPFINDER_* variables.
+    """
+    settings = DatabaseSettings.from_env({
+        "DUPFINDER_DB_FILE": "/data/index.db",
+        "DUPFINDER_READ_POOL_SIZE": "8",
+        "DUPFINDER_SYNCHRONOUS": "FULL",
+        "DUPFINDER_SQLITE_PRAGMAS": "cache_size=-65536; mmap_size=268435456",
+    })
+    assert (settings.db_file, settings.read_pool_size) == ("/data/index.db", 8)
+    assert settings.write_pragmas()["synchronous"] == "FULL"
+    assert settings.read_pragmas()["mmap_size"] == "268435456"
+    assert DatabaseSettings.from_env({}) == DatabaseSettings()
+    with pytest.raises(ValueError):
+        DatabaseSettings.from_env({"DUPFINDER_SQLITE_PRAGMAS": "cache_size"})
+
+
+def test_database_is_created_on_first_use_and_disposed_on_shutdown(tmp_path: Path):
+    """
+    Test that an app opens its database lazily, applies the configured pragmas,
+    and disposes of its engines when it shuts down.
+    """
+    from app.main import get_app
+    db_file = tmp_path / "lazy.db"
+    database = Database(DatabaseSettings(db_file=str(db_file), pragmas=(("cache_size", "-1234"),)))
+    with TestClient(get_app(database=database)) as client:
+        assert not db_file.exists()
+        assert client.get("/api/scan/jobs").status_code == 200
+        assert db_file.is_file()
+        with database.read_engine.connect() as connection:
+            assert connection.execute(text("PRAGMA cache_size")).scalar() == -1234
+            assert connection.execute(text("PRAGMA query_only")).scalar() == 1
+    assert database._engine is None and database._read_engine is None
+
+
+def test_database_is_created_off_the_event_loop_once(tmp_path: Path, monkeypatch):
+    """
+    Test that concurrent first requests create the database once, on a worker
+    thread rather than on the event loop.
+    """
+    from app.core import db as db_module
+    from app.main import get_app
+    calls = []
+    original = db_module.create_db_and_tables
+
+    def recording_create(engine):
+        calls.append(_running_loop())
+        time.sleep(0.2) # Like building an index on a large table
+        original(engine)
+
+    monkeypatch.setattr(db_module, "create_db_and_tables", recording_create)
+    database = Database(DatabaseSettings(db_file=str(tmp_path / "lazy.db")))
+    with TestClient(get_app(database=database)) as client:
+        responses = []
+        threads = [threading.Thread(target=lambda: responses.append(client.get("/api/scan/jobs"))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert [response.status_code for response in responses] == [200] * 4
+    assert calls == [None] # Created once, with no event loop running on that thread
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def test_read_executor_follows_settings_and_is_shut_down():
+    """
+    Test that the read executor has one thread per pooled read connection and stops on dispose.
+    """
+    database = Database(DatabaseSettings(read_pool_size=8))
+    executor = database.read_executor
+    assert executor._max_workers == 8
+    assert executor.submit(lambda: 1).result() == 1
+    database.dispose()
+    with pytest.raises(RuntimeError):
+        executor.submit(lambda: 1)
+    assert database.read_executor is not executor
+
+
+def test_read_engine_opens_paths_with_uri_characters(tmp_path: Path):
+    """
+    Test that the read-only engine opens the right file when its path contains "?", "#" or "%".
+    """
+    db_file = tmp_path / "odd?name#with%41" / "files.db"
+    db_file.parent.mkdir()
+    engine = create_db_engine(str(db_file))
+    create_db_and_tables(engine)
+    with Session(engine) as session:
+        session.add(FileEntry(path="/data/a", hash="h", size=1, mtime=0.0))
+        session.commit()
+    read_engine = create_read_engine(str(db_file))
+    with read_engine.connect() as connection:
+        assert connection.execute(select(FileEntry.path)).scalars().all() == ["/data/a"]
+        with pytest.raises(Exception, match="readonly"):
+            connection.execute(text("DELETE FROM files"))
+    read_engine.dispose()
+    engine.dispose()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["odd?name#with%41"]
+
+
+def test_injected_engine_is_not_disposed(engine):
+    """
+    Test that a Database uses an injected engine for both session kinds and leaves it open.
+    """
+    database = Database(engine=engine)
+    assert database.read_sessions.kw["bind"] is engine
+    database.dispose()
+    assert database.engine is engine
+
+
+def test_importing_app_creates_no_database(tmp_path: Path):
+    """
+    Test that importing app.main has no database side effects.
+    """
+    db_file = tmp_path / "never.db"
+    env = {**os.environ, "DUPFINDER_DB_FILE": str(db_file)}
+    subprocess.run(
+        [sys.executable, "-c", "import app.main"], check=True, env=env, cwd=Path(__file__).parent.parent,
+    )
+    assert not db_file.exists()
 
 
 def test_store_file_entry(session: Session, tmp_path: Path): # Use the session fixture
@@ -139,3 +299,28 @@ def test_store_file_entry(session: Session, tmp_path: Path): # Use the session f
 #     duplicates = find_duplicates(session)
 #     # ... assertions ...
 
+
+
+def test_create_db_and_tables_adds_missing_columns(tmp_path: Path):
+    """
+    Test that create_db_and_tables upgrades a database created before the
+    inode columns existed, keeping its rows.
+    """
+    db_file = tmp_path / "old.db"
+    with sqlite3.connect(db_file) as connection:
+        connection.execute(
+            "CREATE TABLE files (id INTEGER PRIMARY KEY, path VARCHAR UNIQUE, hash VARCHAR, size INTEGER, mtime FLOAT)"
+        )
+        connection.execute("INSERT INTO files (path, hash, size, mtime) VALUES ('/a', 'h', 1, 2.0)")
+    engine = create_db_engine(str(db_file))
+    create_db_and_tables(engine)
+
+    from sqlalchemy import inspect
+    inspector = inspect(engine)
+    columns = {column["name"] for column in inspector.get_columns("files")}
+    assert {"dev", "inode", "mtime_ns"} <= columns
+    assert "ix_files_inode_dev" in {index["name"] for index in inspector.get_indexes("files")}
+    with Session(engine) as session:
+        entry = session.query(FileEntry).one()
+        assert (entry.path, entry.inode) == ("/a", None)
+    engine.dispose()
@@ -0,0 +1,127 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from app.core import estimate as estimate_module
+from app.core.estimate import estimate_duplication
+from app.core.exclusions import ExclusionRules
+from app.core.hashing import partial_digest
+
+
+def _build_tree(root: Path) -> int:
+    """Creates 59 files in same-size groups that are partly duplicates; returns the duplicate bytes."""
+    duplicate_bytes = 0
+    for group in range(20):
+        directory = root / f"dir{group % 4}"
+        directory.mkdir(parents=True, exist_ok=True)
+        size = 4096 + group
+        content = os.urandom(size)
+        copies = 1 + group % 3
+        for copy in range(copies):
+            (directory / f"g{group}_copy{copy}").write_bytes(content)
+        # Reason: A distinct file of the same size is a size collision but not a duplicate.
+        (directory / f"g{group}_other").write_bytes(os.urandom(size))
+        duplicate_bytes += (copies - 1) * size
+    return duplicate_bytes
+
+
+def test_partial_digest_samples_large_files(tmp_path: Path):
+    """Test that partial digests read only the samples and tell differing files apart."""
+    content = bytearray(os.urandom(1024 * 1024))
+    (tmp_path / "a").write_bytes(content)
+    (tmp_path / "b").write_bytes(content)
+    content[len(content) // 2] ^= 0xFF
+    (tmp_path / "c").write_bytes(content)
+
+    digest_a, read = partial_digest(tmp_path / "a", 4096)
+    assert read == 3 * 4096
+    assert partial_digest(tmp_path / "b", 4096)[0] == digest_a
+    assert partial_digest(tmp_path / "c", 4096)[0] != digest_a
+    assert partial_digest(tmp_path / "a", 1024 * 1024)[1] == 1024 * 1024
+
+
+def test_estimate_brackets_true_duplicates(tmp_path: Path):
+    """Test that the estimate's bounds contain the real duplicate bytes."""
+    duplicate_bytes = _build_tree(tmp_path)
+    estimate = estimate_duplication(tmp_path, sample_size=50, seed=1, exclusions=ExclusionRules())
+
+    assert estimate["files"] == estimate["files_walked"] == 59
+    assert estimate["duplicate_bytes_low"] <= duplicate_bytes <= estimate["duplicate_bytes_high"]
+    assert estimate["duplicate_bytes_high"] <= estimate["candidate_bytes"]
+    assert estimate["bytes_read"] < estimate["bytes"]
+    assert sum(bin["files"] for bin in estimate["histogram"]) == 59
+
+
+def test_estimate_scales_with_a_large_bucket(tmp_path: Path):
+    """Test that copies in a bucket larger than its hashed sample are still counted at the bucket's scale."""
+    for pair in range(500):
+        content = os.urandom(4096)
+        (tmp_path / f"p{pair}_a").write_bytes(content)
+        (tmp_path / f"p{pair}_b").write_bytes(content)
+    # Reason: Which files get hashed depends on directory order, so use wide bounds.
+    estimate = estimate_duplication(tmp_path, confidence=0.999, seed=1, exclusions=ExclusionRules())
+
+    assert estimate["candidate_bytes"] == 999 * 4096
+    assert 0 < estimate["duplicate_bytes_low"] <= 500 * 4096 <= estimate["duplicate_bytes_high"]
+
+
+def test_estimate_of_distinct_files_is_zero(tmp_path: Path):
+    """Test that same-size files with different contents are estimated as no duplicates."""
+    for i in range(10):
+        (tmp_path / f"f{i}").write_bytes(os.urandom(1000))
+    estimate = estimate_duplication(tmp_path, seed=1, exclusions=ExclusionRules())
+
+    assert estimate["candidate_bytes"] == 9 * 1000
+    assert estimate["duplicate_bytes"] == estimate["duplicate_bytes_low"] == estimate["duplicate_bytes_high"] == 0
+
+
+def test_subtree_sampling_scales_totals(tmp_path: Path):
+    """Test that subtree sampling walks fewer files and scales the totals back up."""
+    for d in range(40):
+        directory = tmp_path / f"d{d}"
+        directory.mkdir()
+        for i in range(5):
+            (directory / f"f{i}").write_bytes(b"x" * 100)
+    estimate = estimate_duplication(tmp_path, subtree_fraction=0.5, seed=3, exclusions=ExclusionRules())
+
+    assert estimate["files_walked"] < 200
+    assert estimate["files"] == estimate["files_walked"] * 2
+    assert estimate["bytes"] == estimate["files"] * 100
+    with pytest.raises(ValueError):
+        estimate_duplication(tmp_path, subtree_fraction=0)
+
+
+def test_estimate_keeps_paths_only_for_drawn_buckets(tmp_path: Path, monkeypatch):
+    """Test that many distinct sizes don't make the estimator hold paths for every size bucket."""
+    created = []
+
+    class RecordingBucket(estimate_module._SizeBucket):
+        def __init__(self):
+            super().__init__()
+            created.append(self)
+
+    monkeypatch.setattr(estimate_module, "_SizeBucket", RecordingBucket)
+    for i in range(300):
+        (tmp_path / f"f{i}_a").write_bytes(b"x" * (i + 1))
+        (tmp_path / f"f{i}_b").write_bytes(b"x" * (i + 1))
+    estimate = estimate_duplication(tmp_path, sample_size=5, seed=1, exclusions=ExclusionRules())
+
+    assert 0 < len(created) <= 5
+    assert all(bucket.count == 2 for bucket in created)
+    assert estimate["duplicate_bytes"] == estimate["candidate_bytes"]
+
+
+def test_subtree_sampling_hashes_the_walked_subtrees(tmp_path: Path):
+    """Test that the paths hashed for the drawn buckets come from the same subtrees that were counted."""
+    for d in range(40):
+        directory = tmp_path / f"d{d}"
+        directory.mkdir()
+        content = os.urandom(100 + d)
+        (directory / "a").write_bytes(content)
+        (directory / "b").write_bytes(content)
+    estimate = estimate_duplication(tmp_path, subtree_fraction=0.5, seed=3, exclusions=ExclusionRules())
+
+    assert 0 < estimate["files_walked"] < 80
+    assert estimate["candidate_bytes"] > 0
+    assert estimate["duplicate_bytes_low"] == estimate["duplicate_bytes"] == estimate["candidate_bytes"]
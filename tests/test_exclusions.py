@@ -0,0 +1,157 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.core import config
+from app.core.exclusions import ExclusionRules, compile_pattern
+from app.core.scanner import scan_directory, walk_directory
+from app.models.file_entry import Base, FileEntry
+
+
+def _excluded(patterns, path: str, is_dir: bool = False) -> bool:
+    """Evaluates root-level patterns against a root-relative path, as a scan would."""
+    rules = ExclusionRules(patterns, ignore_file_name=None)
+    parent, _, name = path.rpartition("/")
+    return rules.matcher("/root").directory(os.path.join("/root", parent)).excludes(name, is_dir)
+
+
+@pytest.mark.parametrize("patterns, path, is_dir, expected", [
+    (["*.log"], "a/b/debug.log", False, True),
+    (["*.log"], "a/b/debug.txt", False, False),
+    (["build/"], "src/build", True, True),
+    (["build/"], "src/build", False, False), # Directory-only pattern
+    (["/build"], "build", True, True),
+    (["/build"], "src/build", True, False), # Anchored to the root
+    (["docs/*.md"], "docs/a.md", False, True),
+    (["docs/*.md"], "x/docs/a.md", False, False),
+    (["**/cache"], "a/b/cache", True, True),
+    (["a/**/z.bin"], "a/z.bin", False, True),
+    (["a/**/z.bin"], "a/b/c/z.bin", False, True),
+    (["file?.[ch]"], "file1.c", False, True),
+    (["file[!0-9].c"], "file1.c", False, False),
+    (["*.log", "!keep.log"], "keep.log", False, False), # Negation
+    (["!keep.log", "*.log"], "keep.log", False, True), # Last match wins
+    (["\\#notes"], "#notes", False, True),
+    (["# comment"], "# comment", False, False),
+])
+def test_gitignore_semantics(patterns, path, is_dir, expected):
+    """Test that patterns follow gitignore matching rules."""
+    assert _excluded(patterns, path, is_dir) is expected
+
+
+def test_blank_and_comment_lines_compile_to_nothing():
+    """Test that blank lines and comments produce no rule."""
+    assert compile_pattern("") is None
+    assert compile_pattern("   \n") is None
+    assert compile_pattern("# a comment") is None
+
+
+def test_size_and_extension_rules(tmp_path: Path):
+    """Test that size bounds and extensions exclude files."""
+    (tmp_path / "tiny.txt").write_bytes(b"x")
+    (tmp_path / "ok.txt").write_bytes(b"x" * 10)
+    (tmp_path / "huge.txt").write_bytes(b"x" * 100)
+    (tmp_path / "image.ISO").write_bytes(b"x" * 10)
+    config_file = tmp_path / "excl.json"
+    config_file.write_text(json.dumps({"min_file_size": 5, "max_file_size": 50, "excluded_extensions": ["iso"]}))
+
+    found = {p.name for p in walk_directory(tmp_path, str(config_file))}
+    assert found == {"ok.txt"}
+
+
+def test_dupignore_files_apply_per_directory(tmp_path: Path):
+    """Test that .dupignore patterns apply below their directory and can be overridden deeper."""
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "other").mkdir()
+    for directory in ("a", "a/b", "other"):
+        (tmp_path / directory / "data.tmp").write_text(directory)
+        (tmp_path / directory / "data.txt").write_text(directory)
+    (tmp_path / "a" / ".dupignore").write_text("*.tmp\n/b/data.txt\n")
+    (tmp_path / "a" / "b" / ".dupignore").write_text("!data.tmp\n")
+
+    found = {p.relative_to(tmp_path).as_posix() for p in walk_directory(tmp_path)}
+    assert found == {"a/data.txt", "a/b/data.tmp", "other/data.tmp", "other/data.txt"}
+
+
+@pytest.mark.parametrize("root", [".", "a/../a/..", "./"])
+def test_relative_roots_keep_patterns_anchored(tmp_path: Path, monkeypatch, root: str):
+    """Test that anchored patterns and .dupignore files work when the scan root is relative or not normalized."""
+    (tmp_path / "a" / "build").mkdir(parents=True)
+    (tmp_path / "build").mkdir()
+    for directory in ("build", "a/build", "a"):
+        (tmp_path / directory / "data.tmp").write_text(directory)
+        (tmp_path / directory / "data.txt").write_text(directory)
+    (tmp_path / ".dupignore").write_text("/build\n")
+    (tmp_path / "a" / ".dupignore").write_text("*.tmp\n")
+    monkeypatch.chdir(tmp_path)
+
+    found = {os.path.relpath(p, root).replace(os.sep, "/") for p in walk_directory(Path(root))}
+    assert found == {"a/build/data.txt", "a/data.txt"}
+
+
+def test_malformed_patterns_are_skipped(tmp_path: Path, capsys):
+    """Test that a malformed .dupignore line is skipped with a warning while the other rules still apply."""
+    (tmp_path / "keep.txt").write_text("k")
+    (tmp_path / "drop.tmp").write_text("d")
+    (tmp_path / ".dupignore").write_text("[z-a]\n*.tmp\n")
+
+    found = [p.name for p in walk_directory(tmp_path)]
+    assert found == ["keep.txt"]
+    assert "Skipping invalid pattern '[z-a]'" in capsys.readouterr().out
+    assert len(ExclusionRules(patterns=["[z-a]", "*.tmp"]).rules) == 1
+
+
+def test_excluded_subtrees_are_never_listed(tmp_path: Path, monkeypatch):
+    """Test that an excluded directory is pruned before it is listed."""
+    (tmp_path / "node_modules" / "pkg" / "lib").mkdir(parents=True)
+    (tmp_path / "node_modules" / "pkg" / "lib" / "index.js").write_text("x")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.js").write_text("y")
+    (tmp_path / ".dupignore").write_text("node_modules/\n")
+
+    listed = []
+    original_scandir = os.scandir
+    def recording_scandir(path):
+        listed.append(os.fspath(path))
+        return original_scandir(path)
+    monkeypatch.setattr(os, "scandir", recording_scandir)
+
+    found = [p.name for p in walk_directory(tmp_path)]
+    assert found == ["main.js"]
+    assert not any("node_modules" in path for path in listed)
+
+
+def test_scan_directory_uses_app_config(tmp_path: Path, monkeypatch):
+    """Test that scans apply the exclusions in the app config file."""
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps({"excluded_directories": ["vendor"], "exclude_patterns": ["*.bak"]}))
+    monkeypatch.setattr(config, "CONFIG_FILE", config_file)
+    tree = tmp_path / "tree"
+    (tree / "vendor").mkdir(parents=True)
+    (tree / "vendor" / "lib.py").write_text("v")
+    (tree / "notes.bak").write_text("b")
+    (tree / "notes.txt").write_text("t")
+
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        scan_directory(tree, session)
+        assert [Path(entry.path).name for entry in session.query(FileEntry)] == ["notes.txt"]
+
+
+def test_exclusion_rules_are_cached_until_config_changes(tmp_path: Path, monkeypatch):
+    """Test that load_exclusion_rules compiles the config once and reloads it after an update."""
+    monkeypatch.setattr(config, "CONFIG_FILE", tmp_path / "config.json")
+    config.update_config({"excluded_directories": ["a"]})
+    first = config.load_exclusion_rules()
+    assert config.load_exclusion_rules() is first
+
+    config.update_config({"excluded_directories": ["a", "b"]})
+    second = config.load_exclusion_rules()
+    assert second is not first
+    assert len(second.rules) == 2
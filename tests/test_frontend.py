@@ -107,3 +107,14 @@ def test_index_html_has_status_message_div(client: TestClient):
 # as the current UI uses divs and JS for interaction, not a traditional form/table.
 # Adjusted tests check for key element IDs instead.
 
+
+
+def test_index_html_has_sort_order_select(client: TestClient):
+    """
+    Test that the index.html file contains the server-side sort selector.
+    """
+    response = client.get("/")
+    assert response.status_code == 200
+    # Reason: The virtualized list re-ranks groups on the server from this control.
+    assert '<select id="sortOrder">' in response.text
+    assert '<option value="wasted">' in response.text
@@ -0,0 +1,92 @@
+import hashlib
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core.db import track_changes
+from app.core.lookup import BloomFilter, DigestFilter, lookup_digests
+from app.models.file_entry import Base, FileEntry
+
+
+def _digest(i: int) -> str:
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+@pytest.fixture(name="session")
+def lookup_session_fixture(tmp_path):
+    """Provides a session on a database file holding files 0-99, with 0-9 duplicated."""
+    # Reason: On disk, so background rebuilds get their own connection.
+    engine = create_engine(f"sqlite:///{tmp_path / 'lookup.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    track_changes(engine)
+    with Session(engine) as session:
+        session.add_all(FileEntry(path=f"/data/f{i}", hash=_digest(i), size=i, mtime=0.0) for i in range(100))
+        session.add_all(FileEntry(path=f"/copy/f{i}", hash=_digest(i), size=i, mtime=0.0) for i in range(10))
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    """Test that added items are always found and the false-positive rate is near its target."""
+    bloom = BloomFilter(10000, error_rate=0.01)
+    bloom.update(_digest(i) for i in range(10000))
+    assert all(_digest(i) in bloom for i in range(10000))
+    false_positives = sum(_digest(i) in bloom for i in range(10000, 30000))
+    assert false_positives < 20000 * 0.02
+
+
+def test_lookup_digests_matches_hashes_and_pairs(session: Session):
+    """Test that lookups return every indexed path, honor sizes, and skip unknown digests."""
+    digest_filter = DigestFilter()
+    digest_filter.build(session)
+    result = lookup_digests(
+        session,
+        [(_digest(3).upper(), None), (_digest(50), 50), (_digest(60), 61), (_digest(1000), None)],
+        digest_filter,
+    )
+    assert result["matches"] == [
+        {"hash": _digest(3), "size": None, "paths": ["/copy/f3", "/data/f3"]},
+        {"hash": _digest(50), "size": 50, "paths": ["/data/f50"]},
+    ]
+    assert result["checked"] == 4
+    assert result["filtered"] >= 1
+
+
+def test_stale_filter_is_rebuilt_in_background(session: Session):
+    """Test that a lookup never waits for a rebuild and that the rebuilt filter holds new digests."""
+    digest_filter = DigestFilter(min_rebuild_interval=0)
+    first = digest_filter.build(session)
+    assert digest_filter.current(session) is first
+    assert _digest(500) not in first
+
+    session.add(FileEntry(path="/data/new", hash=_digest(500), size=1, mtime=0.0))
+    session.commit()
+    # Reason: The stale filter is bypassed at once while the rebuild it started runs.
+    result = lookup_digests(session, [(_digest(500), None)], digest_filter)
+    assert result["matches"][0]["paths"] == ["/data/new"]
+    assert result["filtered"] == 0
+
+    deadline = time.monotonic() + 10
+    while digest_filter.current(session) in (None, first) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert _digest(500) in digest_filter.current(session)
+
+
+def test_stale_filter_is_bypassed_between_rebuilds(session: Session):
+    """Test that a stale filter is not consulted while rebuilds are rate limited."""
+    digest_filter = DigestFilter(min_rebuild_interval=3600)
+    digest_filter.rebuild_in_background(session.get_bind(), force=True).join()
+    session.add(FileEntry(path="/data/new", hash=_digest(500), size=1, mtime=0.0))
+    session.commit()
+
+    assert digest_filter.current(session) is None
+    assert digest_filter.rebuild_in_background(session.get_bind()) is None
+    result = lookup_digests(session, [(_digest(500), None)], digest_filter)
+    assert result["matches"][0]["paths"] == ["/data/new"]
+    assert result["filtered"] == 0
+    # Reason: A finished scan rebuilds regardless of the interval.
+    digest_filter.rebuild_in_background(session.get_bind(), force=True).join()
+    assert _digest(500) in digest_filter.current(session)
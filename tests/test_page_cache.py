@@ -0,0 +1,106 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.core import hashing
+from app.core.hashing import CACHE_POLICY_DEFAULT, CACHE_POLICY_DIRECT, CACHE_POLICY_DONTNEED
+from app.core.page_cache import evict, resident_fraction
+from app.core.scanner import hash_file, scan_directory
+from app.models.file_entry import Base
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux") or not hasattr(os, "posix_fadvise"),
+    reason="Page-cache residency is measured with Linux mincore/posix_fadvise.",
+)
+
+FILE_SIZE = 16 * 1024 * 1024
+
+
+@pytest.fixture(name="cold_files")
+def cold_files_fixture(tmp_path: Path):
+    """
+    Creates files and evicts them from the page cache, skipping the test where
+    the filesystem keeps them resident regardless (e.g. tmpfs) or reads do not
+    populate a measurable cache.
+    """
+    tree = tmp_path / "tree"
+    tree.mkdir()
+    paths = []
+    for i in range(4):
+        path = tree / f"file{i}.bin"
+        path.write_bytes(os.urandom(FILE_SIZE // 4))
+        paths.append(path)
+
+    evict(paths)
+    if resident_fraction(paths) > 0.1:
+        pytest.skip("The filesystem keeps file pages resident; DONTNEED has no effect here.")
+    for path in paths:
+        hash_file(path, CACHE_POLICY_DEFAULT)
+    if resident_fraction(paths) < 0.9:
+        pytest.skip("Reads do not populate a measurable page cache here.")
+    evict(paths)
+    return tree, paths
+
+
+@pytest.mark.parametrize("policy", [CACHE_POLICY_DONTNEED, CACHE_POLICY_DIRECT])
+def test_hashing_leaves_page_cache_cold(cold_files, policy: str, monkeypatch):
+    """Test that the cache-friendly policies hash correctly without leaving pages cached."""
+    _, paths = cold_files
+    # Reason: Use O_DIRECT even for these small files.
+    monkeypatch.setattr(hashing, "DIRECT_IO_MIN_SIZE", 0)
+    expected = []
+    for path in paths:
+        expected.append(hash_file(path, CACHE_POLICY_DEFAULT))
+    evict(paths)
+
+    assert [hash_file(path, policy) for path in paths] == expected
+    assert resident_fraction(paths) < 0.1
+
+
+def test_scan_with_dontneed_restores_page_cache(cold_files):
+    """Test that a whole scan with the dontneed policy leaves the page cache as it found it."""
+    tree, paths = cold_files
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    before = resident_fraction(paths)
+    with Session(engine) as session:
+        job = scan_directory(tree, session, cache_policy=CACHE_POLICY_DONTNEED)
+        assert (job.files_hashed, job.cache_policy) == (len(paths), CACHE_POLICY_DONTNEED)
+    assert resident_fraction(paths) <= before + 0.1
+
+
+def test_unknown_cache_policy_is_rejected(tmp_path: Path):
+    """Test that a misspelled policy fails instead of silently using the default."""
+    path = tmp_path / "a.txt"
+    path.write_text("a")
+    with pytest.raises(ValueError):
+        hash_file(path, "nocache")
+
+
+def test_direct_read_survives_short_reads(tmp_path: Path, monkeypatch):
+    """Test that a short read before EOF neither truncates the content nor breaks later reads."""
+    path = tmp_path / "file.bin"
+    content = os.urandom(3 * hashing.DIRECT_IO_BLOCK_SIZE + 1234)
+    path.write_bytes(content)
+    real_readv = os.readv
+    calls = []
+
+    def readv(fd, buffers):
+        calls.append(fd)
+        if len(calls) == 2:
+            # Reason: Interrupted mid-file after two pages; the file's odd tail
+            # then leaves the offset unaligned before EOF is seen.
+            return real_readv(fd, [memoryview(buffers[0])[:2 * hashing.DIRECT_IO_ALIGNMENT]])
+        return real_readv(fd, buffers)
+
+    monkeypatch.setattr(hashing.os, "readv", readv)
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECT)
+    except OSError: # e.g. tmpfs; the short read is still exercised
+        fd = os.open(path, os.O_RDONLY)
+    assert b"".join(hashing._read_direct(fd)) == content
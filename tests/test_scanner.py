@@ -1,16 +1,30 @@
 import os
 import json
 import hashlib
+import random
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import closing
 from pathlib import Path
 # Remove store_file_entry from import
-from app.core.scanner import walk_directory, hash_file, find_duplicates
+from app.core import scanner
+from app.core.scanner import walk_directory, hash_file, find_duplicates, find_partial_duplicates, scan_directory, resume_scan
+from app.core.scanner import HASH_WORKERS, PIPELINE_DEPTH
+from app.core.hashing import CHUNK_MAX_SIZE, CHUNK_MIN_SIZE, ContentDefinedChunker, hash_file_and_chunks
+from app.models.file_chunk import FileChunk
 from app.models.file_entry import FileEntry, Base # Import Base
+from app.models.scan_job import ScanFrontier, ScanJob
 from app.core.db import create_db_engine, create_db_and_tables, get_db_session
 from sqlalchemy.orm import Session
 from sqlalchemy import select, create_engine # Import create_engine
 from sqlalchemy.pool import StaticPool # Import StaticPool for in-memory DB
 import pytest
-from typing import Generator
+from typing import Dict, Generator
 
 # --- Fixtures for Scanner tests ---
 
@@ -272,3 +286,374 @@ def test_find_duplicates_empty_db(session: Session):
     duplicate_groups = find_duplicates(session)
     assert duplicate_groups == {} # Expect an empty dictionary
 
+
+
+# --- Content-defined chunking tests ---
+
+def _chunk_stream(data: bytes, block_size: int):
+    chunker = ContentDefinedChunker()
+    for start in range(0, len(data), block_size):
+        chunker.update(data[start:start + block_size])
+    return chunker.finish()
+
+
+def test_chunker_is_independent_of_read_size():
+    """
+    Test that chunk boundaries depend on content only, not on how it is fed.
+    """
+    data = random.Random(1).randbytes(6 * 1024 * 1024)
+    chunks = _chunk_stream(data, 65536)
+    assert chunks == _chunk_stream(data, 7777)
+    assert sum(length for _, length in chunks) == len(data)
+    assert all(length <= CHUNK_MAX_SIZE for _, length in chunks)
+    assert all(length >= CHUNK_MIN_SIZE for _, length in chunks[:-1])
+
+
+def test_chunker_resynchronizes_after_insert():
+    """
+    Test that inserting bytes only changes the chunks around the edit.
+    """
+    data = random.Random(2).randbytes(8 * 1024 * 1024)
+    edited = data[:100_000] + b"inserted bytes" + data[100_000:]
+    original = {digest for digest, _ in _chunk_stream(data, 65536)}
+    changed = {digest for digest, _ in _chunk_stream(edited, 65536)}
+    assert len(original - changed) <= 2
+
+
+def test_hash_file_and_chunks_matches_hash_file(tmp_path: Path):
+    """
+    Test that the single-pass digest equals the plain SHA-256 file hash.
+    """
+    file_path = tmp_path / "big.bin"
+    file_path.write_bytes(random.Random(3).randbytes(3 * 1024 * 1024))
+    file_hash, chunks = hash_file_and_chunks(file_path)
+    assert file_hash == hash_file(file_path)
+    assert sum(length for _, length in chunks) == file_path.stat().st_size
+
+
+def test_scan_directory_finds_partial_duplicates(session: Session, tmp_path: Path):
+    """
+    Test that chunk-indexed scans report files that differ by a single block.
+    """
+    data = random.Random(4).randbytes(8 * 1024 * 1024)
+    (tmp_path / "image_a.bin").write_bytes(data)
+    (tmp_path / "image_b.bin").write_bytes(data[:4_000_000] + b"\x01" * 4096 + data[4_004_096:])
+    (tmp_path / "small.txt").write_text("below the chunking threshold")
+
+    scan_directory(tmp_path, session, chunk_threshold=1024 * 1024)
+
+    assert session.query(FileChunk).count() > 0
+    small_entry = session.query(FileEntry).filter_by(path=str(tmp_path / "small.txt")).one()
+    assert session.query(FileChunk).filter_by(file_id=small_entry.id).count() == 0
+
+    result = find_partial_duplicates(session, min_ratio=0.5)
+    assert len(result["pairs"]) == 1
+    pair = result["pairs"][0]
+    assert {pair["path_a"], pair["path_b"]} == {str(tmp_path / "image_a.bin"), str(tmp_path / "image_b.bin")}
+    assert 0.5 <= pair["shared_ratio"] < 1.0
+    assert result["estimated_dedup_savings_bytes"] == pair["shared_bytes"]
+
+    # Reason: A rescan of unchanged files must neither rehash nor duplicate chunk rows.
+    chunk_count = session.query(FileChunk).count()
+    scan_directory(tmp_path, session, chunk_threshold=1024 * 1024)
+    assert session.query(FileChunk).count() == chunk_count
+
+
+# --- Checkpoint and resume tests ---
+
+class _SimulatedCrash(BaseException):
+    """Raised from inside a scan to simulate the process dying."""
+
+
+def _build_tree(root: Path, seed: int, files_per_dir: int = 20) -> Dict[str, str]:
+    """Creates a nested tree of small files; returns {path: sha256} for all of them."""
+    rng = random.Random(seed)
+    expected = {}
+    for top in range(4):
+        for sub in range(3):
+            directory = root / f"top{top}" / f"sub{sub}"
+            directory.mkdir(parents=True)
+            for index in range(rng.randint(files_per_dir // 2, files_per_dir * 3 // 2)):
+                # Reason: Small content pool so the tree also contains duplicates.
+                content = f"content-{rng.randint(0, 40)}".encode()
+                (directory / f"file{index}.txt").write_bytes(content)
+                expected[str(directory / f"file{index}.txt")] = hashlib.sha256(content).hexdigest()
+        (root / f"top{top}" / "top_level.txt").write_bytes(b"top")
+        expected[str(root / f"top{top}" / "top_level.txt")] = hashlib.sha256(b"top").hexdigest()
+    return expected
+
+
+def _index_of(engine) -> Dict[str, str]:
+    with Session(engine) as session:
+        return dict(session.execute(select(FileEntry.path, FileEntry.hash)).all())
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_scan_resumes_after_crashes_at_random_points(tmp_path: Path, monkeypatch, seed: int):
+    """
+    Test that a scan interrupted at random points and resumed from its last
+    checkpoint produces the same index as an uninterrupted scan, without
+    rehashing work that was already checkpointed.
+    """
+    scan_root = tmp_path / "tree"
+    expected = _build_tree(scan_root, seed)
+    engine = create_db_engine(str(tmp_path / "resume.db"))
+    create_db_and_tables(engine)
+    checkpoint_every = 25
+
+    rng = random.Random(seed)
+    hash_calls = 0
+    crash_at = rng.randint(1, len(expected))
+    real_hash_file = scanner.hash_file
+    # Reason: hash_file runs on several worker threads.
+    calls_lock = threading.Lock()
+
+    def crashing_hash_file(file_path, *args):
+        nonlocal hash_calls
+        with calls_lock:
+            hash_calls += 1
+            crash_now = hash_calls == crash_at
+        if crash_now:
+            raise _SimulatedCrash()
+        return real_hash_file(file_path, *args)
+
+    monkeypatch.setattr(scanner, "hash_file", crashing_hash_file)
+
+    crashes = 0
+    job_id = None
+    while True:
+        session = Session(engine)
+        try:
+            if job_id is None:
+                scan_directory(scan_root, session, checkpoint_every=checkpoint_every)
+            else:
+                scan_job = resume_scan(job_id, session, checkpoint_every=checkpoint_every)
+                assert scan_job.status == "completed"
+            break
+        except _SimulatedCrash:
+            crashes += 1
+            # Reason: Anything after the last checkpoint is lost, as in a real crash.
+            session.rollback()
+            job_id = session.execute(select(ScanJob.id)).scalar_one()
+            crash_at = hash_calls + rng.randint(1, 2 * checkpoint_every)
+        finally:
+            session.close()
+
+    assert crashes >= 1
+    assert _index_of(engine) == expected
+    with Session(engine) as session:
+        assert session.query(ScanFrontier).count() == 0
+    # Reason: Each crash may redo at most one checkpoint interval of hashing
+    # plus whatever was in flight in the pipeline.
+    assert hash_calls <= len(expected) + crashes * (checkpoint_every + PIPELINE_DEPTH + HASH_WORKERS + 1)
+
+
+def _files_seen(db_file: Path) -> int:
+    """Reads a scan job's checkpointed progress from outside the scanning process."""
+    with closing(sqlite3.connect(db_file)) as connection:
+        row = connection.execute("SELECT files_seen FROM scan_jobs").fetchone()
+    return row[0] if row else -1
+
+
+def test_scan_survives_sigkill(tmp_path: Path):
+    """
+    Test that a scan process killed with SIGKILL at random times can be
+    resumed to a correct index.
+    """
+    if not hasattr(signal, "SIGKILL"):
+        pytest.skip("SIGKILL is not available on this platform")
+    scan_root = tmp_path / "tree"
+    expected = _build_tree(scan_root, seed=7, files_per_dir=150)
+    db_file = tmp_path / "killed.db"
+    create_db_and_tables(create_db_engine(str(db_file)))
+
+    script = (
+        "import sys; from pathlib import Path; from sqlalchemy.orm import Session\n"
+        "from sqlalchemy import select\n"
+        "from app.core.db import create_db_engine\n"
+        "from app.core.scanner import scan_directory, resume_scan\n"
+        "from app.models.scan_job import ScanJob\n"
+        "engine = create_db_engine(sys.argv[1])\n"
+        "with Session(engine) as session:\n"
+        "    job_id = session.execute(select(ScanJob.id)).scalar()\n"
+        "    if job_id is None:\n"
+        "        scan_directory(Path(sys.argv[2]), session, checkpoint_every=5)\n"
+        "    else:\n"
+        "        resume_scan(job_id, session, checkpoint_every=5)\n"
+    )
+    rng = random.Random(7)
+    project_root = Path(__file__).resolve().parent.parent
+    kills = 0
+    for _ in range(4):
+        seen_before = _files_seen(db_file)
+        process = subprocess.Popen([sys.executable, "-c", script, str(db_file), str(scan_root)], cwd=project_root)
+        # Reason: Wait until this run has checkpointed progress, then kill it a random moment later.
+        while process.poll() is None and _files_seen(db_file) <= seen_before:
+            time.sleep(0.005)
+        time.sleep(rng.uniform(0, 0.05))
+        if process.poll() is None:
+            process.send_signal(signal.SIGKILL)
+            kills += 1
+        process.wait()
+    # Reason: Final uninterrupted run completes whatever is left.
+    subprocess.run([sys.executable, "-c", script, str(db_file), str(scan_root)], cwd=project_root, check=True, timeout=120)
+
+    assert kills >= 1
+    engine = create_db_engine(str(db_file))
+    assert _index_of(engine) == expected
+    with Session(engine) as session:
+        assert session.query(ScanJob).one().status == "completed"
+        assert session.query(ScanFrontier).count() == 0
+
+
+# --- Memory tests ---
+
+def _scan_peak_memory(root: Path, file_count: int) -> int:
+    """Creates file_count small files under root, scans them and returns the peak traced heap size."""
+    for directory_index in range(file_count // 1000):
+        directory = root / "tree" / f"dir{directory_index}"
+        directory.mkdir(parents=True)
+        for file_index in range(1000):
+            (directory / f"file{file_index}").write_bytes(b"%d" % (directory_index * 1000 + file_index))
+    engine = create_db_engine(str(root / "memory.db"))
+    create_db_and_tables(engine)
+    with Session(engine) as session:
+        tracemalloc.start()
+        try:
+            scan_directory(root / "tree", session)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    with Session(engine) as session:
+        assert session.query(FileEntry).count() == file_count
+    engine.dispose()
+    return peak
+
+
+def test_scan_memory_does_not_grow_with_file_count(tmp_path: Path):
+    """
+    Test that scanning 8x more files does not raise peak memory.
+
+    Python heap (tracemalloc) is measured rather than RSS: it is where per-file
+    state such as ORM instances would accumulate, and unlike RSS it is not
+    dominated by interpreter startup and SQLite's bounded page cache.
+    """
+    small = _scan_peak_memory(tmp_path / "small", 2_000)
+    large = _scan_peak_memory(tmp_path / "large", 16_000)
+    assert large <= small * 1.3, f"peak grew from {small / 1e6:.2f} MB to {large / 1e6:.2f} MB"
+
+
+# Scans a tree in a fresh interpreter and prints its peak RSS in bytes, so the
+# measurement covers C-level and SQLite memory and nothing left by other tests.
+_PEAK_RSS_SCRIPT = (
+    "import resource, sys; from pathlib import Path; from sqlalchemy.orm import Session\n"
+    "from app.core.db import create_db_and_tables, create_db_engine\n"
+    "from app.core.scanner import scan_directory\n"
+    "engine = create_db_engine(sys.argv[1])\n"
+    "create_db_and_tables(engine)\n"
+    "with Session(engine) as session:\n"
+    "    job = scan_directory(Path(sys.argv[2]), session)\n"
+    "assert job.status == 'completed' and job.files_hashed == int(sys.argv[3]), job.files_hashed\n"
+    "rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+    "print(rss if sys.platform == 'darwin' else rss * 1024)\n" # Linux reports KiB
+)
+
+
+def _scan_peak_rss(root: Path, file_count: int) -> int:
+    """Creates file_count small files under root, scans them in a subprocess and returns its peak RSS."""
+    for directory_index in range(file_count // 1000):
+        directory = root / "tree" / f"dir{directory_index}"
+        directory.mkdir(parents=True)
+        for file_index in range(1000):
+            (directory / f"file{file_index}").write_bytes(b"%d" % (directory_index * 1000 + file_index))
+    process = subprocess.run(
+        [sys.executable, "-c", _PEAK_RSS_SCRIPT, str(root / "memory.db"), str(root / "tree"), str(file_count)],
+        cwd=Path(__file__).resolve().parent.parent, check=True, capture_output=True, text=True,
+    )
+    return int(process.stdout.split()[-1])
+
+
+@pytest.mark.skipif(
+    not os.environ.get("DUPFINDER_SLOW_TESTS") or sys.platform == "win32",
+    reason="Scans a million files (set DUPFINDER_SLOW_TESTS=1 to run); needs the Unix resource module",
+)
+def test_scan_rss_does_not_grow_with_file_count(tmp_path: Path):
+    """
+    Test that a scan's peak RSS is the same for 100k and 1M files, measured
+    in fresh processes so C-level and SQLite memory count too.
+    """
+    small = _scan_peak_rss(tmp_path / "small", 100_000)
+    large = _scan_peak_rss(tmp_path / "large", int(os.environ.get("DUPFINDER_SLOW_TEST_FILES", 1_000_000)))
+    assert large <= small * 1.15, f"peak RSS grew from {small / 1e6:.1f} MB to {large / 1e6:.1f} MB"
+
+
+# --- Move/rename tests ---
+
+def _count_hash_calls(monkeypatch) -> list:
+    """Wraps scanner.hash_file and returns the list its calls are recorded in."""
+    calls = []
+    original = scanner.hash_file
+    def counting_hash_file(file_path, *args):
+        calls.append(file_path)
+        return original(file_path, *args)
+    monkeypatch.setattr(scanner, "hash_file", counting_hash_file)
+    return calls
+
+
+def test_rescan_after_rename_reuses_digests(session: Session, tmp_path: Path, monkeypatch):
+    """
+    Test that renaming a directory does not re-read its files: the existing rows
+    take over the new paths and the old paths are retired.
+    """
+    expected = _build_tree(tmp_path / "tree", seed=7, files_per_dir=5)
+    scan_directory(tmp_path, session)
+    ids_before = {entry.hash: entry.id for entry in session.query(FileEntry)}
+
+    (tmp_path / "tree").rename(tmp_path / "renamed")
+    calls = _count_hash_calls(monkeypatch)
+    scan_directory(tmp_path, session)
+
+    assert calls == []
+    entries = session.query(FileEntry).all()
+    assert len(entries) == len(expected)
+    assert all("/renamed/" in entry.path for entry in entries)
+    assert {entry.hash: entry.id for entry in entries} == ids_before
+
+
+def test_hard_link_inherits_digest(session: Session, tmp_path: Path, monkeypatch):
+    """Test that a new hard link to an indexed file is indexed without reading it."""
+    original = tmp_path / "original.txt"
+    original.write_text("shared content")
+    scan_directory(tmp_path, session)
+
+    os.link(original, tmp_path / "link.txt")
+    calls = _count_hash_calls(monkeypatch)
+    scan_directory(tmp_path, session)
+
+    assert calls == []
+    hashes = {Path(entry.path).name: entry.hash for entry in session.query(FileEntry)}
+    assert hashes == {"original.txt": hash_file(original), "link.txt": hash_file(original)}
+
+
+def test_replaced_file_is_rehashed(session: Session, tmp_path: Path):
+    """Test that a new file at a moved file's old path is hashed, not mistaken for it."""
+    file_a = tmp_path / "a.txt"
+    file_a.write_text("first")
+    scan_directory(tmp_path, session)
+
+    file_a.rename(tmp_path / "b.txt")
+    file_a.write_text("second")
+    scan_directory(tmp_path, session)
+
+    hashes = {Path(entry.path).name: entry.hash for entry in session.query(FileEntry)}
+    assert hashes == {"a.txt": hash_file(file_a), "b.txt": hash_file(tmp_path / "b.txt")}
+
+
+def test_duplicate_ranking_uses_hash_size_index(session: Session):
+    """Test that the duplicate aggregates are answered from the (hash, size) index."""
+    from sqlalchemy import text
+    from app.core.scanner import _duplicate_groups
+    plan = session.execute(text("EXPLAIN QUERY PLAN " + str(
+        select(_duplicate_groups([]).c.hash).compile(compile_kwargs={"literal_binds": True})
+    ))).all()
+    assert any("ix_files_hash_size" in row[-1] for row in plan), plan
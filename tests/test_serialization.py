@@ -0,0 +1,98 @@
+import gzip
+import json
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from app.core import serialization
+from app.core.serialization import accepts_gzip, dumps, maybe_gzip, rows_to_json
+from app.main import get_app
+from app.models.file_entry import Base, FileEntry
+import pytest
+
+# --- Fixtures for serialization tests ---
+
+@pytest.fixture(scope="function", name="session")
+def serialization_session_fixture():
+    """Create an in-memory database session for each test, rolling back changes."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection)
+    yield session
+    session.close()
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.fixture(name="client")
+def serialization_client_fixture(session: Session):
+    """Create a TestClient whose app uses the test session."""
+    yield TestClient(get_app(db_session_override=session))
+
+# --- Tests ---
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_matches_stdlib_json(monkeypatch, use_orjson: bool):
+    """
+    Test that both encoders produce JSON equal to the stdlib's.
+    """
+    if use_orjson and serialization.orjson is None:
+        pytest.skip("orjson is not installed")
+    if not use_orjson:
+        monkeypatch.setattr(serialization, "orjson", None)
+    data = {"h1": ["/data/ä.txt", "/data/b.txt"], "n": [1, 2.5, None]}
+    assert json.loads(dumps(data)) == data
+    assert rows_to_json(("id", "path"), [(1, "/a"), (2, "/b")]) == dumps([{"id": 1, "path": "/a"}, {"id": 2, "path": "/b"}])
+
+
+def test_accepts_gzip():
+    """
+    Test Accept-Encoding negotiation, including quality values.
+    """
+    assert accepts_gzip("gzip")
+    assert accepts_gzip("br, gzip;q=0.5")
+    assert accepts_gzip("*")
+    assert not accepts_gzip("gzip;q=0")
+    assert not accepts_gzip("br, deflate")
+    assert not accepts_gzip(None)
+
+
+def test_maybe_gzip_is_deterministic_and_skips_small_bodies():
+    """
+    Test that compression is stable (for ETags) and skipped for tiny bodies.
+    """
+    body = b"x" * 4096
+    compressed, encoding = maybe_gzip(body, True)
+    assert encoding == "gzip"
+    assert gzip.decompress(compressed) == body
+    assert maybe_gzip(body, True)[0] == compressed
+    assert maybe_gzip(b"{}", True) == (b"{}", None)
+    assert maybe_gzip(body, False) == (body, None)
+
+
+def test_files_endpoint_negotiates_gzip(client: TestClient, session: Session):
+    """
+    Test that large /api/files responses are gzip-encoded only when accepted,
+    with a distinct ETag per representation.
+    """
+    session.add_all([
+        FileEntry(path=f"/data/file{i}.txt", hash=f"h{i % 10}", size=i, mtime=1.5) for i in range(100)
+    ])
+    session.flush()
+
+    plain = client.get("/api/files", headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/api/files", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in plain.headers
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert compressed.headers["etag"] != plain.headers["etag"]
+    # Reason: The client transparently decodes, so both bodies are the same JSON.
+    assert compressed.json() == plain.json()
+    assert plain.json()[0] == {"id": 1, "path": "/data/file0.txt", "hash": "h0", "size": 0, "mtime": 1.5}
@@ -0,0 +1,127 @@
+import gzip
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.core import snapshot
+from app.core.scanner import find_duplicates
+from app.core.snapshot import (
+    SnapshotRecord, export_snapshot, import_records, merge_snapshots, read_snapshot, write_snapshot,
+)
+from app.models.file_entry import Base, FileEntry
+
+
+@pytest.fixture(name="session")
+def snapshot_session_fixture():
+    """Provides a session on a fresh in-memory database."""
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def _digest(n: int) -> str:
+    return f"{n:064x}"
+
+
+def _populate(session: Session, rows):
+    session.execute(insert(FileEntry), [
+        {"path": path, "hash": _digest(n), "size": size, "mtime": 1.0} for path, n, size in rows
+    ])
+    session.commit()
+
+
+def test_export_is_sorted_and_round_trips(session: Session, tmp_path: Path):
+    """Test that an export holds sorted records that read back unchanged."""
+    _populate(session, [("/z", 1, 10), ("/a", 2, 20), ("/m", 1, 10), ("/été", 0, 5)])
+    out = tmp_path / "node.snap"
+    assert export_snapshot(session, out, host="node1") == 4
+
+    records = list(read_snapshot(out))
+    assert records == sorted(records)
+    assert [(r.host, r.path, r.size) for r in records] == [
+        ("node1", "/été", 5), ("node1", "/m", 10), ("node1", "/z", 10), ("node1", "/a", 20),
+    ]
+    assert records[1].digest == bytes.fromhex(_digest(1))
+
+
+def test_merge_is_sorted_union(tmp_path: Path):
+    """Test that merging snapshots yields every record in sorted order."""
+    sources = []
+    all_records = []
+    for node in range(3):
+        records = sorted(
+            SnapshotRecord(bytes([i % 5]) * 32, i, float(i), f"node{node}", f"/f{i}") for i in range(node, 30, 3)
+        )
+        path = tmp_path / f"node{node}.snap"
+        write_snapshot(records, path)
+        sources.append(path)
+        all_records.extend(records)
+
+    merged = tmp_path / "merged.snap"
+    assert write_snapshot(merge_snapshots(sources), merged) == 30
+    assert list(read_snapshot(merged)) == sorted(all_records)
+
+
+def test_import_finds_duplicates_across_hosts(session: Session, tmp_path: Path):
+    """Test that importing merged snapshots exposes cross-host duplicates."""
+    digest = bytes.fromhex(_digest(7))
+    write_snapshot([SnapshotRecord(digest, 3, 1.0, "alpha", "/data/x")], tmp_path / "a.snap")
+    write_snapshot([SnapshotRecord(digest, 3, 2.0, "beta", "/backup/x")], tmp_path / "b.snap")
+
+    assert import_records(session, merge_snapshots([tmp_path / "a.snap", tmp_path / "b.snap"])) == 2
+    # Reason: Re-importing a node updates its rows instead of duplicating them.
+    assert import_records(session, read_snapshot(tmp_path / "a.snap")) == 1
+    assert session.query(FileEntry).count() == 2
+    assert {k: sorted(v) for k, v in find_duplicates(session).items()} == {
+        _digest(7): ["alpha:/data/x", "beta:/backup/x"]
+    }
+
+
+def test_writer_rejects_unsorted_records(tmp_path: Path):
+    """Test that out-of-order records are refused."""
+    records = [SnapshotRecord(b"\x02" * 32, 1, 0.0, "h", "/b"), SnapshotRecord(b"\x01" * 32, 1, 0.0, "h", "/a")]
+    with pytest.raises(ValueError, match="sorted"):
+        write_snapshot(records, tmp_path / "bad.snap")
+
+
+@pytest.mark.parametrize("corrupt", ["truncated", "version", "magic"])
+def test_reader_rejects_damaged_snapshots(tmp_path: Path, corrupt: str):
+    """Test that truncated, unknown-version and foreign files are rejected."""
+    path = tmp_path / "x.snap"
+    write_snapshot([SnapshotRecord(b"\x01" * 32, 1, 0.0, "h", "/a")], path)
+    data = gzip.decompress(path.read_bytes())
+    if corrupt == "truncated":
+        data = data[:-4]
+    elif corrupt == "version":
+        data = data[:8] + b"\x00\x63" + data[10:]
+    else:
+        data = b"NOTASNAP" + data[8:]
+    path.write_bytes(gzip.compress(data))
+    with pytest.raises(ValueError):
+        list(read_snapshot(path))
+
+
+def test_command_line_export_and_import(tmp_path: Path):
+    """Test the export/merge/import commands end to end."""
+    for node in ("n1", "n2"):
+        db_file = tmp_path / f"{node}.db"
+        engine = create_engine(f"sqlite:///{db_file}")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            _populate(session, [("/shared", 1, 4), (f"/{node}-only", 2 if node == "n1" else 3, 4)])
+        engine.dispose()
+        snapshot.main(["export", "--db", str(db_file), "--output", str(tmp_path / f"{node}.snap"), "--host", node])
+
+    snapshot.main(["merge", "--output", str(tmp_path / "all.snap"), str(tmp_path / "n1.snap"), str(tmp_path / "n2.snap")])
+    assert len(list(read_snapshot(tmp_path / "all.snap"))) == 4
+
+    central = tmp_path / "central.db"
+    snapshot.main(["import", "--db", str(central), str(tmp_path / "n1.snap"), str(tmp_path / "n2.snap")])
+    engine = create_engine(f"sqlite:///{central}")
+    with Session(engine) as session:
+        assert find_duplicates(session) == {_digest(1): ["n1:/shared", "n2:/shared"]}
+    engine.dispose()
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from app.core import hashing
+from app.core.hashing import (
+    CACHE_POLICY_DEFAULT, CACHE_POLICY_DONTNEED, ZeroBlock, hash_file_and_chunks, read_blocks,
+)
+from app.core.scanner import hash_file
+from app.core.throttle import ScanThrottle
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux") or not hasattr(os, "SEEK_DATA"),
+    reason="Sparse extents are listed with SEEK_DATA/SEEK_HOLE on Linux.",
+)
+
+MB = 1024 * 1024
+
+
+def _make_sparse(path: Path, size: int, extents) -> bytes:
+    """Creates a sparse file with data written at (offset, length) extents; returns its full content."""
+    content = bytearray(size)
+    with open(path, "wb") as f:
+        f.truncate(size)
+        for offset, length in extents:
+            data = os.urandom(length)
+            f.seek(offset)
+            f.write(data)
+            content[offset:offset + length] = data
+    if os.stat(path).st_blocks * 512 >= size:
+        pytest.skip("The filesystem does not store sparse files.")
+    return bytes(content)
+
+
+@pytest.mark.parametrize("extents", [
+    [(4 * MB, 64 * 1024)], # Leading and trailing holes
+    [(0, 100), (3 * MB + 17, 5000), (10 * MB - 10, 10)], # Data at both ends, odd offsets
+    [], # All hole
+])
+def test_sparse_digest_matches_plain_read(tmp_path: Path, extents):
+    """Test that sparse-aware reads give the same digest and chunks as reading every byte."""
+    path = tmp_path / "sparse.img"
+    content = _make_sparse(path, 10 * MB, extents)
+    dense = tmp_path / "dense.img"
+    dense.write_bytes(content)
+
+    assert hash_file(path) == hashlib.sha256(content).hexdigest() == hash_file(dense)
+    assert hash_file(path, CACHE_POLICY_DONTNEED) == hash_file(dense)
+    assert hash_file_and_chunks(path) == hash_file_and_chunks(dense)
+
+
+def test_sparse_read_skips_holes(tmp_path: Path, monkeypatch):
+    """Test that only allocated ranges are read and holes are yielded as zero blocks."""
+    path = tmp_path / "sparse.img"
+    _make_sparse(path, 64 * MB, [(8 * MB, MB), (40 * MB, MB)])
+    bytes_read = []
+    real_pread = os.pread
+    monkeypatch.setattr(hashing.os, "pread", lambda fd, n, offset: bytes_read.append(n) or real_pread(fd, n, offset))
+
+    blocks = list(read_blocks(path, cache_policy=CACHE_POLICY_DEFAULT))
+    assert sum(len(block) for block in blocks) == 64 * MB
+    # Reason: Filesystems may allocate whole blocks around the written ranges.
+    assert sum(bytes_read) < 4 * MB
+    assert sum(len(block) for block in blocks if isinstance(block, ZeroBlock)) > 60 * MB
+
+
+def test_holes_do_not_count_against_bandwidth_limit(tmp_path: Path):
+    """Test that a bytes/s limit only paces the data actually read, not the holes."""
+    path = tmp_path / "sparse.img"
+    content = _make_sparse(path, 256 * MB, [(0, 64 * 1024)])
+    throttle = ScanThrottle(bytes_per_second=1 * MB)
+
+    start = time.monotonic()
+    assert hash_file(path, throttle=throttle) == hashlib.sha256(content).hexdigest()
+    assert time.monotonic() - start < 5
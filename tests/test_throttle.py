@@ -0,0 +1,151 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.core import scanner, throttle as throttle_module
+from app.core.scanner import scan_directory
+from app.core.throttle import ScanThrottle, TokenBucket, get_throttle
+from app.models.file_entry import Base
+
+
+@pytest.fixture(name="session")
+def throttle_session_fixture():
+    """Provides a session on a fresh in-memory database."""
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def test_token_bucket_limits_rate():
+    """Test that acquiring from a bucket averages out to its rate."""
+    bucket = TokenBucket(rate=100, burst=1)
+    start = time.monotonic()
+    for _ in range(31):
+        bucket.acquire(1)
+    assert time.monotonic() - start >= 0.25
+
+
+def test_token_bucket_rate_change_wakes_waiters():
+    """Test that lifting a limit releases a worker waiting on a deep debt."""
+    bucket = TokenBucket(rate=1)
+    bucket.acquire(1000) # Now ~1000 s in debt
+    done = threading.Event()
+    waiter = threading.Thread(target=lambda: (bucket.acquire(1), done.set()))
+    waiter.start()
+    assert not done.wait(0.2)
+    bucket.set_rate(None)
+    assert done.wait(1)
+    waiter.join()
+
+
+def test_adaptive_backoff_follows_latency(monkeypatch):
+    """Test that reads slower than the latency target add a growing delay that decays once they recover."""
+    sleeps = []
+    monkeypatch.setattr(throttle_module.time, "sleep", sleeps.append)
+    scan_throttle = ScanThrottle(latency_target_ms=5)
+    for _ in range(10):
+        scan_throttle._after_read(65536, 0.050)
+    assert scan_throttle.backoff > throttle_module.MIN_BACKOFF
+    assert sleeps == sorted(sleeps)
+    for _ in range(40):
+        scan_throttle._after_read(65536, 0.0001)
+    assert scan_throttle.backoff == 0.0
+
+
+def test_scan_respects_bandwidth_limit(session: Session, tmp_path: Path):
+    """Test that the bytes/s limit is shared by all hashing workers."""
+    rate = 256 * 1024
+    for i in range(8):
+        (tmp_path / f"file{i}.bin").write_bytes(os.urandom(rate // 4)) # Twice the burst in total
+    start = time.monotonic()
+    scan_directory(tmp_path, session, throttle=ScanThrottle(bytes_per_second=rate), hash_workers=4)
+    assert time.monotonic() - start >= 0.8
+
+
+def test_running_scan_is_registered_and_adjustable(session: Session, tmp_path: Path):
+    """Test that a running scan's throttle can be found by job id and relaxed."""
+    for i in range(20):
+        (tmp_path / f"file{i}.txt").write_text(str(i))
+    scan_throttle = ScanThrottle(files_per_second=2)
+    result = {}
+    scan = threading.Thread(target=lambda: result.update(job=scan_directory(tmp_path, session, throttle=scan_throttle)))
+    scan.start()
+    deadline = time.monotonic() + 5
+    while get_throttle(1) is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert get_throttle(1) is scan_throttle
+
+    get_throttle(1).update(files_per_second=None)
+    scan.join(timeout=5)
+    assert not scan.is_alive()
+    assert result["job"].files_hashed == 20
+    assert get_throttle(1) is None
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Per-thread niceness is Linux-specific.")
+def test_nice_applies_to_hashing_threads(session: Session, tmp_path: Path, monkeypatch):
+    """Test that the hashing threads, and not the caller, run at the requested niceness."""
+    (tmp_path / "a.txt").write_text("a")
+    seen = []
+    original = scanner.hash_file
+    def recording_hash_file(file_path, *args):
+        seen.append(os.getpriority(os.PRIO_PROCESS, threading.get_native_id()))
+        return original(file_path, *args)
+    monkeypatch.setattr(scanner, "hash_file", recording_hash_file)
+    caller_nice = os.getpriority(os.PRIO_PROCESS, threading.get_native_id())
+
+    scan_directory(tmp_path, session, throttle=ScanThrottle(nice=min(caller_nice + 5, 19)))
+    assert seen == [min(caller_nice + 5, 19)]
+    assert os.getpriority(os.PRIO_PROCESS, threading.get_native_id()) == caller_nice
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Per-thread niceness is Linux-specific.")
+def test_cleared_nice_restores_hashing_threads(session: Session, tmp_path: Path, monkeypatch):
+    """Test that clearing nice mid-scan puts the hashing threads back at their earlier niceness."""
+    for i in range(3):
+        (tmp_path / f"file{i}.txt").write_text(str(i))
+    scan_throttle = ScanThrottle(nice=19)
+    seen = []
+    original = scanner.hash_file
+    def recording_hash_file(file_path, *args):
+        seen.append(os.getpriority(os.PRIO_PROCESS, threading.get_native_id()))
+        scan_throttle.update(nice=None)
+        return original(file_path, *args)
+    monkeypatch.setattr(scanner, "hash_file", recording_hash_file)
+    caller_nice = os.getpriority(os.PRIO_PROCESS, threading.get_native_id())
+    if caller_nice == 19:
+        pytest.skip("Already running at niceness 19")
+
+    scan_directory(tmp_path, session, throttle=scan_throttle, hash_workers=1)
+    assert seen[0] == 19
+    # Reason: Lowering niceness again needs CAP_SYS_NICE (or a permissive RLIMIT_NICE).
+    if os.geteuid() == 0:
+        assert seen[1:] == [caller_nice, caller_nice]
+
+
+def test_throttled_scan_commits_on_a_timer(session: Session, tmp_path: Path, monkeypatch):
+    """Test that a slow, throttled scan commits its progress every CHECKPOINT_SECONDS, not only every N files."""
+    for i in range(8):
+        (tmp_path / f"file{i}.txt").write_text(str(i))
+    monkeypatch.setattr(scanner, "CHECKPOINT_SECONDS", 0.2)
+    # Reason: Write in small batches, so written rows wait on throttled hashes.
+    monkeypatch.setattr(scanner, "DB_BATCH_SIZE", 2)
+    checkpoints = []
+    original = scanner._checkpoint
+    def recording_checkpoint(db, job_id, files_seen, files_hashed, status="running"):
+        checkpoints.append((status, files_hashed))
+        original(db, job_id, files_seen, files_hashed, status)
+    monkeypatch.setattr(scanner, "_checkpoint", recording_checkpoint)
+
+    scan_directory(tmp_path, session, throttle=ScanThrottle(files_per_second=10))
+    running = [files_hashed for status, files_hashed in checkpoints if status == "running"]
+    assert len(running) >= 2
+    assert running == sorted(running) and running[-1] < 8